@@ -2,7 +2,7 @@
 {
     "name": "Shopify Restock Alerts",
     "summary": "Fetch Shopify inventory, create restock tasks, and transfer inventory when completed",
-    "version": "18.0.1.1.6",
+    "version": "18.0.1.2.0",
     "category": "Inventory/Integration",
     "author": "Custom",
     "license": "LGPL-3",
@@ -14,10 +14,12 @@
         "views/settings_view.xml",
         "views/wizard_views.xml",
         "views/location_views.xml",
+        "views/catalog_views.xml",
         "views/items_views.xml",
         "views/menu.xml",
         "views/run_button_view.xml",
-        "data/ir_cron.xml"
+        "data/ir_cron.xml",
+        "data/mail_templates.xml"
     ],
     "assets": {},
     "installable": True,
@@ -1,6 +1,39 @@
 # -*- coding: utf-8 -*-
-from odoo import http
-from odoo.http import request
+import base64
+import hashlib
+import hmac
+import json
+import logging
+
+from odoo import api, fields, http
+from odoo.http import content_disposition, request
+from odoo.modules.registry import Registry
+
+
+_logger = logging.getLogger(__name__)
+
+
+def _verify_shopify_hmac(secret: str, body: bytes, signature: str) -> bool:
+    """Check Shopify's base64 HMAC-SHA256 signature of the raw request body."""
+    if not secret or not signature:
+        return False
+    digest = base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(digest, signature.strip())
+
+
+def _stream_inventory_report(dbname, uid, context, location_id, compress):
+    """Run the inventory report on its own cursor while the response streams.
+
+    The request cursor is closed once the controller returns, before the
+    body is sent, so the crawl needs a cursor of its own.
+    """
+    with Registry(dbname).cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        service = env['shopify.restock.service']
+        location = env['shopify.restock.location'].browse(location_id)
+        if location:
+            service = service.with_context(shopify_restock_location=location)
+        yield from service.stream_inventory_report(compress=compress)
 
 
 class ShopifyRestockController(http.Controller):
@@ -12,3 +45,51 @@ class ShopifyRestockController(http.Controller):
         action = request.env.ref('odoo_shopify_restock.action_open_shopify_restock_runs').sudo().read()[0]
         # Redirect to the runs action
         return request.redirect('/web?#action=%s' % action['id'])
+
+    @http.route('/shopify_restock/inventory_report', type='http', auth='user', website=False)
+    def inventory_report(self, location_id=None, compress=None, **kw):  # noqa: ARG002
+        location = request.env['shopify.restock.location']
+        if location_id and str(location_id).isdigit():
+            location = location.browse(int(location_id)).exists()
+        if not location.location_id_numeric:
+            location = location.browse()
+        compress = compress == '1'
+        # Fail before streaming so a configuration error is not sent as a truncated file
+        request.env['shopify.restock.service'].with_context(
+            shopify_restock_location=location,
+        )._inventory_report_settings()
+
+        location_suffix = f"-{location.location_id_numeric}" if location else ""
+        filename = f"retail-inventory{location_suffix}-{fields.Date.today().isoformat()}.csv"
+        headers = [('Content-Disposition', content_disposition(filename + ('.gz' if compress else '')))]
+        if compress:
+            headers.append(('Content-Type', 'application/gzip'))
+        else:
+            headers.append(('Content-Type', 'text/csv; charset=utf-8'))
+        stream = _stream_inventory_report(
+            request.env.cr.dbname,
+            request.env.uid,
+            dict(request.env.context),
+            location.id,
+            compress,
+        )
+        return request.make_response(stream, headers=headers)
+
+    @http.route('/shopify_restock/webhook', type='http', auth='public', methods=['POST'], csrf=False)
+    def webhook(self, **kw):  # noqa: ARG002
+        # Shopify signs the raw body, so it must be read before anything parses it
+        body = request.httprequest.get_data()
+        secret = request.env['ir.config_parameter'].sudo().get_param('odoo_shopify_restock.webhook_secret') or ''
+        signature = request.httprequest.headers.get('X-Shopify-Hmac-Sha256', '')
+        if not _verify_shopify_hmac(secret, body, signature):
+            _logger.warning("Rejected Shopify webhook with an invalid signature")
+            return request.make_response('invalid signature', status=401)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return request.make_response('invalid payload', status=400)
+        topic = request.httprequest.headers.get('X-Shopify-Topic', '')
+        if not request.env['shopify.restock.service'].sudo()._handle_webhook(topic, payload):
+            _logger.debug("Ignored Shopify webhook topic %s", topic)
+        # Shopify retries anything but a 2xx, so ignored topics are acknowledged too
+        return request.make_response('ok', status=200)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+
+from odoo import SUPERUSER_ID, api
+from odoo.addons.odoo_shopify_restock.models.restock_run import (
+    ALERT_PAYLOAD_COLUMNS,
+    ALERT_PAYLOAD_LEGACY_COLUMNS,
+)
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def migrate(cr, version):
+    """Move run alert JSON from the old text column into the compressed payload attachment."""
+    cr.execute(
+        """
+        SELECT 1
+          FROM information_schema.columns
+         WHERE table_name = 'shopify_restock_run'
+           AND column_name = 'rss_items_json'
+        """
+    )
+    if not cr.fetchone():
+        return
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Run = env["shopify.restock.run"]
+    cr.execute("SELECT id FROM shopify_restock_run WHERE rss_items_json IS NOT NULL ORDER BY id")
+    run_ids = [row[0] for row in cr.fetchall()]
+    migrated = 0
+    for start in range(0, len(run_ids), BATCH_SIZE):
+        cr.execute(
+            "SELECT id, rss_items_json FROM shopify_restock_run WHERE id = ANY(%s)",
+            (run_ids[start:start + BATCH_SIZE],),
+        )
+        for run_id, raw in cr.fetchall():
+            try:
+                alerts = json.loads(raw or "[]")
+            except ValueError:
+                _logger.warning("Skipping unreadable alert JSON of restock run %s", run_id)
+                continue
+            if not isinstance(alerts, list) or not alerts:
+                continue
+            # Keep the published guid and pubDate so existing feed items stay stable.
+            payload = Run._encode_alert_payload(
+                alerts, columns=ALERT_PAYLOAD_COLUMNS + ALERT_PAYLOAD_LEGACY_COLUMNS
+            )
+            Run.browse(run_id).write({"alert_payload": payload})
+            migrated += 1
+        env.flush_all()
+        env.invalidate_all()
+
+    cr.execute("ALTER TABLE shopify_restock_run DROP COLUMN rss_items_json")
+    _logger.info("Moved alert payloads of %s restock runs into compressed attachments", migrated)
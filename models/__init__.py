@@ -4,4 +4,6 @@ from . import restock_run
 from . import settings
 from . import restock_service
 from . import location
+from . import catalog
+from . import inventory_level
 from . import project_task
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, Iterable, List
+
+from odoo import api, fields, models
+
+
+class ShopifyRestockCatalogProduct(models.Model):
+    _name = "shopify.restock.catalog.product"
+    _description = "Shopify Catalog Mirror Product"
+    _order = "id"
+
+    product_id_global = fields.Char(string="Shopify Product ID", required=True, index=True)
+    title = fields.Char()
+    handle = fields.Char()
+    restock_level = fields.Float()
+    desired_inventory_level = fields.Float()
+    published_online = fields.Boolean(string="Published to Online Store")
+    published_retail = fields.Boolean(string="Published to Retail Store")
+    variant_ids = fields.One2many(
+        comodel_name="shopify.restock.catalog.variant",
+        inverse_name="product_id",
+        string="Variants",
+    )
+
+    _sql_constraints = [
+        ("product_id_global_uniq", "unique(product_id_global)", "A Shopify product can only be mirrored once."),
+    ]
+
+    @api.model
+    def _mirror_number(self, value: Any) -> float:
+        """Store a decoded metafield value as a number; anything non-numeric counts as unset."""
+        if isinstance(value, bool) or value is None:
+            return 0.0
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    @api.model
+    def _differs(self, record: models.Model, vals: Dict[str, Any]) -> bool:
+        # Empty Char fields read back as False, so compare falsy values as equal.
+        return any((record[name] or False) != (value or False) for name, value in vals.items())
+
+    @api.model
+    def _sync_records(self, records: List[Dict[str, Any]]) -> int:
+        """Create or update mirror rows from normalized product records.
+
+        Variants missing from a record are removed, so each record must carry
+        the product's complete variant list. Threshold and publication keys a
+        record leaves out keep their stored value, which lets partial sources
+        such as webhooks update titles and variants only. Unchanged rows are
+        not written. Returns the number of products created or updated.
+        """
+        if not records:
+            return 0
+        Variant = self.env["shopify.restock.catalog.variant"]
+        existing = {
+            product.product_id_global: product
+            for product in self.search([("product_id_global", "in", [record["id"] for record in records])])
+        }
+        # Read the variants of every existing product at once instead of per product.
+        variants_by_product: Dict[int, List[models.Model]] = {}
+        for variant in Variant.search([("product_id", "in", [product.id for product in existing.values()])]):
+            variants_by_product.setdefault(variant.product_id.id, []).append(variant)
+        changed = 0
+        variant_vals_to_create: List[Dict[str, Any]] = []
+        variants_to_unlink = Variant
+        for record in records:
+            vals = {
+                "product_id_global": record["id"],
+                "title": record.get("title") or "",
+                "handle": record.get("handle") or "",
+            }
+            if "restock_level" in record:
+                vals["restock_level"] = self._mirror_number(record["restock_level"])
+            if "desired_level" in record:
+                vals["desired_inventory_level"] = self._mirror_number(record["desired_level"])
+            if "published_online" in record:
+                vals["published_online"] = bool(record["published_online"])
+            if "published_retail" in record:
+                vals["published_retail"] = bool(record["published_retail"])
+            product = existing.get(record["id"])
+            if not product:
+                product = self.create(vals)
+                changed += 1
+            elif self._differs(product, vals):
+                product.write(vals)
+                changed += 1
+
+            current_variants = {
+                variant.variant_id_global: variant for variant in variants_by_product.get(product.id, [])
+            }
+            seen_variant_ids = set()
+            for variant_record in record.get("variants") or []:
+                variant_vals = Variant._values_from_record(variant_record)
+                seen_variant_ids.add(variant_vals["variant_id_global"])
+                variant = current_variants.get(variant_vals["variant_id_global"])
+                if not variant:
+                    variant_vals["product_id"] = product.id
+                    variant_vals_to_create.append(variant_vals)
+                elif self._differs(variant, variant_vals):
+                    variant.write(variant_vals)
+            for variant_id_global, variant in current_variants.items():
+                if variant_id_global not in seen_variant_ids:
+                    variants_to_unlink |= variant
+        if variants_to_unlink:
+            variants_to_unlink.unlink()
+        if variant_vals_to_create:
+            Variant.create(variant_vals_to_create)
+        return changed
+
+    @api.model
+    def _remove_products(self, product_ids_global: Iterable[str]) -> int:
+        products = self.search([("product_id_global", "in", list(product_ids_global))])
+        count = len(products)
+        if products:
+            products.unlink()
+        return count
+
+    @api.model
+    def _remove_missing(self, product_ids_global: Iterable[str]) -> int:
+        """Delete mirrored products that are not in ``product_ids_global`` and return how many."""
+        keep = set(product_ids_global)
+        missing = self.browse([
+            row["id"]
+            for row in self.search_read([], ["product_id_global"])
+            if row["product_id_global"] not in keep
+        ])
+        count = len(missing)
+        if missing:
+            missing.unlink()
+        return count
+
+
+class ShopifyRestockCatalogVariant(models.Model):
+    _name = "shopify.restock.catalog.variant"
+    _description = "Shopify Catalog Mirror Variant"
+    _order = "product_id, id"
+
+    product_id = fields.Many2one(
+        comodel_name="shopify.restock.catalog.product",
+        required=True,
+        index=True,
+        ondelete="cascade",
+    )
+    variant_id_global = fields.Char(string="Shopify Variant ID", required=True, index=True)
+    title = fields.Char()
+    sku = fields.Char(index=True)
+    inventory_item_id_global = fields.Char(string="Shopify Inventory Item ID")
+    restock_level = fields.Float()
+    desired_inventory_level = fields.Float()
+
+    _sql_constraints = [
+        ("variant_id_global_uniq", "unique(variant_id_global)", "A Shopify variant can only be mirrored once."),
+    ]
+
+    @api.model
+    def _values_from_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        Product = self.env["shopify.restock.catalog.product"]
+        vals = {
+            "variant_id_global": record["id"],
+            "title": record.get("title") or "",
+            "sku": record.get("sku") or "",
+            "inventory_item_id_global": (record.get("inventory_item") or {}).get("id") or "",
+        }
+        if "restock_level" in record:
+            vals["restock_level"] = Product._mirror_number(record["restock_level"])
+        if "desired_level" in record:
+            vals["desired_inventory_level"] = Product._mirror_number(record["desired_level"])
+        return vals
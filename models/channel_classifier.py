@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+CHANNEL_ONLINE_STORE = "online_store"
+CHANNEL_RETAIL = "retail"
+CHANNEL_OTHER = "other"
+
+ONLINE_STORE_HANDLES = frozenset({"online-store", "online_store"})
+RETAIL_CHANNEL_NAMES = ("retail store", "point of sale")
+RETAIL_CHANNEL_HANDLES = (
+    "retail-store",
+    "retail_store",
+    "retail",
+    "point-of-sale",
+    "point_of_sale",
+    "shopify-pos",
+    "shopify_pos",
+    "pos",
+)
+
+
+class ChannelClassifier:
+    """Per-run cache mapping Shopify sales channels to a publication category.
+
+    A shop only has a handful of channels but every product lists them, so
+    each channel's name and handle are normalized and matched once, the first
+    time its id is seen. Afterwards classifying a product's publications is a
+    dict lookup per channel.
+    """
+
+    def __init__(
+        self,
+        retail_names: Iterable[str] = RETAIL_CHANNEL_NAMES,
+        retail_handles: Iterable[str] = RETAIL_CHANNEL_HANDLES,
+    ):
+        self.retail_names = frozenset(name.strip().lower() for name in retail_names if name)
+        self.retail_handles = frozenset(handle.strip().lower() for handle in retail_handles if handle)
+        self._categories: Dict[Any, str] = {}
+
+    def _classify(self, channel: Dict[str, Any]) -> str:
+        name = (channel.get("name") or "").strip().lower()
+        handle = (channel.get("handle") or "").strip().lower()
+        if handle in ONLINE_STORE_HANDLES or "online store" in name:
+            return CHANNEL_ONLINE_STORE
+        if name in self.retail_names or handle in self.retail_handles:
+            return CHANNEL_RETAIL
+        return CHANNEL_OTHER
+
+    def category(self, channel: Optional[Dict[str, Any]]) -> str:
+        channel = channel or {}
+        # Channels without an id (e.g. hand-built payloads) are keyed by their labels.
+        key = channel.get("id") or (channel.get("name"), channel.get("handle"))
+        category = self._categories.get(key)
+        if category is None:
+            category = self._categories[key] = self._classify(channel)
+        return category
+
+    def published_flags(self, publications: Optional[Dict[str, Any]]) -> Tuple[bool, bool]:
+        """Return ``(published to Online Store, published to a retail channel)``."""
+        published_online = published_retail = False
+        for edge in (publications or {}).get("edges") or []:
+            node = edge.get("node") or {}
+            if not node.get("isPublished"):
+                continue
+            category = self.category(node.get("channel"))
+            if category == CHANNEL_ONLINE_STORE:
+                published_online = True
+            elif category == CHANNEL_RETAIL:
+                published_retail = True
+        return published_online, published_retail
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from odoo import api, fields, models
+
+
+class ShopifyRestockInventoryLevel(models.Model):
+    """Available quantity per Shopify (inventory item, location), fed by webhooks.
+
+    The table is created by hand so the Shopify ids can be stored as ``bigint``
+    behind a unique key on ``(inventory_item_id, location_id)``, which is the
+    index the local restock check joins through.
+    """
+
+    _name = "shopify.restock.inventory.level"
+    _description = "Shopify Inventory Level"
+    _auto = False
+    _log_access = False
+    _order = "inventory_item_id, location_id"
+
+    inventory_item_id = fields.Integer(string="Shopify Inventory Item ID", readonly=True)
+    location_id = fields.Integer(string="Shopify Location ID", readonly=True)
+    available = fields.Integer(readonly=True)
+    updated_at = fields.Datetime(readonly=True)
+
+    def init(self):
+        self.env.cr.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shopify_restock_inventory_level (
+                id bigserial PRIMARY KEY,
+                inventory_item_id bigint NOT NULL,
+                location_id bigint NOT NULL,
+                available integer NOT NULL DEFAULT 0,
+                updated_at timestamp without time zone NOT NULL DEFAULT (now() AT TIME ZONE 'UTC'),
+                CONSTRAINT shopify_restock_inventory_level_item_location_key
+                    UNIQUE (inventory_item_id, location_id)
+            )
+            """
+        )
+
+    @api.model
+    def _upsert_levels(self, levels: Iterable[Tuple[int, int, int, Optional[datetime]]]) -> int:
+        """Insert or update ``(inventory_item_id, location_id, available, updated_at)`` rows.
+
+        A row only overwrites a stored level that is not newer, so webhooks
+        delivered out of order cannot roll a quantity back. Returns the number
+        of rows written.
+        """
+        now = fields.Datetime.now()
+        # ON CONFLICT cannot touch the same row twice in one statement; the last value wins.
+        rows: Dict[Tuple[int, int], Tuple[int, datetime]] = {}
+        for inventory_item_id, location_id, available, updated_at in levels:
+            rows[(int(inventory_item_id), int(location_id))] = (int(available or 0), updated_at or now)
+        if not rows:
+            return 0
+        keys = list(rows)
+        self.env.cr.execute(
+            """
+            INSERT INTO shopify_restock_inventory_level AS level
+                   (inventory_item_id, location_id, available, updated_at)
+            SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::integer[], %s::timestamp[])
+            ON CONFLICT (inventory_item_id, location_id) DO UPDATE
+               SET available = EXCLUDED.available,
+                   updated_at = EXCLUDED.updated_at
+             WHERE level.updated_at <= EXCLUDED.updated_at
+            """,
+            (
+                [key[0] for key in keys],
+                [key[1] for key in keys],
+                [rows[key][0] for key in keys],
+                [rows[key][1] for key in keys],
+            ),
+        )
+        return self.env.cr.rowcount
@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 import logging
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 
 
 _logger = logging.getLogger(__name__)
 
+RESTOCK_OPEN_KEY_INDEX = "project_task_restock_open_identity_key_uniq"
+# Task fields whose change can open or close a task or move its restock identity.
+RESTOCK_OPEN_KEY_TRIGGER_FIELDS = frozenset({"state", "stage_id", "restock_item_id", "project_id", "active"})
+# Task fields whose change can complete a task and so trigger its inventory transfer;
+# _restock_done_trigger_fields adds the dependencies of the computed state.
+RESTOCK_DONE_TRIGGER_FIELDS = frozenset({"state", "stage_id"})
+
 
 class ProjectTask(models.Model):
     _inherit = "project.task"
@@ -15,6 +22,153 @@ class ProjectTask(models.Model):
         string="Shopify Restock Item",
         ondelete="set null",
     )
+    restock_open_identity_key = fields.Char(
+        string="Open Restock Identity",
+        readonly=True,
+        copy=False,
+        help="Identity key of the linked restock item while the task is open. "
+        "A partial unique index keeps a key on at most one open task per project.",
+    )
+
+    def init(self):
+        super().init()
+        cr = self.env.cr
+        if tools.index_exists(cr, RESTOCK_OPEN_KEY_INDEX):
+            # Archived tasks count as closed; release keys they kept from before that rule.
+            cr.execute(
+                """
+                UPDATE project_task
+                   SET restock_open_identity_key = NULL
+                 WHERE active IS FALSE
+                   AND restock_open_identity_key IS NOT NULL
+                """
+            )
+            return
+        if not tools.table_exists(cr, "shopify_restock_item"):
+            return
+        # First install of the index: give each open restock task its key.
+        # Legacy duplicates leave the key on the newest open task only.
+        cr.execute(
+            f"""
+            WITH ranked AS (
+                SELECT task.id,
+                       item.identity_key,
+                       row_number() OVER (
+                           PARTITION BY task.project_id, item.identity_key
+                           ORDER BY task.id DESC
+                       ) AS rank
+                  FROM project_task task
+                  JOIN shopify_restock_item item ON item.id = task.restock_item_id
+                 WHERE item.identity_key IS NOT NULL
+                   AND item.identity_key <> ''
+                   AND {self._restock_open_task_sql("task")}
+            )
+            UPDATE project_task task
+               SET restock_open_identity_key = ranked.identity_key
+              FROM ranked
+             WHERE ranked.id = task.id
+               AND ranked.rank = 1
+            """
+        )
+        cr.execute(
+            f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {RESTOCK_OPEN_KEY_INDEX}
+                ON project_task (project_id, restock_open_identity_key)
+             WHERE restock_open_identity_key IS NOT NULL
+            """
+        )
+
+    @api.model
+    def _restock_open_task_sql(self, alias: str = "task") -> str:
+        """Return the SQL condition matching ``_restock_task_is_open`` for table alias ``alias``.
+
+        Like the Python rule, archived tasks are closed and a task without a
+        state falls back to its stage.
+        """
+        stage_fields = self.env["project.task.type"]._fields
+        stage_column = next(
+            (name for name in ("is_closed", "fold") if name in stage_fields and stage_fields[name].store),
+            None,
+        )
+        if stage_column:
+            stage_open = (
+                f"NOT COALESCE((SELECT stage.{stage_column} FROM project_task_type stage "
+                f"WHERE stage.id = {alias}.stage_id), FALSE)"
+            )
+        else:
+            stage_open = "TRUE"
+        active = f"{alias}.active IS NOT FALSE" if "active" in self._fields else "TRUE"
+        if "state" not in self._fields:
+            return f"({active} AND {stage_open})"
+        return (
+            f"({active} AND CASE WHEN COALESCE({alias}.state, '') = '' THEN {stage_open} "
+            f"ELSE {alias}.state NOT IN ('1_done', '1_canceled') END)"
+        )
+
+    def _restock_task_is_open(self) -> bool:
+        self.ensure_one()
+        # Archived tasks are hidden from the task lookups, so they count as closed.
+        if "active" in self._fields and not self.active:
+            return False
+        if "state" in self._fields and self.state == "1_canceled":
+            return False
+        return not self._restock_task_is_done()
+
+    def _sync_restock_open_identity_key(self) -> None:
+        """Store the restock identity key on open tasks and clear it on closed ones.
+
+        Keys are released before any is claimed. A task never takes a key that
+        another open task of its project already holds (e.g. when a task is
+        reopened after its replacement was created); it stays unkeyed instead.
+        """
+        tasks = self.sudo().filtered(lambda task: task.restock_item_id or task.restock_open_identity_key)
+        if not tasks:
+            return
+        desired = {
+            task.id: (
+                task.restock_item_id.identity_key
+                if task.restock_item_id and task._restock_task_is_open()
+                else False
+            ) or None
+            for task in tasks
+        }
+        changed = tasks.filtered(lambda task: (task.restock_open_identity_key or None) != desired[task.id])
+        if not changed:
+            return
+        changed.flush_recordset(["project_id", "restock_open_identity_key"])
+        cr = self.env.cr
+        cr.execute(
+            "UPDATE project_task SET restock_open_identity_key = NULL WHERE id = ANY(%s)",
+            (changed.ids,),
+        )
+        # Within one batch the newest task wins a contested key.
+        claims = {}
+        for task in changed.sorted("id", reverse=True):
+            if desired[task.id]:
+                claims.setdefault((task.project_id.id, desired[task.id]), task.id)
+        if claims:
+            cr.execute(
+                """
+                UPDATE project_task AS task
+                   SET restock_open_identity_key = claim.identity_key
+                  FROM unnest(%s::int[], %s::varchar[]) AS claim(task_id, identity_key)
+                 WHERE task.id = claim.task_id
+                   AND NOT EXISTS (
+                        SELECT 1
+                          FROM project_task other
+                         WHERE other.project_id = task.project_id
+                           AND other.restock_open_identity_key = claim.identity_key
+                   )
+                """,
+                (list(claims.values()), [identity_key for _project_id, identity_key in claims]),
+            )
+        changed.invalidate_recordset(["restock_open_identity_key"])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        tasks = super().create(vals_list)
+        tasks.filtered("restock_item_id")._sync_restock_open_identity_key()
+        return tasks
 
     def _restock_task_is_done(self) -> bool:
         """Check if this task is in a 'done' state.
@@ -46,39 +200,58 @@ class ProjectTask(models.Model):
             return bool(stage.fold)
         return False
 
+    @api.model
+    def _restock_done_trigger_fields(self) -> frozenset:
+        """Return the fields whose write can complete a task.
+
+        Besides ``state`` and ``stage_id`` this covers every field the stored
+        ``state`` compute depends on (e.g. ``depend_on_ids``), so a completion
+        that arrives through a recomputed state still transfers inventory.
+        """
+        state_field = self._fields.get("state")
+        if not state_field:
+            return RESTOCK_DONE_TRIGGER_FIELDS
+        depends = self.pool.field_depends.get(state_field, ())
+        return RESTOCK_DONE_TRIGGER_FIELDS | {path.split(".", 1)[0] for path in depends}
+
     def write(self, vals):
-        restock_tasks = self.filtered("restock_item_id")
-        done_before = {task.id: task._restock_task_is_done() for task in restock_tasks}
+        restock_tasks = self.browse()
+        done_before = set()
+        if self._restock_done_trigger_fields().intersection(vals):
+            restock_tasks = self.filtered("restock_item_id")
+            done_before = {task.id for task in restock_tasks if task._restock_task_is_done()}
         result = super().write(vals)
-        if not restock_tasks:
-            return result
-        for task in restock_tasks:
-            try:
-                if done_before.get(task.id):
-                    continue
-                if not task._restock_task_is_done():
-                    continue
-                items = self.env["shopify.restock.item"].sudo().search([
-                    ("todo_task_id", "=", task.id),
-                    ("is_active_snapshot", "=", True),
-                    ("inventory_transferred", "=", False),
-                ])
-                if (
-                    not items
-                    and task.restock_item_id
-                    and task.restock_item_id.is_active_snapshot
-                    and not task.restock_item_id.inventory_transferred
-                ):
-                    items = task.restock_item_id
-                if not items:
-                    continue
-                _logger.info(
-                    "Restock task %s marked done, triggering inventory transfer for items %s",
-                    task.id, items.ids
-                )
-                items.with_context(
-                    transferred_by_uid=self.env.user.id
-                ).sudo().action_transfer_inventory()
-            except Exception:
-                _logger.exception("Failed to apply inventory transfer for restock task %s", task.id)
+        if RESTOCK_OPEN_KEY_TRIGGER_FIELDS.intersection(vals):
+            self._sync_restock_open_identity_key()
+        completed = restock_tasks.filtered(
+            lambda task: task.id not in done_before and task._restock_task_is_done()
+        )
+        if completed:
+            completed._transfer_restock_inventory()
         return result
+
+    def _transfer_restock_inventory(self):
+        """Transfer the active restock items of the just-completed tasks in ``self`` as one batch."""
+        try:
+            items = self.env["shopify.restock.item"].sudo().search([
+                ("todo_task_id", "in", self.ids),
+                ("is_active_snapshot", "=", True),
+                ("inventory_transferred", "=", False),
+            ])
+            tasks_with_items = set(items.todo_task_id.ids)
+            # Tasks whose snapshots were never linked back still transfer their own item.
+            items |= self.filtered(lambda task: task.id not in tasks_with_items).restock_item_id.filtered(
+                lambda item: item.is_active_snapshot and not item.inventory_transferred
+            )
+            if not items:
+                return
+            _logger.info(
+                "Restock tasks %s marked done, triggering inventory transfer for items %s",
+                self.ids, items.ids
+            )
+            settings = self.env["shopify.restock.service"]._load_settings()
+            items.with_context(
+                transferred_by_uid=self.env.user.id
+            ).sudo().action_transfer_inventory(settings)
+        except Exception:
+            _logger.exception("Failed to apply inventory transfer for restock tasks %s", self.ids)
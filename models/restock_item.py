@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 
 
 _logger = logging.getLogger(__name__)
@@ -78,6 +78,33 @@ class ShopifyRestockItem(models.Model):
     )
     inventory_transfer_error = fields.Char(string="Transfer Error", copy=False)
 
+    def init(self):
+        # Task lookups only ever read active snapshots, which are a small
+        # slice of the history. Odoo renders ``inventory_transferred = False``
+        # as ``IS NULL OR = FALSE``, which the planner cannot match against a
+        # partial predicate, so only ``is_active_snapshot`` is indexed on.
+        tools.create_index(
+            self.env.cr,
+            "shopify_restock_item_active_task_identity_idx",
+            self._table,
+            ["todo_task_id", "identity_key"],
+            where="is_active_snapshot",
+        )
+        tools.create_index(
+            self.env.cr,
+            "shopify_restock_item_active_location_task_idx",
+            self._table,
+            ["location_id", "todo_task_id"],
+            where="is_active_snapshot",
+        )
+
+    def write(self, vals):
+        result = super().write(vals)
+        if "identity_key" in vals:
+            tasks = self.env["project.task"].sudo().search([("restock_item_id", "in", self.ids)])
+            tasks._sync_restock_open_identity_key()
+        return result
+
     @api.depends("todo_task_id", "todo_task_id.state", "todo_task_id.stage_id")
     def _compute_task_state(self):
         for item in self:
@@ -96,15 +123,14 @@ class ShopifyRestockItem(models.Model):
             return None
         return self.env["product.product"].sudo().search([("default_code", "=", self.sku)], limit=1)
 
-    def _get_source_location(self):
+    def _get_source_location(self, settings=None):
         """Get the source location (warehouse where stock comes FROM)."""
         self.ensure_one()
-        ICP = self.env["ir.config_parameter"].sudo()
+        settings = settings or self.env["shopify.restock.service"]._load_settings()
 
         # First check for configured source/warehouse location
-        source_param = ICP.get_param("odoo_shopify_restock.source_location_id")
-        if source_param and str(source_param).isdigit():
-            location = self.env["stock.location"].sudo().browse(int(source_param))
+        if settings.source_location_id:
+            location = self.env["stock.location"].sudo().browse(settings.source_location_id)
             if location.exists():
                 return location
 
@@ -114,7 +140,7 @@ class ShopifyRestockItem(models.Model):
         except Exception:
             return self.env["stock.location"].sudo().search([("usage", "=", "internal")], limit=1)
 
-    def _get_destination_location(self):
+    def _get_destination_location(self, settings=None):
         """Get the destination location (retail location where stock goes TO).
 
         This is the location being restocked - typically a retail store location.
@@ -127,11 +153,9 @@ class ShopifyRestockItem(models.Model):
             return self.location_id.odoo_location_id
 
         # Fall back to global destination setting
-        param = self.env["ir.config_parameter"].sudo().get_param(
-            "odoo_shopify_restock.odoo_location_id"
-        )
-        if param and str(param).isdigit():
-            location = self.env["stock.location"].sudo().browse(int(param))
+        settings = settings or self.env["shopify.restock.service"]._load_settings()
+        if settings.odoo_location_id:
+            location = self.env["stock.location"].sudo().browse(settings.odoo_location_id)
             if location.exists():
                 return location
 
@@ -140,7 +164,18 @@ class ShopifyRestockItem(models.Model):
     def _create_inventory_move(self, product, quantity, source_location, dest_location):
         """Create a stock move to transfer inventory from source to destination."""
         self.ensure_one()
-        move_vals = {
+        move_vals = self._inventory_move_vals(product, quantity, source_location, dest_location)
+        move_vals["reference"] = f"Restock: {self.product_title}"
+        move = self.env["stock.move"].sudo().create(move_vals)
+        move._action_confirm()
+        move._action_assign()
+        self._set_move_quantities({move: quantity})
+        move._action_done()
+        return move
+
+    def _inventory_move_vals(self, product, quantity, source_location, dest_location):
+        self.ensure_one()
+        return {
             "name": f"Restock Transfer: {self.product_title} ({self.sku or product.display_name})",
             "product_id": product.id,
             "product_uom_qty": quantity,
@@ -149,27 +184,106 @@ class ShopifyRestockItem(models.Model):
             "location_dest_id": dest_location.id,
             "company_id": source_location.company_id.id or self.env.company.id,
             "origin": self.run_id.name or "",
-            "reference": f"Restock: {self.product_title}",
         }
-        move = self.env["stock.move"].sudo().create(move_vals)
-        move._action_confirm()
-        move._action_assign()
-        if hasattr(move, "_set_quantity_done"):
-            move._set_quantity_done(quantity)
-        elif "quantity_done" in move._fields:
-            move.quantity_done = quantity
-        else:
-            self.env["stock.move.line"].sudo().create({
-                "move_id": move.id,
-                "product_id": product.id,
-                "product_uom_id": product.uom_id.id,
-                "qty_done": quantity,
-                "location_id": source_location.id,
-                "location_dest_id": dest_location.id,
-                "company_id": move.company_id.id,
-            })
-        move._action_done()
-        return move
+
+    @api.model
+    def _set_move_quantities(self, quantities):
+        """Mark ``{stock.move: quantity}`` as done, whichever stock API this Odoo exposes."""
+        for move, quantity in quantities.items():
+            if hasattr(move, "_set_quantity_done"):
+                move._set_quantity_done(quantity)
+            elif "quantity_done" in move._fields:
+                move.quantity_done = quantity
+            else:
+                self.env["stock.move.line"].sudo().create({
+                    "move_id": move.id,
+                    "product_id": move.product_id.id,
+                    "product_uom_id": move.product_uom.id,
+                    "qty_done": quantity,
+                    "location_id": move.location_id.id,
+                    "location_dest_id": move.location_dest_id.id,
+                    "company_id": move.company_id.id,
+                })
+
+    def _get_odoo_products_by_sku(self):
+        """Resolve the Odoo product of every SKU in ``self`` with one search."""
+        skus = {sku for sku in self.mapped("sku") if sku}
+        if not skus:
+            return {}
+        products = {}
+        for product in self.env["product.product"].sudo().search([("default_code", "in", list(skus))]):
+            # Same winner as the per-item lookup: the first product in search order.
+            products.setdefault(product.default_code, product)
+        return products
+
+    @api.model
+    def _get_internal_picking_type(self, source_location):
+        PickingType = self.env["stock.picking.type"].sudo()
+        company_id = source_location.company_id.id or self.env.company.id
+        domain = [("code", "=", "internal"), ("company_id", "=", company_id)]
+        picking_type = PickingType
+        if source_location.warehouse_id:
+            picking_type = PickingType.search(domain + [("warehouse_id", "=", source_location.warehouse_id.id)], limit=1)
+        return picking_type or PickingType.search(domain, limit=1)
+
+    def _write_inventory_moves(self, moves_by_item):
+        """Link every item to its own move in one statement; ``moves_by_item`` maps item id to move."""
+        self.flush_recordset(["inventory_move_id"])
+        self.env.cr.execute(
+            """
+            UPDATE shopify_restock_item AS item
+               SET inventory_move_id = link.move_id
+              FROM unnest(%s::int[], %s::int[]) AS link(item_id, move_id)
+             WHERE item.id = link.item_id
+            """,
+            (list(moves_by_item), [move.id for move in moves_by_item.values()]),
+        )
+        self.invalidate_recordset(["inventory_move_id"])
+        self.modified(["inventory_move_id"])
+
+    def _transfer_as_picking(self, quantities, products, source_location, dest_location):
+        """Move every item of ``self`` in one internal picking and validate it once.
+
+        Returns ``{item id: stock.move}``. Raises when the picking cannot be
+        validated, in which case the caller rolls it back.
+        """
+        picking_type = self._get_internal_picking_type(source_location)
+        if not picking_type:
+            raise ValueError("No internal operation type for the source warehouse")
+        origins = sorted({name for name in self.mapped("run_id.name") if name})
+        picking = self.env["stock.picking"].sudo().create({
+            "picking_type_id": picking_type.id,
+            "location_id": source_location.id,
+            "location_dest_id": dest_location.id,
+            "company_id": source_location.company_id.id or self.env.company.id,
+            "origin": ", ".join(origins)[:255],
+        })
+        move_vals_list = []
+        for item in self:
+            move_vals = item._inventory_move_vals(
+                products[item.id], quantities[item.id], source_location, dest_location
+            )
+            move_vals["picking_id"] = picking.id
+            move_vals_list.append(move_vals)
+        moves = self.env["stock.move"].sudo().create(move_vals_list)
+        picking.action_confirm()
+        picking.action_assign()
+        moves_by_item = dict(zip(self.ids, moves))
+        self._set_move_quantities({moves_by_item[item.id]: quantities[item.id] for item in self})
+        if "picked" in moves._fields:
+            moves.picked = True
+        # Validate like the Validate button, so immediate-transfer and lot checks
+        # still run. Partially reserved moves are done as they are, without a backorder.
+        result = picking.with_context(
+            skip_backorder=True,
+            picking_ids_not_to_backorder=picking.ids,
+            skip_sms=True,
+        ).button_validate()
+        if any(move.state != "done" for move in moves):
+            # button_validate returns a wizard action instead of raising when it needs input.
+            reason = f" ({result.get('res_model')})" if isinstance(result, dict) else ""
+            raise ValueError(f"Picking {picking.name} was not fully validated{reason}")
+        return moves_by_item
 
     def _dedupe_transfer_candidates(self):
         """Keep only the newest active snapshot per task/identity before transfer."""
@@ -207,9 +321,26 @@ class ShopifyRestockItem(models.Model):
 
         return self.browse([item.id for item in latest_by_key.values()])
 
-    def action_transfer_inventory(self):
-        """Transfer inventory from warehouse to retail location when restock task is completed."""
-        for item in self._dedupe_transfer_candidates():
+    def action_transfer_inventory(self, settings=None):
+        """Transfer inventory from warehouse to retail location when restock task is completed.
+
+        Items are grouped by source and destination location; each group is
+        moved in one internal picking that is validated once. When a group
+        fails it is rolled back and its items are retried one move at a
+        time, so a single bad item only records its own transfer error.
+        ``settings`` is the ``RestockSettings`` snapshot of the caller; it is
+        loaded once here when omitted.
+        """
+        settings = settings or self.env["shopify.restock.service"]._load_settings()
+        candidates = self._dedupe_transfer_candidates()
+        products_by_sku = candidates._get_odoo_products_by_sku()
+        errors = {}
+        quantities = {}
+        products = {}
+        groups = {}
+        source_location = None
+        dest_locations = {}
+        for item in candidates:
             if not item.is_active_snapshot:
                 _logger.debug("Item %s snapshot is inactive, skipping transfer", item.id)
                 continue
@@ -218,55 +349,84 @@ class ShopifyRestockItem(models.Model):
                 continue
             qty = int(item.restock_amount or 0)
             if qty <= 0:
-                item.sudo().write({
-                    "inventory_transfer_error": "No restock amount to transfer.",
-                })
+                errors.setdefault("No restock amount to transfer.", []).append(item.id)
                 _logger.warning("Restock item %s has no quantity to transfer", item.id)
                 continue
-            product = item._get_odoo_product()
+            product = products_by_sku.get(item.sku) if item.sku else None
             if not product:
-                item.sudo().write({
-                    "inventory_transfer_error": f"No Odoo product found for SKU '{item.sku or ''}'.",
-                })
+                errors.setdefault(f"No Odoo product found for SKU '{item.sku or ''}'.", []).append(item.id)
                 _logger.warning("No Odoo product found for SKU '%s' (item %s)", item.sku, item.id)
                 continue
-            source_location = item._get_source_location()
+            if source_location is None:
+                source_location = item._get_source_location(settings)
             if not source_location:
-                item.sudo().write({
-                    "inventory_transfer_error": "No source location (warehouse) configured. Set Source Location in Shopify Restock settings.",
-                })
+                errors.setdefault(
+                    "No source location (warehouse) configured. Set Source Location in Shopify Restock settings.",
+                    [],
+                ).append(item.id)
                 _logger.error("No source location configured for restock item %s", item.id)
                 continue
-            dest_location = item._get_destination_location()
+            dest_key = item.location_id.id
+            if dest_key not in dest_locations:
+                dest_locations[dest_key] = item._get_destination_location(settings)
+            dest_location = dest_locations[dest_key]
             if not dest_location:
-                item.sudo().write({
-                    "inventory_transfer_error": "No destination location (retail) configured. Link Odoo location to Shopify location or set in settings.",
-                })
+                errors.setdefault(
+                    "No destination location (retail) configured. Link Odoo location to Shopify location or set in settings.",
+                    [],
+                ).append(item.id)
                 _logger.error("No destination location configured for restock item %s", item.id)
                 continue
+            quantities[item.id] = qty
+            products[item.id] = product
+            groups.setdefault((source_location, dest_location), []).append(item.id)
+
+        for message, item_ids in errors.items():
+            self.browse(item_ids).sudo().write({"inventory_transfer_error": message})
+
+        transferred_by_uid = self.env.context.get("transferred_by_uid") or self.env.user.id
+        for (group_source, group_dest), item_ids in groups.items():
+            group_items = self.browse(item_ids)
+            _logger.info(
+                "Transferring %s restock items from %s to %s",
+                len(group_items), group_source.complete_name, group_dest.complete_name,
+            )
             try:
-                _logger.info(
-                    "Transferring %s units of %s from %s to %s",
-                    qty, product.display_name, source_location.complete_name, dest_location.complete_name
+                with self.env.cr.savepoint():
+                    moves_by_item = group_items._transfer_as_picking(quantities, products, group_source, group_dest)
+            except Exception:
+                _logger.exception(
+                    "Batched inventory transfer failed for restock items %s; retrying one by one", item_ids
                 )
-                move = item._create_inventory_move(product, qty, source_location, dest_location)
-            except Exception as e:
-                _logger.exception("Inventory transfer failed for restock item %s", item.id)
-                item.sudo().write({
-                    "inventory_transfer_error": f"Transfer failed: {str(e)[:200]}",
+                self.env.invalidate_all()
+                moves_by_item = {}
+                for item in group_items:
+                    try:
+                        with self.env.cr.savepoint():
+                            moves_by_item[item.id] = item._create_inventory_move(
+                                products[item.id], quantities[item.id], group_source, group_dest
+                            )
+                    except Exception as e:
+                        _logger.exception("Inventory transfer failed for restock item %s", item.id)
+                        self.env.invalidate_all()
+                        item.sudo().write({
+                            "inventory_transfer_error": f"Transfer failed: {str(e)[:200]}",
+                        })
+            if moves_by_item:
+                transferred_at = fields.Datetime.now()
+                transferred = self.browse(list(moves_by_item)).sudo()
+                transferred.write({
+                    "inventory_transferred": True,
+                    "inventory_transferred_at": transferred_at,
+                    "inventory_transferred_by": transferred_by_uid,
+                    "inventory_transfer_error": False,
+                    "is_active_snapshot": False,
+                    "superseded_by_item_id": False,
+                    "superseded_at": transferred_at,
+                    "superseded_reason": "transferred",
                 })
-                continue
-            transferred_by_uid = item.env.context.get("transferred_by_uid") or item.env.user.id
-            transferred_at = fields.Datetime.now()
-            item.sudo().write({
-                "inventory_move_id": move.id,
-                "inventory_transferred": True,
-                "inventory_transferred_at": transferred_at,
-                "inventory_transferred_by": transferred_by_uid,
-                "inventory_transfer_error": False,
-                "is_active_snapshot": False,
-                "superseded_by_item_id": False,
-                "superseded_at": transferred_at,
-                "superseded_reason": "transferred",
-            })
-            _logger.info("Successfully transferred inventory for restock item %s (move %s)", item.id, move.id)
+                transferred._write_inventory_moves(moves_by_item)
+                _logger.info(
+                    "Successfully transferred inventory for restock items %s (moves %s)",
+                    list(moves_by_item), [move.id for move in moves_by_item.values()],
+                )
@@ -1,7 +1,32 @@
 # -*- coding: utf-8 -*-
+import base64
+import json
+import zlib
+from typing import Any, Dict, List
+
 from odoo import api, fields, models
 
 
+ALERT_PAYLOAD_VERSION = 1
+# Alert keys kept in the payload; display strings are rebuilt from these.
+ALERT_PAYLOAD_COLUMNS = (
+    "product_id",
+    "variant_id",
+    "product_title",
+    "variant_title",
+    "sku",
+    "product_handle",
+    "link",
+    "current_qty",
+    "restock_level",
+    "restock_amount",
+    "urgency",
+)
+# Feed strings stored verbatim for runs migrated from rss_items_json, whose
+# published guid and pubDate must not change.
+ALERT_PAYLOAD_LEGACY_COLUMNS = ("guid", "pubDate")
+
+
 class ShopifyRestockRun(models.Model):
     _name = "shopify.restock.run"
     _description = "Shopify Restock Run"
@@ -15,15 +40,88 @@ class ShopifyRestockRun(models.Model):
     has_restock_alerts = fields.Boolean(string="Has Restock Alerts")
     email_sent = fields.Boolean(string="Email Sent")
     email_to = fields.Char(string="Email To")
-    rss_items_json = fields.Text(string="Alerts JSON", help="Serialized JSON of alert items")
+    alert_payload = fields.Binary(
+        string="Alerts Payload",
+        attachment=True,
+        copy=False,
+        help="zlib-compressed, column-oriented JSON of the run's alerts",
+    )
+    rss_items_json = fields.Text(
+        string="Alerts JSON",
+        compute="_compute_rss_items_json",
+        help="Alert items decoded from the stored payload",
+    )
     error_message = fields.Char()
     location_id = fields.Many2one(
         comodel_name="shopify.restock.location",
         string="Shopify Location",
     )
+    api_request_count = fields.Integer(string="API Requests")
+    api_retry_count = fields.Integer(string="API Retries")
+    api_throttle_wait_count = fields.Integer(string="Throttle Waits")
+    api_throttle_wait_seconds = fields.Float(string="Throttle Wait (s)")
+    api_bytes_received = fields.Integer(string="Bytes Received")
 
     item_ids = fields.One2many(
         comodel_name="shopify.restock.item",
         inverse_name="run_id",
         string="Items",
     )
+
+    @api.model
+    def _encode_alert_payload(self, alerts: List[Dict[str, Any]], columns=ALERT_PAYLOAD_COLUMNS):
+        """Return ``alerts`` as a base64 payload for ``alert_payload``, or False when empty."""
+        if not alerts:
+            return False
+        payload = {
+            "version": ALERT_PAYLOAD_VERSION,
+            "columns": {
+                column: [alert.get(column) for alert in alerts]
+                for column in columns
+            },
+        }
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return base64.b64encode(zlib.compress(raw, 9))
+
+    def _decode_alert_payload(self) -> List[Dict[str, Any]]:
+        self.ensure_one()
+        if not self.alert_payload:
+            return []
+        payload = json.loads(zlib.decompress(base64.b64decode(self.alert_payload)))
+        columns = payload.get("columns") or {}
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+
+    def _expand_alert(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        """Rebuild the feed-style strings of an alert from its stored columns."""
+        self.ensure_one()
+        timestamp = alert.get("pubDate") or (
+            fields.Datetime.to_string(self.report_timestamp) if self.report_timestamp else ""
+        )
+        unique_id = (
+            alert.get("guid")
+            or f"restock-{alert.get('product_id')}-{alert.get('variant_id')}-{timestamp[:10]}"
+        )
+        display_title = f"{alert.get('product_title')}"
+        if alert.get("variant_title") and alert.get("variant_title") != "Default Title":
+            display_title += f" - {alert.get('variant_title')}"
+        return {
+            "id": unique_id,
+            "title": f"RESTOCK ALERT: {display_title}",
+            "description": (
+                f"Product: {alert.get('product_title')}\nVariant: {alert.get('variant_title')}\n"
+                f"SKU: {alert.get('sku')}\nCurrent Stock: {alert.get('current_qty')} units\n"
+                f"Restock Level: {alert.get('restock_level')} units\n"
+                f"Recommended Order: {alert.get('restock_amount')} units\nGenerated: {timestamp}"
+            ),
+            "guid": unique_id,
+            "pubDate": timestamp,
+            "category": "inventory-alert",
+            **{key: value for key, value in alert.items() if key not in ALERT_PAYLOAD_LEGACY_COLUMNS},
+        }
+
+    @api.depends("alert_payload", "report_timestamp")
+    def _compute_rss_items_json(self):
+        for run in self:
+            alerts = [run._expand_alert(alert) for alert in run._decode_alert_payload()]
+            run.rss_items_json = json.dumps(alerts, ensure_ascii=False, indent=2) if alerts else False
@@ -1,12 +1,24 @@
 # -*- coding: utf-8 -*-
+import csv
+import dataclasses
+import gzip
+import io
 import json
 import logging
-from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional, Set, Tuple
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from zoneinfo import ZoneInfo
 
-import requests
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
+
+from .channel_classifier import ChannelClassifier
+from .restock_settings import RestockSettings, ScheduleSettings
+from .shopify_client import ShopifyClient, ShopifyQueryCostError
 
 
 _logger = logging.getLogger(__name__)
@@ -21,6 +33,75 @@ SCHEDULE_DAY_PARAM_KEYS = (
     (6, "odoo_shopify_restock.schedule_sunday"),
 )
 
+FETCH_MODE_PAGINATED = "paginated"
+FETCH_MODE_BULK = "bulk"
+INVENTORY_MODE_REST = "rest"
+INVENTORY_MODE_INLINE = "inline"
+INVENTORY_MODE_LOCAL = "local"
+# InventoryLevel.quantities replaced InventoryLevel.available in this API version.
+INVENTORY_QUANTITIES_API_VERSION = "2023-10"
+BULK_POLL_INTERVAL_SECONDS = 5.0
+BULK_TIMEOUT_SECONDS = 1800
+BULK_TERMINAL_FAILURE_STATUSES = ("FAILED", "CANCELED", "EXPIRED")
+# Bulk results are regrouped into pages so they flow through the same pipeline.
+BULK_PAGE_SIZE = 250
+# Product pages fetched ahead of the page currently being evaluated.
+PREFETCH_PAGES = 2
+PRODUCT_PAGE_SIZE_MAX = 50
+PRODUCT_PAGE_SIZE_MIN = 5
+VARIANT_PAGE_SIZE = 50
+# Products whose remaining variants are fetched together in one aliased query.
+VARIANT_FOLLOWUP_BATCH = 10
+# Share of the cost bucket a single products page may request before it shrinks.
+PRODUCT_PAGE_COST_SHARE = 0.5
+INVENTORY_CHUNK_SIZE = 50
+INVENTORY_PAGE_LIMIT = 250
+DEFAULT_INVENTORY_WORKERS = 4
+MAX_INVENTORY_WORKERS = 16
+CATALOG_SOURCE_LIVE = "live"
+CATALOG_SOURCE_MIRROR = "mirror"
+# Metafield and publication edits do not always bump a product's updated_at,
+# so the mirror is rebuilt from a full crawl at least this often.
+CATALOG_FULL_SYNC_DAYS = 7
+# Incremental syncs look back this far past the checkpoint to absorb clock skew.
+CATALOG_SYNC_OVERLAP_SECONDS = 300
+PRODUCT_ID_PAGE_SIZE = 250
+WEBHOOK_TOPIC_INVENTORY_LEVELS_UPDATE = "inventory_levels/update"
+WEBHOOK_TOPIC_PRODUCTS_UPDATE = "products/update"
+WEBHOOK_TOPIC_PRODUCTS_DELETE = "products/delete"
+SNAPSHOT_BACKFILL_DONE_PARAM = "odoo_shopify_restock.snapshot_backfill_done"
+SNAPSHOT_BACKFILL_ITEM_CHECKPOINT_PARAM = "odoo_shopify_restock.snapshot_backfill_item_checkpoint"
+SNAPSHOT_BACKFILL_TASK_CHECKPOINT_PARAM = "odoo_shopify_restock.snapshot_backfill_task_checkpoint"
+SNAPSHOT_BACKFILL_CHUNK_SIZE = 5000
+# Work done per cron call before the job re-triggers itself and commits out.
+SNAPSHOT_BACKFILL_TIME_BUDGET_SECONDS = 240
+SUMMARY_EMAIL_TEMPLATE = "odoo_shopify_restock.restock_summary_email"
+DEFAULT_EMAIL_MAX_ROWS = 200
+URGENCY_RANK = {"high": 0, "medium": 1, "low": 2}
+SUMMARY_CSV_COLUMNS = (
+    ("urgency", "Urgency"),
+    ("product_title", "Product"),
+    ("variant_title", "Variant"),
+    ("sku", "SKU"),
+    ("current_qty", "Current"),
+    ("restock_level", "Restock Level"),
+    ("restock_amount", "Recommend"),
+    ("link", "Product URL"),
+)
+INVENTORY_REPORT_HEADER = ("Product", "Variant", "SKU", "Quantity")
+# Metafield value types that need converting; any other type is kept as the raw string.
+METAFIELD_CONVERTERS = {
+    "number_integer": int,
+    "number_decimal": float,
+    "boolean": lambda value: str(value).lower() == "true",
+    "json": json.loads,
+}
+# Threshold metafield keys and the record keys their decoded values are stored under.
+THRESHOLD_METAFIELD_KEYS = {
+    "restock_level": "restock_level",
+    "desired_inventory_level": "desired_level",
+}
+
 
 class ShopifyRestockService(models.AbstractModel):
     _name = "shopify.restock.service"
@@ -112,83 +193,214 @@ class ShopifyRestockService(models.AbstractModel):
             variant_title=item.variant_title,
         )
 
-    def _run_snapshot_backfill_once(self) -> None:
-        """Backfill snapshot metadata for legacy items exactly once."""
-        ICP = self.env["ir.config_parameter"].sudo()
-        flag_key = "odoo_shopify_restock.snapshot_backfill_done"
-        if ICP.get_param(flag_key) == "1":
-            return
+    @api.model
+    def _identity_key_sql(self, alias: str = "item") -> str:
+        """Return the SQL expression of ``_identity_key_for_item`` over table alias ``alias``."""
+
+        def piece(column: str) -> str:
+            return f"lower(regexp_replace(COALESCE({alias}.{column}, ''), '^\\s+|\\s+$', '', 'g'))"
+
+        variant, product, sku = piece("variant_id_global"), piece("product_id_global"), piece("sku")
+        return f"""
+            'loc:' || COALESCE({alias}.location_id, 0)::text || '|' || CASE
+                WHEN {variant} <> '' THEN 'variant:' || {variant}
+                WHEN {product} <> '' AND {sku} <> '' THEN 'product:' || {product} || '|sku:' || {sku}
+                WHEN {product} <> '' THEN 'product:' || {product}
+                WHEN {sku} <> '' THEN 'sku:' || {sku}
+                ELSE 'title:' || {piece("product_title")} || '|variant:' || {piece("variant_title")}
+            END
+        """
 
-        item_model = self.env["shopify.restock.item"].sudo()
-        all_items = item_model.search([], order="id asc")
-        if not all_items:
-            ICP.set_param(flag_key, "1")
-            return
+    @api.model
+    def _run_snapshot_backfill(self, chunk_size: int = SNAPSHOT_BACKFILL_CHUNK_SIZE) -> bool:
+        """Backfill snapshot metadata of legacy items; only the backfill cron calls this.
 
-        now = fields.Datetime.now()
-        for item in all_items:
-            updates: Dict[str, Any] = {}
-            if not item.identity_key:
-                updates["identity_key"] = self._identity_key_for_item(item)
-            if item.inventory_transferred and item.is_active_snapshot:
-                updates["is_active_snapshot"] = False
-                if not item.superseded_reason:
-                    updates["superseded_reason"] = "transferred"
-                if not item.superseded_at:
-                    updates["superseded_at"] = item.inventory_transferred_at or now
-            if updates:
-                item.sudo().write(updates)
-
-        grouped_items: Dict[Tuple[int, str], List[models.Model]] = {}
-        candidates = item_model.search([
-            ("todo_task_id", "!=", False),
-            ("inventory_transferred", "=", False),
-        ], order="id desc")
-        for item in candidates:
-            task = item.todo_task_id
-            if not task:
-                continue
-            if task._restock_task_is_done():
-                continue
-            if "state" in task._fields and task.state == "1_canceled":
-                continue
-            identity_key = item.identity_key or self._identity_key_for_item(item)
-            if not identity_key:
+        Items are processed in id-ordered chunks, committing after each one
+        with its checkpoint, so the job resumes where an interrupted call
+        stopped. The cron deactivates itself once everything is done.
+        Returns True when the backfill is complete.
+        """
+        return self.sudo()._run_snapshot_backfill_chunks(chunk_size)
+
+    def _run_snapshot_backfill_chunks(self, chunk_size: int) -> bool:
+        ICP = self.env["ir.config_parameter"].sudo()
+        cron = self.env.ref("odoo_shopify_restock.ir_cron_shopify_restock_snapshot_backfill", raise_if_not_found=False)
+        if ICP.get_param(SNAPSHOT_BACKFILL_DONE_PARAM) == "1":
+            if cron and cron.active:
+                cron.sudo().write({"active": False})
+            return True
+
+        deadline = time.monotonic() + SNAPSHOT_BACKFILL_TIME_BUDGET_SECONDS
+        steps = (
+            (SNAPSHOT_BACKFILL_ITEM_CHECKPOINT_PARAM, self._backfill_item_chunk),
+            (SNAPSHOT_BACKFILL_TASK_CHECKPOINT_PARAM, self._backfill_task_chunk),
+        )
+        for checkpoint_param, backfill_chunk in steps:
+            checkpoint = self._config_param_as_int(checkpoint_param, 0)
+            if checkpoint < 0:
                 continue
-            grouped_items.setdefault((task.id, identity_key), []).append(item)
-
-        for (_task_id, _identity_key), grouped in grouped_items.items():
-            keep_item = grouped[0]
-            if (
-                not keep_item.is_active_snapshot
-                or keep_item.superseded_reason
-                or keep_item.superseded_by_item_id
-                or keep_item.superseded_at
-            ):
-                keep_item.sudo().write({
-                    "is_active_snapshot": True,
-                    "superseded_by_item_id": False,
-                    "superseded_at": False,
-                    "superseded_reason": False,
-                })
-            for old_item in grouped[1:]:
-                updates: Dict[str, Any] = {}
-                if old_item.is_active_snapshot:
-                    updates["is_active_snapshot"] = False
-                if not old_item.superseded_by_item_id:
-                    updates["superseded_by_item_id"] = keep_item.id
-                if not old_item.superseded_at:
-                    updates["superseded_at"] = now
-                if not old_item.superseded_reason:
-                    updates["superseded_reason"] = "legacy_backfill"
-                if updates:
-                    old_item.sudo().write(updates)
-            task = keep_item.todo_task_id
-            if task and task.restock_item_id.id != keep_item.id:
-                task.sudo().write({"restock_item_id": keep_item.id})
-
-        ICP.set_param(flag_key, "1")
-        _logger.info("Completed snapshot metadata backfill for %s restock items", len(all_items))
+            while True:
+                if time.monotonic() >= deadline:
+                    if cron:
+                        cron._trigger()
+                    return False
+                next_checkpoint = backfill_chunk(checkpoint, chunk_size)
+                # -1 marks a finished step.
+                checkpoint = next_checkpoint if next_checkpoint is not None else -1
+                ICP.set_param(checkpoint_param, str(checkpoint))
+                self.env.cr.commit()
+                if checkpoint < 0:
+                    break
+
+        ICP.set_param(SNAPSHOT_BACKFILL_DONE_PARAM, "1")
+        if cron:
+            cron.sudo().write({"active": False})
+        self.env.cr.commit()
+        _logger.info("Completed snapshot metadata backfill")
+        return True
+
+    def _backfill_item_chunk(self, after_id: int, chunk_size: int) -> Optional[int]:
+        """Fill identity keys and retire transferred snapshots for items after ``after_id``.
+
+        Returns the last item id of the chunk, or None when no item is left.
+        """
+        item_model = self.env["shopify.restock.item"]
+        item_model.flush_model()
+        cr = self.env.cr
+        cr.execute(
+            "SELECT id FROM shopify_restock_item WHERE id > %s ORDER BY id LIMIT %s",
+            (after_id, chunk_size),
+        )
+        item_ids = [row[0] for row in cr.fetchall()]
+        if not item_ids:
+            return None
+        cr.execute(
+            f"""
+            UPDATE shopify_restock_item AS item
+               SET identity_key = CASE
+                       WHEN COALESCE(item.identity_key, '') = '' THEN {self._identity_key_sql("item")}
+                       ELSE item.identity_key
+                   END,
+                   is_active_snapshot = item.is_active_snapshot AND item.inventory_transferred IS NOT TRUE,
+                   superseded_reason = CASE
+                       WHEN item.inventory_transferred AND item.is_active_snapshot
+                       THEN COALESCE(NULLIF(item.superseded_reason, ''), 'transferred')
+                       ELSE item.superseded_reason
+                   END,
+                   superseded_at = CASE
+                       WHEN item.inventory_transferred AND item.is_active_snapshot
+                       THEN COALESCE(item.superseded_at, item.inventory_transferred_at, now() AT TIME ZONE 'UTC')
+                       ELSE item.superseded_at
+                   END
+             WHERE item.id = ANY(%s)
+               AND (
+                    COALESCE(item.identity_key, '') = ''
+                    OR (item.inventory_transferred AND item.is_active_snapshot)
+               )
+            """,
+            (item_ids,),
+        )
+        item_model.invalidate_model(["identity_key", "is_active_snapshot", "superseded_reason", "superseded_at"])
+        return item_ids[-1]
+
+    def _backfill_task_chunk(self, after_id: int, chunk_size: int) -> Optional[int]:
+        """Keep one active snapshot per (open task, identity key) for tasks after ``after_id``.
+
+        The newest item of each group stays active and the older ones are
+        superseded by it. Each task is relinked to its newest kept item.
+        Returns the last task id of the chunk, or None when no task is left.
+        """
+        item_model = self.env["shopify.restock.item"]
+        task_model = self.env["project.task"].sudo()
+        item_model.flush_model()
+        task_model.flush_model()
+        cr = self.env.cr
+        cr.execute(
+            f"""
+            SELECT DISTINCT item.todo_task_id
+              FROM shopify_restock_item item
+              JOIN project_task task ON task.id = item.todo_task_id
+             WHERE item.todo_task_id > %s
+               AND item.inventory_transferred IS NOT TRUE
+               AND {task_model._restock_open_task_sql("task")}
+             ORDER BY item.todo_task_id
+             LIMIT %s
+            """,
+            (after_id, chunk_size),
+        )
+        task_ids = [row[0] for row in cr.fetchall()]
+        if not task_ids:
+            return None
+        cr.execute(
+            """
+            WITH ranked AS (
+                SELECT item.id,
+                       first_value(item.id) OVER snapshots AS keep_id,
+                       row_number() OVER snapshots AS rank
+                  FROM shopify_restock_item item
+                 WHERE item.todo_task_id = ANY(%s)
+                   AND item.inventory_transferred IS NOT TRUE
+                   AND COALESCE(item.identity_key, '') <> ''
+                WINDOW snapshots AS (PARTITION BY item.todo_task_id, item.identity_key ORDER BY item.id DESC)
+            )
+            UPDATE shopify_restock_item AS item
+               SET is_active_snapshot = ranked.rank = 1,
+                   superseded_by_item_id = CASE
+                       WHEN ranked.rank = 1 THEN NULL
+                       ELSE COALESCE(item.superseded_by_item_id, ranked.keep_id)
+                   END,
+                   superseded_at = CASE
+                       WHEN ranked.rank = 1 THEN NULL
+                       ELSE COALESCE(item.superseded_at, now() AT TIME ZONE 'UTC')
+                   END,
+                   superseded_reason = CASE
+                       WHEN ranked.rank = 1 THEN NULL
+                       ELSE COALESCE(NULLIF(item.superseded_reason, ''), 'legacy_backfill')
+                   END
+              FROM ranked
+             WHERE ranked.id = item.id
+               AND CASE
+                       WHEN ranked.rank = 1 THEN NOT item.is_active_snapshot
+                           OR item.superseded_by_item_id IS NOT NULL
+                           OR item.superseded_at IS NOT NULL
+                           OR COALESCE(item.superseded_reason, '') <> ''
+                       ELSE item.is_active_snapshot
+                           OR item.superseded_by_item_id IS NULL
+                           OR item.superseded_at IS NULL
+                           OR COALESCE(item.superseded_reason, '') = ''
+                   END
+            """,
+            (task_ids,),
+        )
+        cr.execute(
+            """
+            UPDATE project_task AS task
+               SET restock_item_id = latest.item_id
+              FROM (
+                    SELECT item.todo_task_id AS task_id, max(item.id) AS item_id
+                      FROM shopify_restock_item item
+                     WHERE item.todo_task_id = ANY(%s)
+                       AND item.inventory_transferred IS NOT TRUE
+                       AND COALESCE(item.identity_key, '') <> ''
+                  GROUP BY item.todo_task_id
+                   ) AS latest
+             WHERE task.id = latest.task_id
+               AND task.restock_item_id IS DISTINCT FROM latest.item_id
+            """,
+            (task_ids,),
+        )
+        item_model.invalidate_model([
+            "is_active_snapshot",
+            "superseded_by_item_id",
+            "superseded_at",
+            "superseded_reason",
+        ])
+        tasks = task_model.browse(task_ids)
+        tasks.invalidate_recordset(["restock_item_id"])
+        tasks.modified(["restock_item_id"])
+        # Legacy items only received their identity key in the item step.
+        tasks._sync_restock_open_identity_key()
+        return task_ids[-1]
 
     # ---------------------------
     # Public entrypoints
@@ -205,27 +417,107 @@ class ShopifyRestockService(models.AbstractModel):
 
     def _run_restock_check_internal(self, send_email: bool = True, email_to_override: str | None = None) -> Dict[str, Any]:
         settings = self._load_settings()
-        try:
-            self._run_snapshot_backfill_once()
-        except Exception:  # pylint: disable=broad-except
-            _logger.exception("Snapshot backfill failed; continuing with current run")
         result: Dict[str, Any]
-        email_to_override = (email_to_override or "").strip() or None
-        actual_email_to = email_to_override or settings.get("email_to")
         location = self.env.context.get("shopify_restock_location")
+        client = self._get_shopify_client(settings)
         try:
-            result = self._generate_report(settings)
+            result = self._generate_report(settings, client)
         except Exception as exc:  # pylint: disable=broad-except
-            result = {"error": str(exc), "rss_items": [], "rss_item_count": 0, "has_restock_alerts": False}
+            result = self._error_result(exc)
+        finally:
+            client.close()
+        api_stats = client.get_stats()
+        result["api_stats"] = api_stats
+        _logger.info("Shopify API usage for restock run: %s", api_stats)
+        self._persist_run(settings, result, location, send_email, email_to_override)
+        return result
+
+    @api.model
+    def run_restock_check_all_locations(
+        self,
+        send_email: bool = True,
+        email_to_override: str | None = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Crawl the catalog once and record one run per active Shopify location.
+
+        Returns the report of each location keyed by ``shopify.restock.location`` id.
+        """
+        service = self
+        if not service.env.context.get("restock_run_by_uid"):
+            service = service.with_context(restock_run_by_uid=service.env.user.id)
+        return service.sudo()._run_all_locations_check_internal(
+            send_email=send_email,
+            email_to_override=email_to_override,
+        )
+
+    def _run_all_locations_check_internal(
+        self,
+        send_email: bool = True,
+        email_to_override: str | None = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        locations = self.env["shopify.restock.location"].search([("location_id_numeric", "!=", False)])
+        if not locations:
+            _logger.warning("No active Shopify location has a numeric id; running the default location only")
+            return {0: self._run_restock_check_internal(send_email=send_email, email_to_override=email_to_override)}
+        service = self.with_context(shopify_restock_location=False)
+        settings = dataclasses.replace(
+            service._load_settings(),
+            inventory_locations=tuple(
+                (location.location_id_numeric.strip(), location.location_id_global.strip())
+                for location in locations
+            ),
+        )
+        client = service._get_shopify_client(settings)
+        try:
+            reports = service._generate_location_reports(settings, client, list(locations))
+        except Exception as exc:  # pylint: disable=broad-except
+            reports = [self._error_result(exc) for _location in locations]
+        finally:
+            client.close()
+        api_stats = client.get_stats()
+        _logger.info(
+            "Shopify API usage for restock run across %s locations: %s",
+            len(locations),
+            api_stats,
+        )
+
+        results: Dict[int, Dict[str, Any]] = {}
+        for location, result in zip(locations, reports):
+            # Every run records the shared crawl's usage: it is what that run cost.
+            result["api_stats"] = api_stats
+            location_service = self.with_context(shopify_restock_location=location)
+            location_service._persist_run(
+                location_service._load_settings(),
+                result,
+                location,
+                send_email,
+                email_to_override,
+            )
+            results[location.id] = result
+        return results
+
+    def _error_result(self, exc: Exception) -> Dict[str, Any]:
+        return {"error": str(exc), "rss_items": [], "rss_item_count": 0, "has_restock_alerts": False}
+
+    def _persist_run(
+        self,
+        settings: RestockSettings,
+        result: Dict[str, Any],
+        location: Optional[models.Model],
+        send_email: bool,
+        email_to_override: str | None,
+    ) -> models.Model:
+        """Email the report, then store the run, its items and their tasks."""
+        email_to_override = (email_to_override or "").strip() or None
+        actual_email_to = email_to_override or settings.email_to
+        api_stats = result.get("api_stats") or {}
 
         email_sent = False
         if send_email:
             try:
                 # allow per-run override
                 if email_to_override:
-                    tmp_settings = dict(settings)
-                    tmp_settings["email_to"] = email_to_override
-                    self._send_summary_email(tmp_settings, result)
+                    self._send_summary_email(dataclasses.replace(settings, email_to=email_to_override), result)
                 else:
                     self._send_summary_email(settings, result)
                 email_sent = True
@@ -233,7 +525,8 @@ class ShopifyRestockService(models.AbstractModel):
                 email_sent = False
 
         # persist run and items
-        run = self.env["shopify.restock.run"].sudo().create({
+        Run = self.env["shopify.restock.run"].sudo()
+        run = Run.create({
             "report_timestamp": fields.Datetime.now(),
             "total_products_found": result.get("total_products_found", 0),
             "total_products_checked": result.get("total_products_checked", 0),
@@ -241,9 +534,14 @@ class ShopifyRestockService(models.AbstractModel):
             "has_restock_alerts": result.get("has_restock_alerts", False),
             "email_sent": email_sent,
             "email_to": actual_email_to,
-            "rss_items_json": json.dumps(result.get("rss_items", []), ensure_ascii=False),
+            "alert_payload": Run._encode_alert_payload(result.get("rss_items") or []),
             "error_message": result.get("error"),
             "location_id": location.id if location else False,
+            "api_request_count": api_stats.get("requests", 0),
+            "api_retry_count": api_stats.get("retries", 0),
+            "api_throttle_wait_count": api_stats.get("throttle_waits", 0),
+            "api_throttle_wait_seconds": api_stats.get("throttle_wait_seconds", 0.0),
+            "api_bytes_received": api_stats.get("bytes_received", 0),
         })
         items_vals = []
         for item in result.get("rss_items", []) or []:
@@ -279,134 +577,208 @@ class ShopifyRestockService(models.AbstractModel):
         elif not result.get("error"):
             project = self._get_restock_project(settings, create_if_missing=False)
             self._deactivate_resolved_snapshots(project, location, set())
-        return result
+        return run
 
     @api.model
     def generate_inventory_report(self) -> Dict[str, Any]:
-        return self.sudo()._generate_inventory_report_internal()
+        """Return the retail inventory report as a list of row dicts.
 
-    def _generate_inventory_report_internal(self) -> Dict[str, Any]:
+        Kept for callers of the original API. It holds every row in memory;
+        downloads go through ``stream_inventory_report`` instead.
+        """
+        settings = self._inventory_report_settings()
+        rows = [
+            {"product_title": product_title, "variant_title": variant_title, "sku": sku, "quantity": quantity}
+            for page in self.sudo()._iter_inventory_report_pages(settings)
+            for product_title, variant_title, sku, quantity in page
+        ]
+        rows.sort(key=lambda row: (row["product_title"], row["variant_title"], row["sku"]))
+        return {
+            "rows": rows,
+            "row_count": len(rows),
+            "location_id_numeric": settings.location_id_numeric,
+        }
+
+    @api.model
+    def stream_inventory_report(self, compress: bool = False) -> Iterator[bytes]:
+        """Yield the retail inventory report as CSV bytes, gzipped when ``compress`` is set."""
+        settings = self._inventory_report_settings()
+        return self.sudo()._iter_inventory_report_csv(settings, compress=compress)
+
+    def _inventory_report_settings(self) -> RestockSettings:
+        """Return the settings the inventory report runs with, or raise if incomplete.
+
+        Called before a download starts so a missing setting surfaces as an
+        error instead of a truncated file.
+        """
         settings = self._load_settings()
         required = ["store_domain", "access_token", "api_version", "location_id_numeric"]
         for key in required:
-            if not settings.get(key):
+            if not getattr(settings, key):
                 raise ValueError(f"Missing configuration: {key}")
+        return settings
 
-        products = self._fetch_all_products(settings)
+    def _iter_inventory_report_csv(self, settings: RestockSettings, compress: bool = False) -> Iterator[bytes]:
+        """Encode the report rows as CSV, one chunk per catalog page.
 
-        inventory_item_ids: List[str] = []
-        for product in products:
-            product_node = product.get("node", {})
-            for variant in (product_node.get("variants") or {}).get("edges", []) or []:
-                v_node = variant.get("node", {})
-                inv_item = v_node.get("inventoryItem")
-                if inv_item and inv_item.get("id"):
-                    inventory_item_ids.append(inv_item["id"])
-
-        inventory_levels_map = self._fetch_inventory_levels_for_items(settings, inventory_item_ids)
-
-        rows: List[Dict[str, Any]] = []
-        for product in products:
-            product_node = product.get("node", {})
-            product_title = product_node.get("title", "")
-
-            for variant in (product_node.get("variants") or {}).get("edges", []) or []:
-                v_node = variant.get("node", {})
-                inv_item_global = (v_node.get("inventoryItem") or {}).get("id")
-                inv_item_numeric = inv_item_global.split("/")[-1] if inv_item_global else None
-                qty = 0
-                if inv_item_numeric and inv_item_numeric in inventory_levels_map:
-                    qty = inventory_levels_map[inv_item_numeric].get("loc1_qty", 0)
-                if not qty:
-                    continue
-
-                rows.append({
-                    "product_title": product_title,
-                    "variant_title": v_node.get("title", "") or "",
-                    "sku": v_node.get("sku", "") or "",
-                    "quantity": qty,
-                })
-
-        rows.sort(key=lambda row: (row.get("product_title", ""), row.get("variant_title", ""), row.get("sku", "")))
-        return {
-            "rows": rows,
-            "row_count": len(rows),
-            "location_id_numeric": settings.get("location_id_numeric"),
-        }
+        Only the current page is held in memory. ``compress`` wraps the
+        output in a gzip stream.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # wbits=31 writes the gzip container rather than a raw zlib stream.
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        writer.writerow(INVENTORY_REPORT_HEADER)
+        for rows in self._iter_inventory_report_pages(settings):
+            writer.writerows(rows)
+            chunk = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        chunk = buffer.getvalue().encode("utf-8")
+        if compressor:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
+
+    def _iter_inventory_report_pages(self, settings: RestockSettings) -> Iterator[List[Tuple[str, str, str, int]]]:
+        """Yield ``(product, variant, sku, quantity)`` rows page by page.
+
+        Only variants with stock at the configured location are reported.
+        The catalog is crawled in title order and each page is sorted, so
+        the rows come out alphabetically without collecting the whole
+        catalog first. Bulk exports cannot be sorted, so the report always
+        uses paginated queries.
+        """
+        settings = dataclasses.replace(settings, fetch_mode=FETCH_MODE_PAGINATED)
+        with self._get_shopify_client(settings) as client:
+            for products in self._iter_catalog_pages(settings, client, sort_by_title=True):
+                inventory_levels_map = self._resolve_inventory_levels(settings, client, products)
+                rows = []
+                for product in products:
+                    for variant in product["variants"]:
+                        qty = self._variant_location_qty(
+                            variant,
+                            inventory_levels_map,
+                            settings.location_id_numeric,
+                        )
+                        if qty:
+                            rows.append((product["title"], variant["title"], variant["sku"], qty))
+                rows.sort(key=lambda row: row[:3])
+                if rows:
+                    yield rows
+            _logger.info("Shopify API usage for inventory report: %s", client.get_stats())
 
     # ---------------------------
     # Settings helpers
     # ---------------------------
-    def _load_settings(self) -> Dict[str, str]:
+    @api.model
+    @tools.ormcache()
+    def _load_global_settings(self) -> RestockSettings:
+        """Read the configuration once and cache it until a parameter is written."""
         ICP = self.env["ir.config_parameter"].sudo()
-        store_domain = ICP.get_param("odoo_shopify_restock.store_domain") or ""
-        access_token = ICP.get_param("odoo_shopify_restock.access_token") or ""
-        api_version = ICP.get_param("odoo_shopify_restock.api_version") or "2023-04"
-        location_id_global = ICP.get_param("odoo_shopify_restock.location_id_global") or ""
-        location_id_numeric = ICP.get_param("odoo_shopify_restock.location_id_numeric") or ""
-        project_id = ICP.get_param("odoo_shopify_restock.project_id") or "0"
-        odoo_location_id = ICP.get_param("odoo_shopify_restock.odoo_location_id") or "0"
-        
+        fetch_mode = (ICP.get_param("odoo_shopify_restock.fetch_mode") or FETCH_MODE_PAGINATED).strip()
+        inventory_mode = (ICP.get_param("odoo_shopify_restock.inventory_mode") or INVENTORY_MODE_REST).strip()
+        catalog_source = (ICP.get_param("odoo_shopify_restock.catalog_source") or CATALOG_SOURCE_LIVE).strip()
+        if inventory_mode == INVENTORY_MODE_LOCAL:
+            # Webhook-fed levels are evaluated against the mirrored thresholds.
+            catalog_source = CATALOG_SOURCE_MIRROR
+        elif catalog_source == CATALOG_SOURCE_MIRROR:
+            # The mirror holds no stock, so live quantities always come from REST.
+            inventory_mode = INVENTORY_MODE_REST
+        inventory_workers = self._config_param_as_int(
+            "odoo_shopify_restock.inventory_workers",
+            default=DEFAULT_INVENTORY_WORKERS,
+        )
+        return RestockSettings(
+            store_domain=(ICP.get_param("odoo_shopify_restock.store_domain") or "").strip(),
+            access_token=(ICP.get_param("odoo_shopify_restock.access_token") or "").strip(),
+            api_version=(ICP.get_param("odoo_shopify_restock.api_version") or "2023-04").strip(),
+            location_id_global=(ICP.get_param("odoo_shopify_restock.location_id_global") or "").strip(),
+            location_id_numeric=(ICP.get_param("odoo_shopify_restock.location_id_numeric") or "").strip(),
+            project_id=self._config_param_as_int("odoo_shopify_restock.project_id"),
+            source_location_id=self._config_param_as_int("odoo_shopify_restock.source_location_id"),
+            odoo_location_id=self._config_param_as_int("odoo_shopify_restock.odoo_location_id"),
+            fetch_mode=fetch_mode,
+            inventory_mode=inventory_mode,
+            catalog_source=catalog_source,
+            inventory_workers=min(max(inventory_workers, 1), MAX_INVENTORY_WORKERS),
+            bulk_poll_interval=self._config_param_as_float(
+                "odoo_shopify_restock.bulk_poll_interval",
+                default=BULK_POLL_INTERVAL_SECONDS,
+            ),
+            bulk_timeout=self._config_param_as_int(
+                "odoo_shopify_restock.bulk_timeout",
+                default=BULK_TIMEOUT_SECONDS,
+            ),
+            inventory_filter_location=self._config_param_as_bool(
+                "odoo_shopify_restock.inventory_filter_location",
+                default=True,
+            ),
+            email_max_rows=max(
+                self._config_param_as_int("odoo_shopify_restock.email_max_rows", default=DEFAULT_EMAIL_MAX_ROWS),
+                0,
+            ),
+        )
+
+    def _load_settings(self) -> RestockSettings:
+        settings = self._load_global_settings()
         # Override with location-specific settings if available
         location = self.env.context.get("shopify_restock_location")
         if location:
-            if hasattr(location, 'location_id_numeric') and location.location_id_numeric:
-                location_id_numeric = location.location_id_numeric
-            if hasattr(location, 'location_id_global') and location.location_id_global:
-                location_id_global = location.location_id_global
-        
-        return {
-            "store_domain": store_domain.strip(),
-            "access_token": access_token.strip(),
-            "api_version": api_version.strip(),
-            "location_id_global": location_id_global.strip(),
-            "location_id_numeric": location_id_numeric.strip(),
-            "project_id": project_id.strip(),
-            "odoo_location_id": odoo_location_id.strip(),
-        }
+            overrides = {}
+            if getattr(location, "location_id_numeric", False):
+                overrides["location_id_numeric"] = location.location_id_numeric.strip()
+            if getattr(location, "location_id_global", False):
+                overrides["location_id_global"] = location.location_id_global.strip()
+            if overrides:
+                settings = dataclasses.replace(settings, **overrides)
+        return settings
 
-    def _load_schedule_settings(self) -> Dict[str, Any]:
+    @api.model
+    @tools.ormcache()
+    def _load_global_schedule_settings(self) -> ScheduleSettings:
         ICP = self.env["ir.config_parameter"].sudo()
-        selected_weekdays = [
-            weekday_index
-            for weekday_index, param_key in SCHEDULE_DAY_PARAM_KEYS
-            if self._config_param_as_bool(param_key, default=weekday_index < 5)
-        ]
-        schedule_time = self._config_param_as_float(
-            "odoo_shopify_restock.schedule_time",
-            default=9.0,
-        )
-        scheduled_minutes = int(round(schedule_time * 60))
-        scheduled_minutes = min(max(scheduled_minutes, 0), 23 * 60 + 59)
-
-        employee = self.env["hr.employee"].sudo().browse(
-            self._config_param_as_int("odoo_shopify_restock.schedule_employee_id")
-        )
-        location = self.env["shopify.restock.location"].sudo().browse(
-            self._config_param_as_int("odoo_shopify_restock.schedule_location_id")
+        scheduled_minutes = int(round(self._config_param_as_float("odoo_shopify_restock.schedule_time", default=9.0) * 60))
+        return ScheduleSettings(
+            enabled=self._config_param_as_bool("odoo_shopify_restock.schedule_enabled", default=False),
+            selected_weekdays=tuple(
+                weekday_index
+                for weekday_index, param_key in SCHEDULE_DAY_PARAM_KEYS
+                if self._config_param_as_bool(param_key, default=weekday_index < 5)
+            ),
+            scheduled_minutes=min(max(scheduled_minutes, 0), 23 * 60 + 59),
+            timezone_name=ICP.get_param("odoo_shopify_restock.schedule_timezone") or "",
+            employee_id=self._config_param_as_int("odoo_shopify_restock.schedule_employee_id"),
+            location_id=self._config_param_as_int("odoo_shopify_restock.schedule_location_id"),
+            all_locations=self._config_param_as_bool("odoo_shopify_restock.schedule_all_locations", default=False),
+            owner_user_id=self._config_param_as_int("odoo_shopify_restock.schedule_owner_user_id"),
+            last_run_on=ICP.get_param("odoo_shopify_restock.schedule_last_run_on") or "",
         )
 
+    def _load_schedule_settings(self) -> Dict[str, Any]:
+        schedule = self._load_global_schedule_settings()
+        employee = self.env["hr.employee"].sudo().browse(schedule.employee_id)
+        location = self.env["shopify.restock.location"].sudo().browse(schedule.location_id)
         return {
-            "enabled": self._config_param_as_bool(
-                "odoo_shopify_restock.schedule_enabled",
-                default=False,
-            ),
-            "selected_weekdays": selected_weekdays,
-            "schedule_time": scheduled_minutes / 60.0,
-            "scheduled_minutes": scheduled_minutes,
+            "enabled": schedule.enabled,
+            "selected_weekdays": list(schedule.selected_weekdays),
+            "schedule_time": schedule.scheduled_minutes / 60.0,
+            "scheduled_minutes": schedule.scheduled_minutes,
             "timezone_name": (
-                ICP.get_param("odoo_shopify_restock.schedule_timezone")
+                schedule.timezone_name
                 or self.env.user.tz
                 or self.env.context.get("tz")
                 or "UTC"
             ),
             "employee": employee if employee.exists() else self.env["hr.employee"],
             "location": location if location.exists() else self.env["shopify.restock.location"],
-            "owner_user_id": self._config_param_as_int(
-                "odoo_shopify_restock.schedule_owner_user_id",
-                default=self.env.user.id,
-            ),
-            "last_run_on": ICP.get_param("odoo_shopify_restock.schedule_last_run_on") or "",
+            "all_locations": schedule.all_locations,
+            "owner_user_id": schedule.owner_user_id or self.env.user.id,
+            "last_run_on": schedule.last_run_on,
         }
 
     def _get_schedule_timezone(self, timezone_name: str):
@@ -420,23 +792,52 @@ class ShopifyRestockService(models.AbstractModel):
         now_utc = fields.Datetime.now().replace(tzinfo=timezone.utc)
         return now_utc.astimezone(self._get_schedule_timezone(timezone_name))
 
+    def _next_scheduled_run(self, schedule: Dict[str, Any], now_utc: Optional[datetime] = None) -> Optional[datetime]:
+        """Return the next scheduled run as a naive UTC datetime, or None when nothing is scheduled.
+
+        The wall-clock time is resolved in the schedule time zone for each
+        candidate day, so the UTC instant follows DST changes. A time skipped
+        by a spring-forward gap resolves to the same instant as the hour after it.
+        """
+        if not schedule["enabled"] or not schedule["selected_weekdays"]:
+            return None
+        tz = self._get_schedule_timezone(schedule["timezone_name"])
+        now_utc = (now_utc or fields.Datetime.now()).replace(tzinfo=timezone.utc)
+        local_today = now_utc.astimezone(tz).date()
+        run_at = dt_time(schedule["scheduled_minutes"] // 60, schedule["scheduled_minutes"] % 60)
+        for day_offset in range(8):
+            day = local_today + timedelta(days=day_offset)
+            if day.weekday() not in schedule["selected_weekdays"]:
+                continue
+            if day.isoformat() == schedule["last_run_on"]:
+                continue
+            candidate = datetime.combine(day, run_at, tzinfo=tz).astimezone(timezone.utc)
+            if candidate <= now_utc:
+                continue
+            return candidate.replace(tzinfo=None)
+        return None
+
     @api.model
     def sync_schedule_cron(self) -> bool:
+        """Point the restock cron at the next scheduled run.
+
+        The cron itself only repeats weekly as a safety net; every scheduled
+        run reschedules the next one through ``_schedule_next_restock_check``.
+        """
         cron = self.env.ref("odoo_shopify_restock.ir_cron_shopify_restock", raise_if_not_found=False)
         if not cron:
             return False
 
         schedule = self._load_schedule_settings()
-        next_poll = (
-            fields.Datetime.now().replace(tzinfo=timezone.utc) + timedelta(minutes=1)
-        ).replace(second=0, microsecond=0, tzinfo=None)
+        next_run = self._next_scheduled_run(schedule)
 
         cron_vals = {
             "interval_number": 1,
-            "interval_type": "minutes",
-            "active": bool(schedule["enabled"] and schedule["selected_weekdays"]),
-            "nextcall": fields.Datetime.to_string(next_poll),
+            "interval_type": "weeks",
+            "active": bool(next_run),
         }
+        if next_run:
+            cron_vals["nextcall"] = fields.Datetime.to_string(next_run)
         if "numbercall" in cron._fields:
             cron_vals["numbercall"] = -1
         if "doall" in cron._fields:
@@ -444,8 +845,23 @@ class ShopifyRestockService(models.AbstractModel):
         cron.sudo().write(cron_vals)
         return True
 
+    def _schedule_next_restock_check(self) -> Optional[datetime]:
+        # The cron runner overwrites nextcall once the job returns, so the next
+        # run is requested through a trigger instead.
+        cron = self.env.ref("odoo_shopify_restock.ir_cron_shopify_restock", raise_if_not_found=False)
+        next_run = self._next_scheduled_run(self._load_schedule_settings())
+        if cron and next_run:
+            cron.sudo()._trigger(at=next_run)
+        return next_run
+
     @api.model
     def run_scheduled_restock_check(self) -> Dict[str, Any]:
+        try:
+            return self._run_scheduled_restock_check_internal()
+        finally:
+            self._schedule_next_restock_check()
+
+    def _run_scheduled_restock_check_internal(self) -> Dict[str, Any]:
         schedule = self._load_schedule_settings()
         if not schedule["enabled"]:
             return {"scheduled": False, "reason": "disabled"}
@@ -485,6 +901,12 @@ class ShopifyRestockService(models.AbstractModel):
             schedule["timezone_name"],
         )
         try:
+            if schedule["all_locations"]:
+                run_context.pop("shopify_restock_location", None)
+                return self.with_context(run_context).run_restock_check_all_locations(
+                    send_email=bool(email_to_override),
+                    email_to_override=email_to_override or None,
+                )
             return self.with_context(run_context).run_restock_check(
                 send_email=bool(email_to_override),
                 email_to_override=email_to_override or None,
@@ -501,167 +923,1170 @@ class ShopifyRestockService(models.AbstractModel):
     def _convert_metafield_value(self, value_type: Optional[str], value: Any) -> Any:
         if value is None:
             return None
-        try:
-            if value_type == "number_integer":
-                return int(value)
-            if value_type == "number_decimal":
-                return float(value)
-            if value_type == "boolean":
-                return str(value).lower() == "true"
-            if value_type == "json":
-                return json.loads(value)
+        converter = METAFIELD_CONVERTERS.get(value_type)
+        if converter is None:
             return value
+        try:
+            return converter(value)
         except Exception:  # pylint: disable=broad-except
             return None
 
-    def _get_metafield_value(self, metafields: Optional[Dict[str, Any]], target_key: str) -> Any:
+    def _decode_threshold_metafields(self, metafields: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Decode the threshold metafields of one connection in a single pass.
+
+        Returns a dict keyed like the normalized records (``restock_level``,
+        ``desired_level``); thresholds that are not set map to ``None``. Only
+        the first metafield for a key is decoded, like Shopify's own lookup.
+        """
+        values = dict.fromkeys(THRESHOLD_METAFIELD_KEYS.values())
         if not metafields:
-            return None
+            return values
+        pending = dict(THRESHOLD_METAFIELD_KEYS)
         for edge in metafields.get("edges", []) or []:
-            node = edge.get("node", {})
-            if node.get("key") == target_key:
-                return self._convert_metafield_value(node.get("type"), node.get("value"))
-        return None
+            node = edge.get("node") or {}
+            record_key = pending.pop(node.get("key"), None)
+            if record_key is None:
+                continue
+            values[record_key] = self._convert_metafield_value(node.get("type"), node.get("value"))
+            if not pending:
+                break
+        return values
+
+    def _get_shopify_client(self, settings: RestockSettings) -> ShopifyClient:
+        """Return a new HTTP client; callers own it and must close it."""
+        return ShopifyClient(
+            self._shopify_base_url(settings),
+            settings.access_token,
+            settings.api_version,
+            pool_size=max(settings.inventory_workers or 1, 10),
+        )
 
-    def _is_published_to_online_store(self, publications: Optional[Dict[str, Any]]) -> bool:
-        if not publications:
-            return False
-        for edge in publications.get("edges", []) or []:
-            node = edge.get("node", {})
-            channel = node.get("channel", {})
-            channel_handle = (channel.get("handle") or "").lower()
-            channel_name = (channel.get("name") or "").lower()
-            is_online_store = (
-                channel_handle in ["online-store", "online_store"]
-                or "online store" in channel_name
-                or channel_name == "online store"
-            )
-            if is_online_store and node.get("isPublished"):
-                return True
-        return False
+    def _shopify_base_url(self, settings: RestockSettings) -> str:
+        """Return the shop origin; a domain that already carries a scheme is used as is.
 
-    def _is_published_to_channel(
-        self,
-        publications: Optional[Dict[str, Any]],
-        *,
-        target_names: Optional[List[str]] = None,
-        target_handles: Optional[List[str]] = None,
-    ) -> bool:
-        """Check whether a product is published to any of the target channels."""
-        if not publications:
-            return False
-        name_targets = {name.strip().lower() for name in (target_names or []) if name}
-        handle_targets = {handle.strip().lower() for handle in (target_handles or []) if handle}
-        if not name_targets and not handle_targets:
-            return False
-        for edge in publications.get("edges", []) or []:
-            node = edge.get("node", {})
-            if not node.get("isPublished"):
-                continue
-            channel = node.get("channel", {})
-            channel_name = (channel.get("name") or "").strip().lower()
-            channel_handle = (channel.get("handle") or "").strip().lower()
-            if channel_name in name_targets or channel_handle in handle_targets:
-                return True
-        return False
+        Accepting ``http://localhost:8069``-style values lets the crawl run against a
+        local fake endpoint.
+        """
+        domain = settings.store_domain
+        if "://" in domain:
+            return domain.rstrip("/")
+        return f"https://{domain}"
 
-    def _fetch_all_products(self, settings: Dict[str, str]) -> List[Dict[str, Any]]:
-        query = (
-            "\n"
-            "    query ($cursor: String) {\n"
-            "      products(first: 50, after: $cursor) {\n"
-            "        edges {\n"
-            "          node {\n"
+    def _location_gid(self, settings: RestockSettings) -> str:
+        if settings.location_id_global:
+            return settings.location_id_global
+        return f"gid://shopify/Location/{settings.location_id_numeric}"
+
+    def _inventory_locations(self, settings: RestockSettings) -> List[Tuple[str, str]]:
+        """Return the ``(numeric id, global id)`` pairs whose quantities the crawl keeps.
+
+        A normal run tracks its one configured location; the all-locations run
+        sets ``inventory_locations`` so a single crawl serves every location.
+        """
+        locations = settings.inventory_locations
+        if locations:
+            return [
+                (numeric, global_id or f"gid://shopify/Location/{numeric}")
+                for numeric, global_id in locations
+            ]
+        return [(settings.location_id_numeric, self._location_gid(settings))]
+
+    def _inline_level_alias(self, location_id_numeric: str) -> str:
+        return f"level_{location_id_numeric}"
+
+    def _build_inventory_item_selection(self, settings: RestockSettings) -> str:
+        if settings.inventory_mode != INVENTORY_MODE_INLINE:
+            return "inventoryItem { id }"
+        if (settings.api_version or "") < INVENTORY_QUANTITIES_API_VERSION:
+            level_fields = "available"
+        else:
+            level_fields = 'quantities(names: ["available"]) { name quantity }'
+        # One aliased level per tracked location. Bulk queries do not accept
+        # variables, so the location ids are inlined as literals.
+        levels = " ".join(
+            f"{self._inline_level_alias(numeric)}: "
+            f"inventoryLevel(locationId: {json.dumps(global_id)}) {{ {level_fields} }}"
+            for numeric, global_id in self._inventory_locations(settings)
+        )
+        return f"inventoryItem {{ id {levels} }}"
+
+    def _build_products_selection(self, settings: RestockSettings, *, bulk: bool = False) -> str:
+        """Return the product node selection shared by paginated and bulk crawls.
+
+        Bulk operations ignore connection sizes and reject ``first`` on nested
+        connections, so those arguments are only emitted for paginated queries.
+        """
+        metafields_args = 'namespace: "custom"' if bulk else 'namespace: "custom", first: 5'
+        publications_args = "" if bulk else "(first: 10)"
+        variants_args = "" if bulk else f"(first: {VARIANT_PAGE_SIZE})"
+        return (
             "            id\n"
             "            title\n"
             "            handle\n"
-            "            metafields(namespace: \"custom\", first: 5) {\n"
+            f"            metafields({metafields_args}) {{\n"
             "              edges { node { key value type } }\n"
             "            }\n"
-            "            publications(first: 10) {\n"
+            f"            publications{publications_args} {{\n"
             "              edges { node { channel { id name handle } isPublished publishDate } }\n"
             "            }\n"
-            "            variants(first: 50) {\n"
+            f"            variants{variants_args} {{\n"
+            f"{self._build_variant_connection_body(settings, bulk=bulk)}"
+            "            }\n"
+        )
+
+    def _build_variant_connection_body(self, settings: RestockSettings, *, bulk: bool = False) -> str:
+        metafields_args = 'namespace: "custom"' if bulk else 'namespace: "custom", first: 5'
+        body = (
             "              edges {\n"
             "                node {\n"
             "                  id title sku\n"
-            "                  inventoryItem { id }\n"
-            "                  metafields(namespace: \"custom\", first: 5) {\n"
+            f"                  {self._build_inventory_item_selection(settings)}\n"
+            f"                  metafields({metafields_args}) {{\n"
             "                    edges { node { key value type } }\n"
             "                  }\n"
             "                }\n"
             "              }\n"
-            "            }\n"
+        )
+        if not bulk:
+            # Lets the crawler notice products with more variants than one page holds.
+            body += "              pageInfo { hasNextPage endCursor }\n"
+        return body
+
+    def _iter_catalog_pages(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        sort_by_title: bool = False,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the catalog as pages of normalized product records.
+
+        The live source crawls Shopify, prefetching the next page in the
+        background. The mirror source first brings the local copy up to date
+        and then reads it, so only products changed since the last sync are
+        downloaded. Local inventory mode reads the mirror as is: webhooks and
+        ``_sync_local_inventory`` keep it current, and no request is sent.
+
+        ``sort_by_title`` returns products in title order from the mirror and
+        from paginated crawls. Bulk exports keep Shopify's export order.
+        """
+        if settings.catalog_source == CATALOG_SOURCE_MIRROR:
+            if settings.inventory_mode != INVENTORY_MODE_LOCAL:
+                self._sync_catalog_mirror(settings, client)
+            yield from self._iter_mirror_pages(order="title, id" if sort_by_title else None)
+            return
+        classifier = ChannelClassifier()
+        pages = self._iter_product_pages(settings, client, sort_key="TITLE" if sort_by_title else None)
+        for products in self._prefetch_pages(pages):
+            yield [self._normalize_product(product.get("node", {}), classifier) for product in products]
+
+    def _normalize_product(
+        self,
+        product_node: Dict[str, Any],
+        classifier: Optional[ChannelClassifier] = None,
+    ) -> Dict[str, Any]:
+        """Flatten a GraphQL product node into the record the report pipeline reads.
+
+        Metafields are decoded and publications reduced to the two flags the
+        publication scope needs, through the run's ``classifier``. Raw
+        publications are kept for debug logging.
+        """
+        thresholds = self._decode_threshold_metafields(product_node.get("metafields"))
+        publications = product_node.get("publications")
+        published_online, published_retail = (classifier or ChannelClassifier()).published_flags(publications)
+        return {
+            "id": product_node.get("id", ""),
+            "title": product_node.get("title", ""),
+            "handle": product_node.get("handle", ""),
+            "restock_level": thresholds["restock_level"],
+            "desired_level": thresholds["desired_level"],
+            "published_online": published_online,
+            "published_retail": published_retail,
+            "publications": publications,
+            "variants": [
+                self._normalize_variant(edge.get("node", {}))
+                for edge in (product_node.get("variants") or {}).get("edges", []) or []
+            ],
+        }
+
+    def _normalize_variant(self, v_node: Dict[str, Any]) -> Dict[str, Any]:
+        thresholds = self._decode_threshold_metafields(v_node.get("metafields"))
+        return {
+            "id": v_node.get("id", ""),
+            "title": v_node.get("title", "") or "",
+            "sku": v_node.get("sku", "") or "",
+            # Kept whole: inline mode carries the location levels inside it.
+            "inventory_item": v_node.get("inventoryItem") or {},
+            "restock_level": thresholds["restock_level"],
+            "desired_level": thresholds["desired_level"],
+        }
+
+    # ---------------------------
+    # Catalog mirror
+    # ---------------------------
+    def _sync_catalog_mirror(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        sweep_deleted: bool = False,
+    ) -> Dict[str, int]:
+        """Bring ``shopify.restock.catalog.product`` up to date with Shopify.
+
+        Only products updated since the last sync are crawled, through the
+        ``updated_at`` search filter. A full crawl runs when there is no
+        checkpoint or the last one is older than ``CATALOG_FULL_SYNC_DAYS``.
+
+        Deleted products never match the filter, so incremental syncs leave
+        their removal to the ``products/delete`` webhook. ``sweep_deleted``
+        adds an id-only crawl of the whole shop that removes any the webhook
+        missed; only the daily local inventory sync asks for it.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        Product = self.env["shopify.restock.catalog.product"].sudo()
+        started_at = datetime.now(timezone.utc)
+        synced_at = self._parse_sync_checkpoint(ICP.get_param("odoo_shopify_restock.catalog_synced_at"))
+        full_synced_at = self._parse_sync_checkpoint(ICP.get_param("odoo_shopify_restock.catalog_full_synced_at"))
+        full_sync = (
+            not synced_at
+            or not full_synced_at
+            or started_at - full_synced_at > timedelta(days=CATALOG_FULL_SYNC_DAYS)
+        )
+        search_query = None
+        if not full_sync:
+            since = synced_at - timedelta(seconds=CATALOG_SYNC_OVERLAP_SECONDS)
+            search_query = f"updated_at:>'{since.strftime('%Y-%m-%dT%H:%M:%SZ')}'"
+
+        seen_product_ids: Set[str] = set()
+        fetched = 0
+        changed = 0
+        classifier = ChannelClassifier()
+        for products in self._prefetch_pages(self._iter_product_pages(settings, client, search_query=search_query)):
+            records = [self._normalize_product(product.get("node", {}), classifier) for product in products]
+            fetched += len(records)
+            seen_product_ids.update(record["id"] for record in records)
+            changed += Product._sync_records(records)
+        removed = 0
+        if full_sync:
+            removed = Product._remove_missing(seen_product_ids)
+        elif sweep_deleted:
+            removed = Product._remove_missing(self._iter_product_ids(settings, client))
+
+        checkpoint = started_at.isoformat()
+        ICP.set_param("odoo_shopify_restock.catalog_synced_at", checkpoint)
+        if full_sync:
+            ICP.set_param("odoo_shopify_restock.catalog_full_synced_at", checkpoint)
+        _logger.info(
+            "Catalog mirror %s sync: %s products fetched, %s changed, %s removed",
+            "full" if full_sync else "incremental",
+            fetched,
+            changed,
+            removed,
+        )
+        return {"fetched": fetched, "changed": changed, "removed": removed, "full_sync": int(full_sync)}
+
+    def _parse_sync_checkpoint(self, value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed
+
+    def _iter_product_ids(self, settings: RestockSettings, client: ShopifyClient) -> Iterator[str]:
+        """Yield the id of every product in the shop, fetching nothing else."""
+        if settings.fetch_mode == FETCH_MODE_BULK:
+            result_url = self._run_bulk_operation(
+                settings,
+                client,
+                "{ products { edges { node { id } } } }",
+            )
+            if result_url:
+                for record in self._iter_bulk_jsonl(client, result_url):
+                    if record.get("id") and not record.get("__parentId"):
+                        yield record["id"]
+            return
+        query = (
+            "query ($cursor: String, $first: Int!) {\n"
+            "  products(first: $first, after: $cursor) {\n"
+            "    edges { node { id } }\n"
+            "    pageInfo { hasNextPage endCursor }\n"
+            "  }\n"
+            "}\n"
+        )
+        cursor: Optional[str] = None
+        while True:
+            variables: Dict[str, Any] = {"first": PRODUCT_ID_PAGE_SIZE}
+            if cursor:
+                variables["cursor"] = cursor
+            products_data = client.graphql(query, variables)["products"]
+            for edge in products_data["edges"]:
+                yield edge["node"]["id"]
+            if not products_data["pageInfo"]["hasNextPage"]:
+                break
+            cursor = products_data["pageInfo"]["endCursor"]
+
+    def _iter_mirror_pages(self, order: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the mirrored catalog as pages of normalized product records.
+
+        Each page is searched on its own and the ORM cache is dropped after it,
+        so memory stays bounded by the page size rather than the catalog.
+        """
+        Product = self.env["shopify.restock.catalog.product"].sudo()
+        Variant = self.env["shopify.restock.catalog.variant"].sudo()
+        offset = 0
+        while True:
+            products = Product.search([], order=order, limit=BULK_PAGE_SIZE, offset=offset)
+            if not products:
+                break
+            variants_by_product: Dict[int, List[models.Model]] = {}
+            for variant in Variant.search([("product_id", "in", products.ids)]):
+                variants_by_product.setdefault(variant.product_id.id, []).append(variant)
+            page = [
+                self._mirror_record(product, variants_by_product.get(product.id, []))
+                for product in products
+            ]
+            Product.invalidate_model()
+            Variant.invalidate_model()
+            yield page
+            if len(products) < BULK_PAGE_SIZE:
+                break
+            offset += BULK_PAGE_SIZE
+
+    def _mirror_level(self, value: float) -> Any:
+        # Unset thresholds are stored as 0; whole numbers read back as ints like the metafields.
+        if not value:
+            return None
+        return int(value) if float(value).is_integer() else value
+
+    def _mirror_record(self, product: models.Model, variants: List[models.Model]) -> Dict[str, Any]:
+        return {
+            "id": product.product_id_global,
+            "title": product.title or "",
+            "handle": product.handle or "",
+            "restock_level": self._mirror_level(product.restock_level),
+            "desired_level": self._mirror_level(product.desired_inventory_level),
+            "published_online": product.published_online,
+            "published_retail": product.published_retail,
+            "publications": None,
+            "variants": [
+                {
+                    "id": variant.variant_id_global,
+                    "title": variant.title or "",
+                    "sku": variant.sku or "",
+                    "inventory_item": {"id": variant.inventory_item_id_global or None},
+                    "restock_level": self._mirror_level(variant.restock_level),
+                    "desired_level": self._mirror_level(variant.desired_inventory_level),
+                }
+                for variant in variants
+            ],
+        }
+
+    @api.model
+    def _sync_local_inventory(self) -> Dict[str, int]:
+        """Sync the catalog mirror and reload every stored inventory level from Shopify.
+
+        Webhooks only report changes, so this seeds the level table used by
+        the local inventory mode and repairs any webhook that was missed,
+        including deleted products that incremental syncs do not look for.
+        """
+        service = self.sudo()
+        settings = dataclasses.replace(
+            service._load_settings(),
+            inventory_mode=INVENTORY_MODE_REST,
+            catalog_source=CATALOG_SOURCE_MIRROR,
+        )
+        locations = service.env["shopify.restock.location"].search([("location_id_numeric", "!=", False)])
+        if locations:
+            settings = dataclasses.replace(
+                settings,
+                inventory_locations=tuple(
+                    (location.location_id_numeric.strip(), location.location_id_global.strip())
+                    for location in locations
+                ),
+            )
+        with service._get_shopify_client(settings) as client:
+            stats = service._sync_catalog_mirror(settings, client, sweep_deleted=True)
+            inventory_item_ids = [
+                inv_item_id
+                for inv_item_id in service.env["shopify.restock.catalog.variant"].search([]).mapped(
+                    "inventory_item_id_global"
+                )
+                if inv_item_id
+            ]
+            inv_map = service._fetch_inventory_levels_for_items(settings, client, inventory_item_ids)
+            _logger.info("Shopify API usage for local inventory sync: %s", client.get_stats())
+        stats["levels"] = service.env["shopify.restock.inventory.level"]._upsert_levels(
+            (int(inventory_item_id), int(location_id), available, None)
+            for inventory_item_id, levels in inv_map.items()
+            for location_id, available in levels.items()
+        )
+        return stats
+
+    @api.model
+    def _handle_webhook(self, topic: str, payload: Dict[str, Any]) -> bool:
+        """Apply a verified Shopify webhook; return False for topics this module ignores.
+
+        Private so it cannot be called over RPC: only the controller, after
+        checking the HMAC signature, may apply a payload.
+        """
+        service = self.sudo()
+        if topic == WEBHOOK_TOPIC_INVENTORY_LEVELS_UPDATE:
+            if not payload.get("inventory_item_id") or not payload.get("location_id"):
+                return False
+            service.env["shopify.restock.inventory.level"]._upsert_levels([(
+                payload["inventory_item_id"],
+                payload["location_id"],
+                payload.get("available"),
+                service._webhook_timestamp(payload.get("updated_at")),
+            )])
+            return True
+        if topic == WEBHOOK_TOPIC_PRODUCTS_UPDATE:
+            if not payload.get("id"):
+                return False
+            service.env["shopify.restock.catalog.product"]._sync_records([service._webhook_product_record(payload)])
+            return True
+        if topic == WEBHOOK_TOPIC_PRODUCTS_DELETE:
+            if not payload.get("id"):
+                return False
+            service.env["shopify.restock.catalog.product"]._remove_products([f"gid://shopify/Product/{payload['id']}"])
+            return True
+        return False
+
+    def _webhook_timestamp(self, value: Optional[str]) -> Optional[datetime]:
+        """Convert a webhook ISO timestamp to the naive UTC datetime Odoo stores."""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    def _webhook_product_record(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a partial mirror record from a REST ``products/update`` payload.
+
+        The payload has no publication list and only carries metafields when the
+        webhook subscription asks for the ``custom`` namespace, so thresholds
+        and the Retail flag are left out unless the payload can tell.
+        """
+        record: Dict[str, Any] = {
+            "id": payload.get("admin_graphql_api_id") or f"gid://shopify/Product/{payload['id']}",
+            "title": payload.get("title") or "",
+            "handle": payload.get("handle") or "",
+            "variants": [],
+        }
+        if "status" in payload:
+            active = payload.get("status") == "active"
+            # published_at tracks the Online Store channel in the REST representation.
+            record["published_online"] = active and bool(payload.get("published_at"))
+            if not active:
+                record["published_retail"] = False
+        if isinstance(payload.get("metafields"), list):
+            record.update(self._decode_threshold_metafields({
+                "edges": [
+                    {"node": metafield}
+                    for metafield in payload["metafields"]
+                    if metafield.get("namespace") == "custom"
+                ]
+            }))
+        for variant in payload.get("variants") or []:
+            inventory_item_id = variant.get("inventory_item_id")
+            record["variants"].append({
+                "id": variant.get("admin_graphql_api_id") or f"gid://shopify/ProductVariant/{variant.get('id')}",
+                "title": variant.get("title") or "",
+                "sku": variant.get("sku") or "",
+                "inventory_item": {
+                    "id": f"gid://shopify/InventoryItem/{inventory_item_id}" if inventory_item_id else None,
+                },
+            })
+        return record
+
+    def _iter_product_pages(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        search_query: Optional[str] = None,
+        sort_key: Optional[str] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the catalog as successive pages of product edges.
+
+        ``search_query`` restricts the crawl with Shopify's product search
+        syntax and ``sort_key`` orders paginated crawls by a
+        ``ProductSortKeys`` value; bulk exports ignore it. Runs in the
+        prefetch thread: it must only use ``settings`` and ``client``, never
+        the ORM environment.
+        """
+        if settings.fetch_mode == FETCH_MODE_BULK:
+            page: List[Dict[str, Any]] = []
+            for product in self._iter_bulk_products(settings, client, search_query=search_query):
+                page.append(product)
+                if len(page) >= BULK_PAGE_SIZE:
+                    yield page
+                    page = []
+            if page:
+                yield page
+            return
+        sort_argument = f", sortKey: {sort_key}" if sort_key else ""
+        query = (
+            "\n"
+            "    query ($cursor: String, $first: Int!, $query: String) {\n"
+            f"      products(first: $first, after: $cursor, query: $query{sort_argument}) {{\n"
+            "        edges {\n"
+            "          node {\n"
+            f"{self._build_products_selection(settings)}"
             "          }\n"
             "        }\n"
             "        pageInfo { hasNextPage endCursor }\n"
             "      }\n"
             "    }\n"
         )
-        all_products: List[Dict[str, Any]] = []
-        cursor: Optional[str] = None
-        headers = {
-            "Content-Type": "application/json",
-            "X-Shopify-Access-Token": settings["access_token"],
-        }
-        base_url = f"https://{settings['store_domain']}/admin/api/{settings['api_version']}/graphql.json"
-        while True:
-            variables = {"cursor": cursor} if cursor else {}
-            response = requests.post(base_url, headers=headers, json={"query": query, "variables": variables}, timeout=60)
-            response.raise_for_status()
-            response_json = response.json()
-            if "data" not in response_json:
-                raise ValueError(f"GraphQL query error: {response_json.get('errors')}")
-            products_data = response_json["data"]["products"]
-            all_products.extend(products_data["edges"]) 
-            if not products_data["pageInfo"]["hasNextPage"]:
-                break
-            cursor = products_data["pageInfo"]["endCursor"]
-        return all_products
+        cursor: Optional[str] = None
+        page_size = PRODUCT_PAGE_SIZE_MAX
+        while True:
+            variables: Dict[str, Any] = {"first": page_size}
+            if cursor:
+                variables["cursor"] = cursor
+            if search_query:
+                variables["query"] = search_query
+            try:
+                products_data = client.graphql(query, variables)["products"]
+                # Variant follow-ups below overwrite last_query_cost; size the next page from this query.
+                page_cost = client.last_query_cost
+            except ShopifyQueryCostError as exc:
+                if page_size <= PRODUCT_PAGE_SIZE_MIN:
+                    raise
+                page_size = self._shrink_page_size(page_size, exc.requested_cost, exc.max_cost)
+                _logger.info("Products query too expensive, retrying with first=%s", page_size)
+                continue
+            edges = products_data["edges"]
+            self._complete_truncated_variants(settings, client, edges)
+            yield edges
+            if not products_data["pageInfo"]["hasNextPage"]:
+                break
+            cursor = products_data["pageInfo"]["endCursor"]
+            page_size = self._adapt_page_size(page_size, page_cost)
+
+    def _shrink_page_size(
+        self,
+        page_size: int,
+        requested_cost: Optional[float],
+        max_cost: Optional[float],
+        minimum: int = PRODUCT_PAGE_SIZE_MIN,
+    ) -> int:
+        if requested_cost and max_cost:
+            target = int(page_size * max_cost * PRODUCT_PAGE_COST_SHARE / requested_cost)
+        else:
+            target = page_size // 2
+        return max(min(target, page_size - 1), minimum)
+
+    def _adapt_page_size(self, page_size: int, query_cost: Optional[Dict[str, Any]]) -> int:
+        """Shrink ``first:`` when a page requests a large share of the cost bucket, grow it back otherwise."""
+        if not query_cost:
+            return page_size
+        requested = query_cost.get("requestedQueryCost")
+        maximum = (query_cost.get("throttleStatus") or {}).get("maximumAvailable")
+        if not requested or not maximum:
+            return page_size
+        budget = float(maximum) * PRODUCT_PAGE_COST_SHARE
+        if requested > budget:
+            return self._shrink_page_size(page_size, requested, maximum)
+        if requested < budget / 2 and page_size < PRODUCT_PAGE_SIZE_MAX:
+            return min(page_size * 2, PRODUCT_PAGE_SIZE_MAX)
+        return page_size
+
+    def _complete_truncated_variants(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        edges: List[Dict[str, Any]],
+    ) -> None:
+        """Fetch the variants beyond the first page for every product that has more.
+
+        Truncated products are batched into one aliased query per round
+        instead of one query per product. A batch that exceeds the query cost
+        limit is retried with fewer products, like the products page itself.
+        Ids and cursors travel as variables, so the query text depends only on
+        the batch size and the client's cost estimates apply to it.
+        """
+        pending: Dict[str, Tuple[Dict[str, Any], str]] = {}
+        for edge in edges:
+            node = edge.get("node") or {}
+            variants = node.get("variants") or {}
+            page_info = variants.get("pageInfo") or {}
+            if page_info.get("hasNextPage") and node.get("id"):
+                pending[node["id"]] = (node, page_info.get("endCursor"))
+        if not pending:
+            return
+        variant_body = self._build_variant_connection_body(settings)
+        batch_size = VARIANT_FOLLOWUP_BATCH
+        while pending:
+            batch = list(pending.items())[:batch_size]
+            declarations = []
+            parts = []
+            variables: Dict[str, Any] = {}
+            for index, (product_id, (_node, cursor)) in enumerate(batch):
+                declarations.append(f"$id{index}: ID!, $cursor{index}: String")
+                variables[f"id{index}"] = product_id
+                variables[f"cursor{index}"] = cursor
+                parts.append(
+                    f"  p{index}: product(id: $id{index}) {{\n"
+                    f"    variants(first: {VARIANT_PAGE_SIZE}, after: $cursor{index}) {{\n"
+                    f"{variant_body}"
+                    "    }\n"
+                    "  }\n"
+                )
+            query = f"query ({', '.join(declarations)}) {{\n" + "".join(parts) + "}\n"
+            try:
+                data = client.graphql(query, variables)
+            except ShopifyQueryCostError as exc:
+                if len(batch) <= 1:
+                    raise
+                batch_size = self._shrink_page_size(len(batch), exc.requested_cost, exc.max_cost, minimum=1)
+                _logger.info("Variant follow-up query too expensive, retrying with %s products", batch_size)
+                continue
+            for index, (product_id, (node, _cursor)) in enumerate(batch):
+                product_data = data.get(f"p{index}") or {}
+                variants_data = product_data.get("variants") or {}
+                node["variants"]["edges"].extend(variants_data.get("edges") or [])
+                page_info = variants_data.get("pageInfo") or {}
+                node["variants"]["pageInfo"] = page_info
+                if page_info.get("hasNextPage") and product_data:
+                    pending[product_id] = (node, page_info.get("endCursor"))
+                else:
+                    del pending[product_id]
+
+    def _prefetch_pages(self, pages: Iterator[List[Dict[str, Any]]], depth: int = PREFETCH_PAGES) -> Iterator[List[Dict[str, Any]]]:
+        """Pull ``pages`` from a background thread so the next page downloads
+        while the caller processes the current one.
+
+        At most ``depth`` pages wait in the queue, which bounds memory.
+        """
+        buffer: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=max(depth, 1))
+        stop = threading.Event()
+
+        def _put(message: Tuple[str, Any]) -> bool:
+            while not stop.is_set():
+                try:
+                    buffer.put(message, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _produce() -> None:
+            try:
+                for page in pages:
+                    if not _put(("page", page)):
+                        return
+            except BaseException as exc:  # pylint: disable=broad-except
+                _put(("error", exc))
+                return
+            _put(("done", None))
+
+        producer = threading.Thread(target=_produce, name="shopify_restock_prefetch", daemon=True)
+        producer.start()
+        try:
+            while True:
+                kind, payload = buffer.get()
+                if kind == "page":
+                    yield payload
+                elif kind == "error":
+                    raise payload
+                else:
+                    return
+        finally:
+            stop.set()
+            producer.join(timeout=5)
+
+    # ---------------------------
+    # Bulk operation crawl
+    # ---------------------------
+    def _run_bulk_operation(self, settings: RestockSettings, client: ShopifyClient, bulk_query: str) -> Optional[str]:
+        """Submit a bulk query, wait for it to finish and return the JSONL result URL.
+
+        Returns ``None`` when the operation completed without producing any object.
+        """
+        mutation = (
+            "mutation ($query: String!) {\n"
+            "  bulkOperationRunQuery(query: $query) {\n"
+            "    bulkOperation { id status }\n"
+            "    userErrors { field message }\n"
+            "  }\n"
+            "}\n"
+        )
+        data = client.graphql(mutation, {"query": bulk_query})
+        payload = data.get("bulkOperationRunQuery") or {}
+        user_errors = payload.get("userErrors") or []
+        if user_errors:
+            raise ValueError(f"Bulk operation rejected: {user_errors}")
+        operation_id = (payload.get("bulkOperation") or {}).get("id")
+        if not operation_id:
+            raise ValueError("Bulk operation did not return an id")
+
+        poll_query = (
+            "query ($id: ID!) {\n"
+            "  node(id: $id) {\n"
+            "    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }\n"
+            "  }\n"
+            "}\n"
+        )
+        poll_interval = max(settings.bulk_poll_interval or BULK_POLL_INTERVAL_SECONDS, 0.0)
+        deadline = time.monotonic() + max(settings.bulk_timeout or BULK_TIMEOUT_SECONDS, 1)
+        while True:
+            operation = client.graphql(poll_query, {"id": operation_id}).get("node") or {}
+            status = operation.get("status")
+            if status == "COMPLETED":
+                _logger.info(
+                    "Bulk operation %s completed with %s objects",
+                    operation_id,
+                    operation.get("objectCount"),
+                )
+                return operation.get("url")
+            if status in BULK_TERMINAL_FAILURE_STATUSES:
+                raise ValueError(
+                    f"Bulk operation {operation_id} ended with status {status} "
+                    f"(error code: {operation.get('errorCode')})"
+                )
+            if time.monotonic() >= deadline:
+                raise ValueError(f"Bulk operation {operation_id} did not finish in time (status {status})")
+            time.sleep(poll_interval)
+
+    def _iter_bulk_jsonl(self, client: ShopifyClient, url: str):
+        """Yield decoded JSONL records without loading the result file in memory."""
+        for raw_line in client.iter_lines(url):
+            yield json.loads(raw_line)
+
+    def _iter_bulk_products(self, settings: RestockSettings, client: ShopifyClient, search_query: Optional[str] = None):
+        """Crawl the catalog through a bulk operation and yield paginated-shaped edges.
+
+        Bulk results are flattened: every nested connection node is its own line
+        carrying ``__parentId``. Shopify writes children right after their parent,
+        so a product is complete as soon as the next top-level product line shows up.
+        """
+        # Bulk queries do not accept variables, so the filter is inlined as a literal.
+        products_args = f"(query: {json.dumps(search_query)})" if search_query else ""
+        bulk_query = (
+            "{\n"
+            f"  products{products_args} {{\n"
+            "    edges {\n"
+            "      node {\n"
+            f"{self._build_products_selection(settings, bulk=True)}"
+            "      }\n"
+            "    }\n"
+            "  }\n"
+            "}\n"
+        )
+        result_url = self._run_bulk_operation(settings, client, bulk_query)
+        if not result_url:
+            return
+
+        current: Optional[Dict[str, Any]] = None
+        variants_by_id: Dict[str, Dict[str, Any]] = {}
+        for record in self._iter_bulk_jsonl(client, result_url):
+            parent_id = record.pop("__parentId", None)
+            if not parent_id:
+                if current is not None:
+                    yield {"node": current}
+                current = record
+                current["metafields"] = {"edges": []}
+                current["publications"] = {"edges": []}
+                current["variants"] = {"edges": []}
+                variants_by_id = {}
+                continue
+            if current is not None and parent_id == current.get("id"):
+                if "channel" in record:
+                    current["publications"]["edges"].append({"node": record})
+                elif str(record.get("id") or "").startswith("gid://shopify/ProductVariant/"):
+                    record["metafields"] = {"edges": []}
+                    variants_by_id[record["id"]] = record
+                    current["variants"]["edges"].append({"node": record})
+                elif "key" in record:
+                    current["metafields"]["edges"].append({"node": record})
+                continue
+            variant = variants_by_id.get(parent_id)
+            if variant is not None and "key" in record:
+                variant["metafields"]["edges"].append({"node": record})
+                continue
+            _logger.warning("Skipping bulk record with unexpected parent %s", parent_id)
+        if current is not None:
+            yield {"node": current}
+
+    def _resolve_inventory_levels(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        products: List[Dict[str, Any]],
+    ) -> Dict[str, Dict[str, int]]:
+        """Return the REST inventory map for ``products``.
+
+        Inline mode already carries each variant's level in the product query,
+        so no inventory item ids are collected and no REST call is made.
+        Local mode reads the webhook-fed level table instead of Shopify.
+        """
+        if settings.inventory_mode == INVENTORY_MODE_INLINE:
+            return {}
+        inventory_item_ids: List[str] = []
+        for product in products:
+            for variant in product["variants"]:
+                inv_item_id = variant["inventory_item"].get("id")
+                if inv_item_id:
+                    inventory_item_ids.append(inv_item_id)
+        if settings.inventory_mode == INVENTORY_MODE_LOCAL:
+            return self._read_local_inventory_levels(settings, inventory_item_ids)
+        return self._fetch_inventory_levels_for_items(settings, client, inventory_item_ids)
+
+    def _read_local_inventory_levels(
+        self,
+        settings: RestockSettings,
+        inventory_item_ids: List[str],
+    ) -> Dict[str, Dict[str, int]]:
+        """Return the stored levels of ``inventory_item_ids``, shaped like the REST map."""
+        numeric_item_ids = [int(inv_id.split("/")[-1]) for inv_id in inventory_item_ids]
+        location_ids = [int(numeric) for numeric, _global_id in self._inventory_locations(settings) if numeric]
+        inv_map: Dict[str, Dict[str, int]] = {}
+        if not numeric_item_ids or not location_ids:
+            return inv_map
+        self.env.cr.execute(
+            """
+            SELECT inventory_item_id, location_id, available
+              FROM shopify_restock_inventory_level
+             WHERE inventory_item_id = ANY(%s)
+               AND location_id = ANY(%s)
+            """,
+            (numeric_item_ids, location_ids),
+        )
+        for inventory_item_id, location_id, available in self.env.cr.fetchall():
+            inv_map.setdefault(str(inventory_item_id), {})[str(location_id)] = available
+        return inv_map
+
+    def _inline_available_qty(self, inventory_level: Optional[Dict[str, Any]]) -> int:
+        if not inventory_level:
+            return 0
+        for quantity in inventory_level.get("quantities") or []:
+            if quantity.get("name") == "available":
+                return int(quantity.get("quantity") or 0)
+        return int(inventory_level.get("available") or 0)
 
-    def _fetch_inventory_levels_for_items(self, settings: Dict[str, str], inventory_item_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    def _variant_location_qty(
+        self,
+        variant: Dict[str, Any],
+        inventory_levels_map: Dict[str, Dict[str, int]],
+        location_id_numeric: str,
+    ) -> int:
+        inventory_item = variant["inventory_item"]
+        alias = self._inline_level_alias(location_id_numeric)
+        if alias in inventory_item:
+            return self._inline_available_qty(inventory_item[alias])
+        inv_item_global = inventory_item.get("id")
+        inv_item_numeric = inv_item_global.split("/")[-1] if inv_item_global else None
+        if inv_item_numeric and inv_item_numeric in inventory_levels_map:
+            return inventory_levels_map[inv_item_numeric].get(location_id_numeric, 0)
+        return 0
+
+    def _fetch_inventory_levels_for_items(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        inventory_item_ids: List[str],
+    ) -> Dict[str, Dict[str, int]]:
         if not inventory_item_ids:
             return {}
+        chunks = [
+            inventory_item_ids[i : i + INVENTORY_CHUNK_SIZE]
+            for i in range(0, len(inventory_item_ids), INVENTORY_CHUNK_SIZE)
+        ]
+        workers = min(settings.inventory_workers or 1, len(chunks))
         inv_map: Dict[str, Dict[str, int]] = {}
-        chunk_size = 50
-        headers = {
-            "Content-Type": "application/json",
-            "X-Shopify-Access-Token": settings["access_token"],
+        if workers <= 1:
+            chunk_maps = (self._fetch_inventory_levels_chunk(settings, client, chunk) for chunk in chunks)
+            for chunk_map in chunk_maps:
+                self._merge_inventory_levels(inv_map, chunk_map)
+            return inv_map
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shopify_restock_inv") as pool:
+            # map() yields in submission order, so the merge never depends on completion order.
+            for chunk_map in pool.map(
+                lambda chunk: self._fetch_inventory_levels_chunk(settings, client, chunk),
+                chunks,
+            ):
+                self._merge_inventory_levels(inv_map, chunk_map)
+        return inv_map
+
+    def _merge_inventory_levels(
+        self,
+        inv_map: Dict[str, Dict[str, int]],
+        chunk_map: Dict[str, Dict[str, int]],
+    ) -> None:
+        for inv_item_id, levels in chunk_map.items():
+            inv_map.setdefault(inv_item_id, {}).update(levels)
+
+    def _fetch_inventory_levels_chunk(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        chunk: List[str],
+    ) -> Dict[str, Dict[str, int]]:
+        """Fetch the levels of one chunk of inventory items, following every page.
+
+        Shopify caps a page at 250 levels and links the next one through the
+        ``Link: rel="next"`` header; multi-location shops exceed that for a
+        50-item chunk. The map is keyed by inventory item, then by location
+        numeric id. Runs in worker threads: it must only use ``settings`` and
+        ``client``, never the ORM environment.
+        """
+        numeric_ids = [inv_id.split("/")[-1] for inv_id in chunk]
+        tracked_locations = {numeric for numeric, _global_id in self._inventory_locations(settings) if numeric}
+        params: Optional[Dict[str, Any]] = {
+            "inventory_item_ids": ",".join(numeric_ids),
+            "limit": INVENTORY_PAGE_LIMIT,
         }
-        for i in range(0, len(inventory_item_ids), chunk_size):
-            chunk = inventory_item_ids[i : i + chunk_size]
-            numeric_ids = [inv_id.split("/")[-1] for inv_id in chunk]
-            id_list_str = ",".join(numeric_ids)
-            url = (
-                f"https://{settings['store_domain']}/admin/api/{settings['api_version']}/"
-                f"inventory_levels.json?inventory_item_ids={id_list_str}&limit=250"
-            )
-            response = requests.get(url, headers=headers, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            levels = data.get("inventory_levels", []) or []
+        if settings.inventory_filter_location and tracked_locations:
+            params["location_ids"] = ",".join(sorted(tracked_locations))
+        url: Optional[str] = client.rest_url("inventory_levels.json")
+        chunk_map: Dict[str, Dict[str, int]] = {}
+        while url:
+            response = client.get(url, params=params)
+            levels = response.json().get("inventory_levels", []) or []
             for level in levels:
                 inv_item_id = str(level.get("inventory_item_id"))
                 loc_id = str(level.get("location_id"))
                 available = int(level.get("available") or 0)
-                if inv_item_id not in inv_map:
-                    inv_map[inv_item_id] = {}
-                if loc_id == settings["location_id_numeric"]:
-                    inv_map[inv_item_id]["loc1_qty"] = available
-        return inv_map
+                if inv_item_id not in chunk_map:
+                    chunk_map[inv_item_id] = {}
+                if loc_id in tracked_locations:
+                    chunk_map[inv_item_id][loc_id] = available
+            # The next link carries its own page_info cursor; filters must not be repeated.
+            url = (response.links.get("next") or {}).get("url")
+            params = None
+        return chunk_map
+
+    def _generate_report(self, settings: RestockSettings, client: ShopifyClient) -> Dict[str, Any]:
+        """Crawl the catalog and collect the restock alerts of the context location."""
+        location = self.env.context.get("shopify_restock_location")
+        return self._generate_location_reports(settings, client, [location])[0]
 
-    def _generate_report(self, settings: Dict[str, str]) -> Dict[str, Any]:
+    def _generate_location_reports(
+        self,
+        settings: RestockSettings,
+        client: ShopifyClient,
+        locations: List[Optional[models.Model]],
+    ) -> List[Dict[str, Any]]:
+        """Crawl the catalog page by page and collect restock alerts for each location.
+
+        Every page goes through the same stages: publication filtering, then
+        inventory resolution, then threshold evaluation. Only the alerts
+        outlive a page, so memory is bounded by the page size. The next page
+        downloads in the background while the current one is processed.
+
+        The crawl and the inventory lookups are shared by all ``locations``;
+        filtering and evaluation run once per location on the same page. A
+        falsy entry stands for the location configured in ``settings``.
+        Reports are returned in the order of ``locations``.
+        """
         # Basic validation
-        required = ["store_domain", "access_token", "api_version", "location_id_numeric"]
+        required = ["store_domain", "access_token", "api_version"]
         for key in required:
-            if not settings.get(key):
+            if not getattr(settings, key):
                 raise ValueError(f"Missing configuration: {key}")
 
-        products = self._fetch_all_products(settings)
+        targets: List[Dict[str, Any]] = []
+        for location in locations:
+            location_id_numeric = (
+                (location.location_id_numeric or "").strip() if location else settings.location_id_numeric
+            )
+            if not location_id_numeric:
+                raise ValueError("Missing configuration: location_id_numeric")
+            targets.append({
+                "location_id_numeric": location_id_numeric,
+                "scope": self._get_publication_scope(location),
+                "rss_items": [],
+                "total_products_checked": 0,
+            })
+        report_date = datetime.now().strftime("%Y-%m-%d")
+        current_timestamp_dt = fields.Datetime.now()
+        report_context = {
+            "report_date": report_date,
+            "current_timestamp": fields.Datetime.to_string(current_timestamp_dt),
+            "store_short": settings.store_domain.replace(".myshopify.com", ""),
+        }
+
+        if settings.inventory_mode == INVENTORY_MODE_LOCAL:
+            total_products_found = self._evaluate_local_inventory(targets, report_context)
+            return [
+                self._build_report_result(
+                    target["rss_items"],
+                    total_products_found,
+                    target["total_products_checked"],
+                    report_context,
+                    current_timestamp_dt,
+                )
+                for target in targets
+            ]
+
+        total_products_found = 0
+        for products in self._iter_catalog_pages(settings, client):
+            total_products_found += len(products)
+            in_scope_ids: Set[int] = set()
+            for target in targets:
+                target["page_products"] = self._filter_products_page(products, target["scope"])
+                target["total_products_checked"] += len(target["page_products"])
+                in_scope_ids.update(id(product) for product in target["page_products"])
+            if not in_scope_ids:
+                continue
+            # Inventory is looked up once for every product some location keeps.
+            inventory_levels_map = self._resolve_inventory_levels(
+                settings,
+                client,
+                [product for product in products if id(product) in in_scope_ids],
+            )
+            for target in targets:
+                target["rss_items"].extend(
+                    self._evaluate_products_page(
+                        target.pop("page_products"),
+                        inventory_levels_map,
+                        target["location_id_numeric"],
+                        report_context,
+                    )
+                )
 
-        # Filter to only Online Store products, and optionally Retail Store
-        online_store_products: List[Dict[str, Any]] = []
-        location = self.env.context.get("shopify_restock_location")
+        return [
+            self._build_report_result(
+                target["rss_items"],
+                total_products_found,
+                target["total_products_checked"],
+                report_context,
+                current_timestamp_dt,
+            )
+            for target in targets
+        ]
+
+    def _evaluate_local_inventory(self, targets: List[Dict[str, Any]], report_context: Dict[str, str]) -> int:
+        """Evaluate every target against the catalog mirror and the webhook level table.
+
+        One query per location returns only the variants below their restock
+        level, joining the level table through its (inventory item, location)
+        key. No Shopify request is made. Returns the number of mirrored products.
+        """
+        cr = self.env.cr
+        total_products_found = 0
+        for target in targets:
+            scope_sql = self._publication_scope_sql(target["scope"])
+            cr.execute(
+                f"""
+                SELECT count(*), count(*) FILTER (WHERE {scope_sql})
+                  FROM shopify_restock_catalog_product p
+                """
+            )
+            total_products_found, target["total_products_checked"] = cr.fetchone()
+            cr.execute(
+                f"""
+                SELECT p.id, p.product_id_global, p.title, p.handle,
+                       p.restock_level, p.desired_inventory_level,
+                       v.variant_id_global, v.title, v.sku, v.inventory_item_id_global,
+                       v.restock_level, v.desired_inventory_level,
+                       COALESCE(l.available, 0)
+                  FROM shopify_restock_catalog_variant v
+                  JOIN shopify_restock_catalog_product p ON p.id = v.product_id
+             LEFT JOIN shopify_restock_inventory_level l
+                    ON l.inventory_item_id = NULLIF(split_part(v.inventory_item_id_global, '/', 5), '')::bigint
+                   AND l.location_id = %s
+                 WHERE {scope_sql}
+                   AND COALESCE(NULLIF(v.restock_level, 0), p.restock_level) > COALESCE(l.available, 0)
+              ORDER BY p.id, v.id
+                """,
+                (int(target["location_id_numeric"]),),
+            )
+            products: List[Dict[str, Any]] = []
+            inventory_levels_map: Dict[str, Dict[str, int]] = {}
+            current_product_id = None
+            for (
+                product_id,
+                product_id_global,
+                product_title,
+                product_handle,
+                product_restock,
+                product_desired,
+                variant_id_global,
+                variant_title,
+                sku,
+                inventory_item_id_global,
+                variant_restock,
+                variant_desired,
+                available,
+            ) in cr.fetchall():
+                if product_id != current_product_id:
+                    current_product_id = product_id
+                    products.append({
+                        "id": product_id_global,
+                        "title": product_title or "",
+                        "handle": product_handle or "",
+                        "restock_level": self._mirror_level(product_restock),
+                        "desired_level": self._mirror_level(product_desired),
+                        "variants": [],
+                    })
+                products[-1]["variants"].append({
+                    "id": variant_id_global,
+                    "title": variant_title or "",
+                    "sku": sku or "",
+                    "inventory_item": {"id": inventory_item_id_global or None},
+                    "restock_level": self._mirror_level(variant_restock),
+                    "desired_level": self._mirror_level(variant_desired),
+                })
+                if inventory_item_id_global:
+                    inventory_levels_map.setdefault(inventory_item_id_global.split("/")[-1], {})[
+                        target["location_id_numeric"]
+                    ] = available
+            target["rss_items"] = self._evaluate_products_page(
+                products,
+                inventory_levels_map,
+                target["location_id_numeric"],
+                report_context,
+            )
+        return total_products_found
+
+    def _publication_scope_sql(self, scope: Dict[str, bool]) -> str:
+        """Return the SQL twin of ``_filter_products_page`` over the mirror alias ``p``."""
+        clauses = []
+        if scope["enforce_online_store"]:
+            clauses.append("p.published_online")
+        else:
+            clauses.append("(p.published_online OR p.published_retail)")
+        if scope["require_retail_publication"]:
+            clauses.append("p.published_retail")
+        return " AND ".join(clauses)
+
+    def _build_report_result(
+        self,
+        rss_items: List[Dict[str, Any]],
+        total_products_found: int,
+        total_products_checked: int,
+        report_context: Dict[str, str],
+        current_timestamp_dt: datetime,
+    ) -> Dict[str, Any]:
+        result = {
+            "rss_items": rss_items,
+            "rss_item_count": len(rss_items),
+            "has_restock_alerts": bool(rss_items),
+            # Store a true datetime for ORM create
+            "report_timestamp": current_timestamp_dt,
+            "report_date": report_context["report_date"],
+            "total_products_checked": total_products_checked,
+            "total_products_found": total_products_found,
+            "todo_count": len(rss_items),
+        }
+        _logger.debug(
+            "Restock report complete: %s products fetched, %s in scope, %s alerts",
+            total_products_found,
+            total_products_checked,
+            len(rss_items),
+        )
+        return result
+
+    def _get_publication_scope(self, location: Optional[models.Model]) -> Dict[str, bool]:
+        """Work out which sales channels a product must be published to for ``location``."""
         location_name = (getattr(location, "name", "") or "").strip().lower()
         require_retail_publication = bool(location_name and "retail" in location_name)
         is_fulfillment_location = bool(location_name and (
@@ -675,120 +2100,102 @@ class ShopifyRestockService(models.AbstractModel):
                 require_retail_publication,
                 enforce_online_store,
             )
+        return {
+            "require_retail_publication": require_retail_publication,
+            "enforce_online_store": enforce_online_store,
+        }
+
+    def _filter_products_page(
+        self,
+        products: List[Dict[str, Any]],
+        scope: Dict[str, bool],
+    ) -> List[Dict[str, Any]]:
+        """Stage 1: keep the products published to the channels ``scope`` requires."""
+        require_retail_publication = scope["require_retail_publication"]
+        enforce_online_store = scope["enforce_online_store"]
+        in_scope_products: List[Dict[str, Any]] = []
+        # Skip reasons are only worth formatting when someone reads them.
+        debug = _logger.isEnabledFor(logging.DEBUG)
         for product in products:
-            product_node = product.get("node", {})
-            publications = product_node.get("publications")
-            product_title = product_node.get("title") or product_node.get("id") or "<no title>"
-            published_online = self._is_published_to_online_store(publications)
-            published_retail = None
-            if require_retail_publication or not enforce_online_store:
-                published_retail = self._is_published_to_channel(
-                    publications,
-                    target_names=[
-                        "retail store",
-                        "point of sale",
-                    ],
-                    target_handles=[
-                        "retail-store",
-                        "retail_store",
-                        "retail",
-                        "point-of-sale",
-                        "point_of_sale",
-                        "shopify-pos",
-                        "shopify_pos",
-                        "pos",
-                    ],
-                )
+            published_online = product["published_online"]
+            published_retail = product["published_retail"]
 
             if enforce_online_store and not published_online:
-                _logger.debug("Skipping '%s': not published to Online Store", product_title)
+                if debug:
+                    _logger.debug("Skipping '%s': not published to Online Store", self._product_label(product))
                 continue
 
             if require_retail_publication and not published_retail:
-                channel_snapshots: List[str] = []
-                for edge in (publications or {}).get("edges", []) or []:
-                    node = edge.get("node", {})
-                    channel = node.get("channel", {})
-                    channel_snapshots.append(
-                        f"{channel.get('name')} ({channel.get('handle')}): {node.get('isPublished')}"
+                if debug:
+                    _logger.debug(
+                        "Skipping '%s': not published to Retail store. Channels: %s",
+                        self._product_label(product),
+                        self._channel_snapshot(product),
                     )
-                _logger.debug(
-                    "Skipping '%s': not published to Retail store. Channels: %s",
-                    product_title,
-                    "; ".join(filter(None, channel_snapshots)) or "<none>",
-                )
                 continue
 
             if not enforce_online_store and not (published_online or published_retail):
-                _logger.debug(
-                    "Skipping '%s': not published to Online Store or Retail store",
-                    product_title,
-                )
+                if debug:
+                    _logger.debug(
+                        "Skipping '%s': not published to Online Store or Retail store",
+                        self._product_label(product),
+                    )
                 continue
-            _logger.debug("Including '%s' for report", product_title)
-            online_store_products.append(product)
-
-        # Collect inventory item ids
-        inventory_item_ids: List[str] = []
-        for product in online_store_products:
-            product_node = product["node"]
-            for variant in product_node["variants"]["edges"]:
-                v_node = variant["node"]
-                inv_item = v_node.get("inventoryItem")
-                if inv_item and inv_item.get("id"):
-                    inventory_item_ids.append(inv_item["id"])
-
-        inventory_levels_map = self._fetch_inventory_levels_for_items(settings, inventory_item_ids)
-        report_date = datetime.now().strftime("%Y-%m-%d")
-        current_timestamp_dt = fields.Datetime.now()
-        current_timestamp = fields.Datetime.to_string(current_timestamp_dt)
+            if debug:
+                _logger.debug("Including '%s' for report", self._product_label(product))
+            in_scope_products.append(product)
+        return in_scope_products
 
-        rss_items: List[Dict[str, Any]] = []
-        alert_rows: List[List[Any]] = []
-
-        store_short = settings["store_domain"].replace(".myshopify.com", "")
-
-        for product in online_store_products:
-            product_node = product["node"]
-            product_id = product_node.get("id", "")
-            product_title = product_node.get("title", "")
-            product_handle = product_node.get("handle", "")
-
-            product_restock = self._get_metafield_value(product_node.get("metafields"), "restock_level")
-            product_desired = self._get_metafield_value(product_node.get("metafields"), "desired_inventory_level")
+    def _product_label(self, product: Dict[str, Any]) -> str:
+        return product["title"] or product["id"] or "<no title>"
 
-            for variant in product_node["variants"]["edges"]:
-                v_node = variant["node"]
-                variant_id = v_node.get("id", "")
-                sku = v_node.get("sku", "")
-                variant_title = v_node.get("title", "")
-
-                variant_restock = self._get_metafield_value(v_node.get("metafields"), "restock_level")
-                variant_desired = self._get_metafield_value(v_node.get("metafields"), "desired_inventory_level")
+    def _channel_snapshot(self, product: Dict[str, Any]) -> str:
+        channel_snapshots: List[str] = []
+        for edge in (product["publications"] or {}).get("edges", []) or []:
+            node = edge.get("node", {})
+            channel = node.get("channel", {})
+            channel_snapshots.append(
+                f"{channel.get('name')} ({channel.get('handle')}): {node.get('isPublished')}"
+            )
+        return "; ".join(filter(None, channel_snapshots)) or "<none>"
 
-                final_restock = variant_restock or product_restock
-                final_desired = variant_desired or product_desired
+    def _evaluate_products_page(
+        self,
+        products: List[Dict[str, Any]],
+        inventory_levels_map: Dict[str, Dict[str, int]],
+        location_id_numeric: str,
+        report_context: Dict[str, str],
+    ) -> List[Dict[str, Any]]:
+        """Stages 3 and 4: compare each variant's stock at one location with its thresholds.
+
+        This stays one fused loop on purpose. A columnar pass (typed arrays
+        filled from the products, then one vectorized alert test) measured
+        1.5-2.8x slower at 10k, 100k and 1M variants, because filling the
+        columns costs more than the comparisons it replaces. Reproduce with
+        ``--test-tags restock_benchmark`` (tests/test_evaluation_benchmark.py).
+        """
+        store_short = report_context["store_short"]
+        rss_items: List[Dict[str, Any]] = []
+        for product in products:
+            product_id = product["id"]
+            product_title = product["title"]
+            product_handle = product["handle"]
 
-                inv_item_global = v_node.get("inventoryItem", {}).get("id")
-                inv_item_numeric = inv_item_global.split("/")[-1] if inv_item_global else None
+            product_restock = product["restock_level"]
+            product_desired = product["desired_level"]
 
-                loc1_qty = 0
-                if inv_item_numeric and inv_item_numeric in inventory_levels_map:
-                    loc1_qty = inventory_levels_map[inv_item_numeric].get("loc1_qty", 0)
+            for variant in product["variants"]:
+                variant_id = variant["id"]
+                sku = variant["sku"]
+                variant_title = variant["title"]
 
-                needs_restock = False
-                restock_amount = 0
+                final_restock = variant["restock_level"] or product_restock
+                final_desired = variant["desired_level"] or product_desired
 
+                loc1_qty = self._variant_location_qty(variant, inventory_levels_map, location_id_numeric)
                 if final_restock and loc1_qty < final_restock:
-                    needs_restock = True
                     restock_amount = (final_desired - loc1_qty) if final_desired else 0
 
-                    display_title = f"{product_title}"
-                    if variant_title and variant_title != "Default Title":
-                        display_title += f" - {variant_title}"
-
-                    unique_id = f"restock-{product_id}-{variant_id}-{report_date}"
-
                     product_url = f"https://{store_short}.com/products/{product_handle}"
                     if variant_title and variant_title != "Default Title":
                         variant_numeric_id = variant_id.split("/")[-1] if variant_id else ""
@@ -799,17 +2206,7 @@ class ShopifyRestockService(models.AbstractModel):
                     )
 
                     rss_item = {
-                        "id": unique_id,
-                        "title": f"RESTOCK ALERT: {display_title}",
-                        "description": (
-                            f"Product: {product_title}\nVariant: {variant_title}\nSKU: {sku}\n"
-                            f"Current Stock: {loc1_qty} units\nRestock Level: {final_restock} units\n"
-                            f"Recommended Order: {restock_amount} units\nGenerated: {current_timestamp}"
-                        ),
                         "link": product_url,
-                        "guid": unique_id,
-                        "pubDate": current_timestamp,
-                        "category": "inventory-alert",
                         "product_title": product_title,
                         "variant_title": variant_title,
                         "sku": sku,
@@ -823,59 +2220,9 @@ class ShopifyRestockService(models.AbstractModel):
                     }
 
                     rss_items.append(rss_item)
+        return rss_items
 
-                if needs_restock:
-                    alert_rows.append([product_title, variant_title, sku, loc1_qty, restock_amount])
-
-        if rss_items:
-            # Build an HTML table for email and UI
-            rows = []
-            rows.append("<tr><th>Urgency</th><th>Product</th><th>Variant</th><th>SKU</th><th>Current</th><th>Restock Level</th><th>Recommend</th></tr>")
-            for it in rss_items:
-                rows.append(
-                    "<tr>"
-                    f"<td>{it.get('urgency','')}</td>"
-                    f"<td>{(it.get('product_title') or '').replace('<','&lt;').replace('>','&gt;')}</td>"
-                    f"<td>{(it.get('variant_title') or '').replace('<','&lt;').replace('>','&gt;')}</td>"
-                    f"<td>{it.get('sku') or ''}</td>"
-                    f"<td>{it.get('current_qty') or 0}</td>"
-                    f"<td>{it.get('restock_level') or ''}</td>"
-                    f"<td>{it.get('restock_amount') or 0}</td>"
-                    "</tr>"
-                )
-            table_html = "<table border=1 cellspacing=0 cellpadding=4>" + "".join(rows) + "</table>"
-            email_body = (
-                f"<html><body>\n"
-                f"<p>Inventory Report: {len(rss_items)} items need restocking.</p>\n"
-                f"{table_html}"
-                f"<p>Generated: {current_timestamp}</p>\n"
-                f"</body></html>"
-            )
-        else:
-            email_body = "<html><body><p>No Online Store items require restocking at this time.</p></body></html>"
-
-        result = {
-            "rss_items": rss_items,
-            "rss_item_count": len(rss_items),
-            "has_restock_alerts": bool(rss_items),
-            # Store a true datetime for ORM create
-            "report_timestamp": current_timestamp_dt,
-            "report_date": report_date,
-            "email_body": email_body,
-            "total_products_checked": len(online_store_products),
-            "total_products_found": len(products),
-            "alert_rows": alert_rows,
-            "todo_count": len(rss_items),
-        }
-        _logger.debug(
-            "Restock report complete: %s products fetched, %s in scope, %s alerts",
-            len(products),
-            len(online_store_products),
-            len(rss_items),
-        )
-        return result
-
-    def _get_task_user_id(self, settings: Dict[str, str]) -> Optional[int]:
+    def _get_task_user_id(self, settings: RestockSettings) -> Optional[int]:
         ctx_user_id = self.env.context.get("restock_user_id")
         if ctx_user_id and str(ctx_user_id).isdigit():
             return int(ctx_user_id)
@@ -886,10 +2233,9 @@ class ShopifyRestockService(models.AbstractModel):
                 return employee.user_id.id
         return None
 
-    def _get_restock_project(self, settings: Dict[str, str], create_if_missing: bool = True) -> models.Model:
-        project_id = settings.get("project_id")
-        if project_id and str(project_id).isdigit():
-            project = self.env["project.project"].sudo().browse(int(project_id))
+    def _get_restock_project(self, settings: RestockSettings, create_if_missing: bool = True) -> models.Model:
+        if settings.project_id:
+            project = self.env["project.project"].sudo().browse(settings.project_id)
             if project and project.exists():
                 self._ensure_project_has_done_stage(project)
                 self._ensure_runner_project_access(project)
@@ -1018,7 +2364,7 @@ class ShopifyRestockService(models.AbstractModel):
 
     def _create_tasks_for_items(
         self,
-        settings: Dict[str, str],
+        settings: RestockSettings,
         items: models.Model,
         run: models.Model,
         location: Optional[models.Model] = None,
@@ -1039,6 +2385,264 @@ class ShopifyRestockService(models.AbstractModel):
                      project.name if project else None,
                      project.id if project else None,
                      user_id)
+        try:
+            with self.env.cr.savepoint():
+                tasks_created, tasks_merged = self._create_tasks_for_items_batched(
+                    project,
+                    items,
+                    user_id,
+                    run_by_partner_id,
+                    location,
+                )
+        except Exception:  # pylint: disable=broad-except
+            _logger.exception("Batched task creation failed; retrying one item at a time")
+            self.env.invalidate_all()
+            tasks_created, tasks_merged = self._create_tasks_for_items_one_by_one(
+                project,
+                items,
+                user_id,
+                run_by_partner_id,
+                location,
+            )
+        _logger.info(
+            "Created %d tasks for restock run (%d merged into existing tasks)",
+            tasks_created,
+            tasks_merged,
+        )
+        return project
+
+    def _task_create_context(self) -> Dict[str, Any]:
+        return {
+            "mail_create_nosubscribe": True,
+            "mail_create_nolog": True,
+            "mail_auto_subscribe_no_notify": True,
+            "mail_notify_force_send": False,
+            "tracking_disable": True,
+        }
+
+    def _new_task_vals(
+        self,
+        task_model: models.Model,
+        project: Optional[models.Model],
+        item: models.Model,
+        user_id: Optional[int],
+        location: Optional[models.Model],
+    ) -> Dict[str, Any]:
+        restock_qty = self._compute_needed_qty(item)
+        description_lines = [
+            f"Product: {item.product_title or ''}",
+            f"Variant: {item.variant_title or ''}",
+            f"SKU: {item.sku or ''}",
+            f"Current Qty: {item.current_qty or 0}",
+            f"Restock Level: {item.restock_level or ''}",
+            f"Recommended Order: {restock_qty}",
+        ]
+        if item.product_url:
+            description_lines.append(f"Shopify URL: {item.product_url}")
+        if location:
+            description_lines.append(f"Shopify Location: {getattr(location, 'name', '')}")
+        task_vals = {
+            "name": self._build_task_title(item, restock_qty),
+            "description": "\n".join(filter(None, description_lines)),
+            "project_id": project.id if project else False,
+            "restock_item_id": item.id,
+        }
+        if user_id:
+            if "user_id" in task_model._fields:
+                task_vals["user_id"] = user_id
+            elif "user_ids" in task_model._fields:
+                task_vals["user_ids"] = [(6, 0, [user_id])]
+            elif "assigned_ids" in task_model._fields:
+                task_vals["assigned_ids"] = [(6, 0, [user_id])]
+        return task_vals
+
+    def _create_tasks_for_items_batched(
+        self,
+        project: Optional[models.Model],
+        items: models.Model,
+        user_id: Optional[int],
+        run_by_partner_id: Optional[int],
+        location: Optional[models.Model],
+    ) -> Tuple[int, int]:
+        """Set-based twin of ``_create_tasks_for_items_one_by_one``.
+
+        Items are processed in order exactly like the per-item path: an item
+        merges into the open task of its identity key, which may be a task an
+        earlier item of the same batch created, and supersedes the snapshot
+        that task held for that key. Lookups, creates, follower subscriptions
+        and item links each run as one statement for the whole batch; only
+        the title and description of merged tasks are written per task.
+        """
+        task_model = self.env["project.task"]
+        items = items.sudo()
+        identity_keys = {item.id: item.identity_key or self._identity_key_for_item(item) for item in items}
+        open_task_ids = self._find_open_task_ids_by_identity_key(
+            project,
+            {key for key in identity_keys.values() if key},
+        )
+
+        # A slot is an existing task id or ("new", n) for the n-th task to create.
+        slot_by_key: Dict[str, Any] = dict(open_task_ids)
+        slot_items: Dict[Any, List[models.Model]] = {}
+        new_slots: List[Any] = []
+        for item in items:
+            identity_key = identity_keys[item.id]
+            slot = slot_by_key.get(identity_key) if identity_key else None
+            if slot is None:
+                slot = ("new", len(new_slots))
+                new_slots.append(slot)
+                if identity_key:
+                    slot_by_key[identity_key] = slot
+            slot_items.setdefault(slot, []).append(item)
+
+        new_tasks = task_model.browse()
+        if new_slots:
+            new_tasks = task_model.with_context(**self._task_create_context()).sudo().create([
+                self._new_task_vals(task_model, project, slot_items[slot][0], user_id, location)
+                for slot in new_slots
+            ])
+        task_id_by_slot = {slot: slot for slot in slot_items if not isinstance(slot, tuple)}
+        task_id_by_slot.update({slot: task.id for slot, task in zip(new_slots, new_tasks)})
+        tasks = task_model.sudo().browse(list(task_id_by_slot.values()))
+        if run_by_partner_id and tasks:
+            tasks.with_context(
+                mail_notify_force_send=False,
+                mail_auto_subscribe_no_notify=True,
+            ).message_subscribe(partner_ids=[run_by_partner_id])
+
+        # Snapshots the merged tasks already hold are superseded by the first
+        # incoming item with the same identity key; incoming items then
+        # supersede each other in order, leaving the last one active.
+        now = fields.Datetime.now()
+        merged_task_ids = [slot for slot in slot_items if not isinstance(slot, tuple)]
+        incoming_keys = {key for key in identity_keys.values() if key}
+        previous_items = self.env["shopify.restock.item"].sudo()
+        if merged_task_ids and incoming_keys:
+            previous_items = previous_items.search([
+                ("todo_task_id", "in", merged_task_ids),
+                ("identity_key", "in", list(incoming_keys)),
+                ("is_active_snapshot", "=", True),
+                ("inventory_transferred", "=", False),
+                ("id", "not in", items.ids),
+            ])
+        previous_by_task: Dict[int, List[models.Model]] = {}
+        for previous in previous_items:
+            previous_by_task.setdefault(previous.todo_task_id.id, []).append(previous)
+        rows: List[Tuple[int, int, bool, Optional[int], Optional[Any], Optional[str]]] = []
+        relink: Dict[int, int] = {}
+        for slot, slot_group in slot_items.items():
+            task_id = task_id_by_slot[slot]
+            next_by_key: Dict[str, int] = {}
+            for item in reversed(slot_group):
+                identity_key = identity_keys[item.id]
+                superseded_by = next_by_key.get(identity_key) if identity_key else None
+                if superseded_by:
+                    rows.append((item.id, task_id, False, superseded_by, now, "replaced_by_new_run"))
+                else:
+                    rows.append((item.id, task_id, True, None, None, None))
+                if identity_key:
+                    next_by_key[identity_key] = item.id
+            # next_by_key now holds the first incoming item of each key.
+            for previous in previous_by_task.get(task_id, []):
+                superseded_by = next_by_key.get(previous.identity_key)
+                if superseded_by:
+                    rows.append((previous.id, task_id, False, superseded_by, now, "replaced_by_new_run"))
+            # Tasks point at their newest snapshot; a created task already
+            # does unless later items of the batch merged into it.
+            if not isinstance(slot, tuple) or len(slot_group) > 1:
+                relink[task_id] = slot_group[-1].id
+        self._write_item_task_links(rows)
+
+        if relink:
+            task_model.flush_model(["restock_item_id"])
+            self.env.cr.execute(
+                """
+                UPDATE project_task AS task
+                   SET restock_item_id = link.item_id
+                  FROM unnest(%s::int[], %s::int[]) AS link(task_id, item_id)
+                 WHERE task.id = link.task_id
+                """,
+                (list(relink), list(relink.values())),
+            )
+            tasks.invalidate_recordset(["restock_item_id"])
+            relinked = tasks.browse(list(relink))
+            relinked.modified(["restock_item_id"])
+            relinked._sync_restock_open_identity_key()
+        for task in tasks.browse(list(relink)):
+            self._update_task_description_for_items(task, location=location)
+
+        tasks_created = len(new_slots)
+        tasks_merged = len(items) - tasks_created
+        return tasks_created, tasks_merged
+
+    def _write_item_task_links(
+        self,
+        rows: List[Tuple[int, int, bool, Optional[int], Optional[Any], Optional[str]]],
+    ) -> None:
+        """Set task link and snapshot state of many items in one statement.
+
+        Rows are ``(item_id, task_id, is_active_snapshot, superseded_by_item_id,
+        superseded_at, superseded_reason)``.
+        """
+        if not rows:
+            return
+        item_model = self.env["shopify.restock.item"].sudo()
+        item_model.flush_model()
+        columns = list(zip(*rows))
+        self.env.cr.execute(
+            """
+            UPDATE shopify_restock_item AS item
+               SET todo_task_id = link.task_id,
+                   is_active_snapshot = link.is_active,
+                   superseded_by_item_id = link.superseded_by,
+                   superseded_at = link.superseded_at,
+                   superseded_reason = link.superseded_reason,
+                   write_uid = %s,
+                   write_date = (now() AT TIME ZONE 'UTC')
+              FROM unnest(%s::int[], %s::int[], %s::bool[], %s::int[], %s::timestamp[], %s::varchar[])
+                   AS link(item_id, task_id, is_active, superseded_by, superseded_at, superseded_reason)
+             WHERE item.id = link.item_id
+            """,
+            (self.env.uid, *[list(column) for column in columns]),
+        )
+        fnames = [
+            "todo_task_id",
+            "is_active_snapshot",
+            "superseded_by_item_id",
+            "superseded_at",
+            "superseded_reason",
+            "write_uid",
+            "write_date",
+        ]
+        updated = item_model.browse(list(columns[0]))
+        updated.invalidate_recordset(fnames)
+        updated.modified(fnames)
+
+    def _find_open_task_ids_by_identity_key(
+        self,
+        project: Optional[models.Model],
+        identity_keys: Set[str],
+    ) -> Dict[str, int]:
+        """Resolve the open task of many identity keys with one indexed lookup."""
+        if not project or not identity_keys:
+            return {}
+        rows = self.env["project.task"].sudo().search_read(
+            [
+                ("project_id", "=", project.id),
+                ("restock_open_identity_key", "in", list(identity_keys)),
+            ],
+            ["restock_open_identity_key"],
+        )
+        return {row["restock_open_identity_key"]: row["id"] for row in rows}
+
+    def _create_tasks_for_items_one_by_one(
+        self,
+        project: Optional[models.Model],
+        items: models.Model,
+        user_id: Optional[int],
+        run_by_partner_id: Optional[int],
+        location: Optional[models.Model],
+    ) -> Tuple[int, int]:
         task_model = self.env["project.task"]
         tasks_created = 0
         tasks_merged = 0
@@ -1066,39 +2670,8 @@ class ShopifyRestockService(models.AbstractModel):
                         "Merged restock item %s into existing task %s", item.id, existing_task.id
                     )
                     continue
-                restock_qty = self._compute_needed_qty(item)
-                description_lines = [
-                    f"Product: {item.product_title or ''}",
-                    f"Variant: {item.variant_title or ''}",
-                    f"SKU: {item.sku or ''}",
-                    f"Current Qty: {item.current_qty or 0}",
-                    f"Restock Level: {item.restock_level or ''}",
-                    f"Recommended Order: {restock_qty}",
-                ]
-                if item.product_url:
-                    description_lines.append(f"Shopify URL: {item.product_url}")
-                if location:
-                    description_lines.append(f"Shopify Location: {getattr(location, 'name', '')}")
-                task_vals = {
-                    "name": self._build_task_title(item, restock_qty),
-                    "description": "\n".join(filter(None, description_lines)),
-                    "project_id": project.id if project else False,
-                    "restock_item_id": item.id,
-                }
-                if user_id:
-                    if "user_id" in task_model._fields:
-                        task_vals["user_id"] = user_id
-                    elif "user_ids" in task_model._fields:
-                        task_vals["user_ids"] = [(6, 0, [user_id])]
-                    elif "assigned_ids" in task_model._fields:
-                        task_vals["assigned_ids"] = [(6, 0, [user_id])]
-                task = self.env["project.task"].with_context(
-                    mail_create_nosubscribe=True,
-                    mail_create_nolog=True,
-                    mail_auto_subscribe_no_notify=True,
-                    mail_notify_force_send=False,
-                    tracking_disable=True,
-                ).sudo().create(task_vals)
+                task_vals = self._new_task_vals(task_model, project, item, user_id, location)
+                task = task_model.with_context(**self._task_create_context()).sudo().create(task_vals)
                 if run_by_partner_id:
                     task.with_context(
                         mail_notify_force_send=False,
@@ -1109,23 +2682,28 @@ class ShopifyRestockService(models.AbstractModel):
                 tasks_created += 1
             except Exception as e:
                 _logger.exception("Failed to create task for item %s: %s", item.id, e)
-        _logger.info(
-            "Created %d tasks for restock run (%d merged into existing tasks)",
-            tasks_created,
-            tasks_merged,
-        )
-        return project
+        return tasks_created, tasks_merged
 
-    def _supersede_task_snapshots(self, task: models.Model, incoming_item: models.Model) -> None:
-        if not task or not incoming_item or not incoming_item.identity_key:
-            return
-        superseded_items = self.env["shopify.restock.item"].sudo().search([
+    def _active_task_snapshots_domain(self, task: models.Model) -> List[Tuple[str, str, Any]]:
+        """Domain of the active, not yet transferred snapshots linked to ``task``.
+
+        Served by the partial ``shopify_restock_item_active_task_identity_idx``.
+        """
+        return [
             ("todo_task_id", "=", task.id),
-            ("identity_key", "=", incoming_item.identity_key),
             ("is_active_snapshot", "=", True),
             ("inventory_transferred", "=", False),
-            ("id", "!=", incoming_item.id),
-        ])
+        ]
+
+    def _supersede_task_snapshots(self, task: models.Model, incoming_item: models.Model) -> None:
+        if not task or not incoming_item or not incoming_item.identity_key:
+            return
+        superseded_items = self.env["shopify.restock.item"].sudo().search(
+            self._active_task_snapshots_domain(task) + [
+                ("identity_key", "=", incoming_item.identity_key),
+                ("id", "!=", incoming_item.id),
+            ]
+        )
         if not superseded_items:
             return
         superseded_items.sudo().write({
@@ -1140,50 +2718,73 @@ class ShopifyRestockService(models.AbstractModel):
         project: Optional[models.Model],
         location: Optional[models.Model],
         current_identity_keys: Set[str],
-    ) -> None:
+    ) -> int:
+        """Retire active snapshots of open tasks whose alert is gone; return how many.
+
+        One UPDATE joins the project's open tasks and skips the identity keys
+        reported by the current run. Snapshots of done or canceled tasks are
+        left active so their inventory transfer can still run.
+        """
         if not project:
-            return
-        domain = [
-            ("todo_task_id", "!=", False),
-            ("todo_task_id.project_id", "=", project.id),
-            ("is_active_snapshot", "=", True),
-            ("inventory_transferred", "=", False),
+            return 0
+        item_model = self.env["shopify.restock.item"].sudo()
+        task_model = self.env["project.task"].sudo()
+        item_model.flush_model()
+        task_model.flush_model(["project_id", "state", "stage_id"])
+        self.env.cr.execute(*self._resolved_snapshots_update_query(project, location, current_identity_keys))
+        deactivated_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not deactivated_ids:
+            return 0
+        fnames = [
+            "is_active_snapshot",
+            "superseded_by_item_id",
+            "superseded_at",
+            "superseded_reason",
+            "write_uid",
+            "write_date",
         ]
-        if location:
-            domain.append(("location_id", "=", location.id))
-        else:
-            domain.append(("location_id", "=", False))
-
-        candidates = self.env["shopify.restock.item"].sudo().search(domain, order="id desc")
-        to_deactivate_ids: List[int] = []
-        for item in candidates:
-            task = item.todo_task_id
-            if not task:
-                continue
-            if task._restock_task_is_done():
-                continue
-            if "state" in task._fields and task.state == "1_canceled":
-                continue
-            if not item.identity_key:
-                continue
-            if item.identity_key in current_identity_keys:
-                continue
-            to_deactivate_ids.append(item.id)
-
-        if not to_deactivate_ids:
-            return
-
-        self.env["shopify.restock.item"].sudo().browse(to_deactivate_ids).write({
-            "is_active_snapshot": False,
-            "superseded_by_item_id": False,
-            "superseded_at": fields.Datetime.now(),
-            "superseded_reason": "no_longer_in_alerts",
-        })
+        deactivated = item_model.browse(deactivated_ids)
+        deactivated.invalidate_recordset(fnames)
+        deactivated.modified(fnames)
         _logger.info(
             "Deactivated %d stale snapshots for project %s",
-            len(to_deactivate_ids),
+            len(deactivated_ids),
             project.id,
         )
+        return len(deactivated_ids)
+
+    def _resolved_snapshots_update_query(
+        self,
+        project: models.Model,
+        location: Optional[models.Model],
+        current_identity_keys: Set[str],
+    ) -> Tuple[str, List[Any]]:
+        """Return the ``(query, params)`` of the UPDATE run by ``_deactivate_resolved_snapshots``."""
+        location_clause = "item.location_id = %s" if location else "item.location_id IS NULL"
+        params: List[Any] = [self.env.uid, project.id, sorted(current_identity_keys)]
+        if location:
+            params.append(location.id)
+        query = f"""
+            UPDATE shopify_restock_item AS item
+               SET is_active_snapshot = FALSE,
+                   superseded_by_item_id = NULL,
+                   superseded_at = (now() AT TIME ZONE 'UTC'),
+                   superseded_reason = 'no_longer_in_alerts',
+                   write_uid = %s,
+                   write_date = (now() AT TIME ZONE 'UTC')
+              FROM project_task AS task
+             WHERE task.id = item.todo_task_id
+               AND task.project_id = %s
+               AND {self.env["project.task"]._restock_open_task_sql("task")}
+               AND item.is_active_snapshot
+               AND item.inventory_transferred IS NOT TRUE
+               AND item.identity_key IS NOT NULL
+               AND item.identity_key <> ''
+               AND NOT (item.identity_key = ANY(%s::varchar[]))
+               AND {location_clause}
+         RETURNING item.id
+            """
+        return query, params
 
     def _find_existing_task_for_item(
         self,
@@ -1196,32 +2797,12 @@ class ShopifyRestockService(models.AbstractModel):
         identity_key = item.identity_key or self._identity_key_for_item(item)
         if not identity_key:
             return None
-
-        candidate_items = self.env["shopify.restock.item"].sudo().search([
-            ("identity_key", "=", identity_key),
-            ("todo_task_id", "!=", False),
-        ], order="id desc")
-        for candidate in candidate_items:
-            task = candidate.todo_task_id
-            if not task or task.project_id.id != project.id:
-                continue
-            if "state" in task._fields and task.state == "1_canceled":
-                continue
-            if task._restock_task_is_done():
-                continue
-            return task
-
-        task_candidates = task_model.sudo().search([
+        # project.task keeps the key of its restock item only while it is open.
+        task = task_model.sudo().search([
             ("project_id", "=", project.id),
-            ("restock_item_id.identity_key", "=", identity_key),
-        ], order="id desc")
-        for task in task_candidates:
-            if "state" in task._fields and task.state == "1_canceled":
-                continue
-            if task._restock_task_is_done():
-                continue
-            return task
-        return None
+            ("restock_open_identity_key", "=", identity_key),
+        ], limit=1)
+        return task or None
 
     def _update_task_description_for_items(
         self,
@@ -1231,11 +2812,11 @@ class ShopifyRestockService(models.AbstractModel):
     ) -> None:
         if not task:
             return
-        active_item = self.env["shopify.restock.item"].sudo().search([
-            ("todo_task_id", "=", task.id),
-            ("is_active_snapshot", "=", True),
-            ("inventory_transferred", "=", False),
-        ], order="id desc", limit=1)
+        active_item = self.env["shopify.restock.item"].sudo().search(
+            self._active_task_snapshots_domain(task),
+            order="id desc",
+            limit=1,
+        )
         latest_item = active_item or task.restock_item_id
         if not latest_item:
             return
@@ -1261,19 +2842,56 @@ class ShopifyRestockService(models.AbstractModel):
     # ---------------------------
     # Email via Odoo's mail server
     # ---------------------------
-    def _send_summary_email(self, settings: Dict[str, str], result: Dict[str, Any]) -> None:
-        email_to = settings.get("email_to")
+    def _send_summary_email(self, settings: RestockSettings, result: Dict[str, Any]) -> None:
+        """Queue the run's summary email for the mail cron.
+
+        The body lists at most ``settings.email_max_rows`` alerts, most urgent
+        first; every alert is in a gzipped CSV attachment. The mail is only
+        queued, so the run never waits on the SMTP server.
+        """
+        email_to = settings.email_to
         if not email_to:
             return
-        subject = (
-            f"Shopify Restock: {result.get('rss_item_count', 0)} item(s) need attention"
+        # Most urgent first; within an urgency, the largest recommended order first.
+        alerts = sorted(
+            result.get("rss_items") or [],
+            key=lambda alert: (
+                URGENCY_RANK.get(alert.get("urgency"), len(URGENCY_RANK)),
+                -(alert.get("restock_amount") or 0),
+            ),
         )
-        body_html = result.get("email_body") or "<p>No details</p>"
+        shown = alerts[:settings.email_max_rows]
+        report_timestamp = result.get("report_timestamp")
+        body_html = self.env["ir.qweb"]._render(SUMMARY_EMAIL_TEMPLATE, {
+            "error": result.get("error"),
+            "alerts": shown,
+            "alert_count": len(alerts),
+            "omitted_count": len(alerts) - len(shown),
+            "generated": fields.Datetime.to_string(report_timestamp) if report_timestamp else "",
+        })
 
         mail_vals = {
-            "subject": subject,
+            "subject": f"Shopify Restock: {result.get('rss_item_count', 0)} item(s) need attention",
             "email_to": email_to,
             "body_html": body_html,
         }
-        mail = self.env["mail.mail"].sudo().create(mail_vals)
-        mail.send()
+        if alerts:
+            attachment = self.env["ir.attachment"].sudo().create({
+                "name": f"shopify_restock_{result.get('report_date') or fields.Date.today()}.csv.gz",
+                "raw": self._summary_csv(alerts),
+                "mimetype": "application/gzip",
+            })
+            mail_vals["attachment_ids"] = [(4, attachment.id)]
+        self.env["mail.mail"].sudo().create(mail_vals)
+        cron = self.env.ref("mail.ir_cron_mail_scheduler_action", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    def _summary_csv(self, alerts: List[Dict[str, Any]]) -> bytes:
+        """Return ``alerts`` as a gzip-compressed UTF-8 CSV file."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([label for _key, label in SUMMARY_CSV_COLUMNS])
+        for alert in alerts:
+            writer.writerow(["" if alert.get(key) is None else alert.get(key) for key, _label in SUMMARY_CSV_COLUMNS])
+        return gzip.compress(buffer.getvalue().encode("utf-8"))
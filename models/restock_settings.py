@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass(frozen=True)
+class RestockSettings:
+    """Immutable snapshot of the restock configuration.
+
+    Built by ``shopify.restock.service._load_settings`` from the cached
+    ``ir.config_parameter`` values. Per-run variations, such as a location
+    override or the locations an all-locations crawl tracks, are derived with
+    ``dataclasses.replace`` so the shared cached instance is never mutated.
+    It holds no records, so the prefetch and inventory worker threads can read
+    it safely.
+    """
+
+    store_domain: str
+    access_token: str
+    api_version: str
+    location_id_global: str
+    location_id_numeric: str
+    project_id: int
+    source_location_id: int
+    odoo_location_id: int
+    fetch_mode: str
+    inventory_mode: str
+    catalog_source: str
+    inventory_workers: int
+    bulk_poll_interval: float
+    bulk_timeout: int
+    inventory_filter_location: bool
+    email_to: str = ""
+    # Alerts listed in the summary email body; the CSV attachment has them all.
+    email_max_rows: int = 200
+    # (numeric id, global id) pairs an all-locations crawl keeps quantities for.
+    inventory_locations: Tuple[Tuple[str, str], ...] = ()
+
+
+@dataclass(frozen=True)
+class ScheduleSettings:
+    """Immutable snapshot of the automatic schedule configuration."""
+
+    enabled: bool
+    selected_weekdays: Tuple[int, ...]
+    scheduled_minutes: int
+    timezone_name: str
+    employee_id: int
+    location_id: int
+    all_locations: bool
+    owner_user_id: int
+    last_run_on: str
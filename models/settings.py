@@ -30,6 +30,55 @@ class ResConfigSettings(models.TransientModel):
         default="2023-04",
         help="e.g. 2023-04",
     )
+    shopify_fetch_mode = fields.Selection(
+        selection=[
+            ("paginated", "Paginated Queries"),
+            ("bulk", "Bulk Operation"),
+        ],
+        string="Catalog Fetch Mode",
+        default="paginated",
+        help="Paginated queries fetch 50 products per request. Bulk Operation asks Shopify to export "
+        "the catalog as one JSONL file, which is much faster for large catalogs.",
+    )
+    shopify_catalog_source = fields.Selection(
+        selection=[
+            ("live", "Live Crawl"),
+            ("mirror", "Local Mirror"),
+        ],
+        string="Catalog Source",
+        default="live",
+        help="Local Mirror keeps a copy of product titles, thresholds and publications in Odoo and only "
+        "downloads products updated since the last run. Inventory is still read live, through REST.",
+    )
+    shopify_inventory_mode = fields.Selection(
+        selection=[
+            ("rest", "Separate REST Pass"),
+            ("inline", "Inline in Product Query"),
+            ("local", "Local Webhook Table"),
+        ],
+        string="Inventory Fetch Mode",
+        default="rest",
+        help="Inline reads each variant's available quantity at the configured location inside "
+        "the product query and skips the separate inventory level requests. Local Webhook Table "
+        "evaluates the catalog mirror against levels pushed by Shopify webhooks and sends no request.",
+    )
+    shopify_webhook_secret = fields.Char(
+        string="Webhook Signing Secret",
+        help="Shared secret Shopify signs webhooks with. Deliveries to /shopify_restock/webhook "
+        "without a matching X-Shopify-Hmac-Sha256 signature are rejected.",
+    )
+    shopify_inventory_workers = fields.Integer(
+        string="Inventory Fetch Workers",
+        default=4,
+        help="Number of inventory level requests sent to Shopify in parallel. "
+        "Requests still share the store's REST call allowance.",
+    )
+    shopify_inventory_filter_location = fields.Boolean(
+        string="Fetch Only Configured Location Levels",
+        default=True,
+        help="Ask Shopify for the inventory levels of the configured location only. "
+        "Responses are smaller and need fewer pages on multi-location shops.",
+    )
     shopify_location_id_global = fields.Char(
         string="Shopify Location ID (Global)",
         help="e.g. gid://shopify/Location/123456789",
@@ -56,6 +105,12 @@ class ResConfigSettings(models.TransientModel):
         domain=[("usage", "=", "internal")],
         help="Default retail/store location to transfer stock TO. Can be overridden per Shopify location.",
     )
+    restock_email_max_rows = fields.Integer(
+        string="Email Row Limit",
+        default=200,
+        help="Alerts listed in the summary email, most urgent first. "
+        "Every alert is included in the attached CSV file.",
+    )
     restock_schedule_enabled = fields.Boolean(
         string="Enable Automatic Runs",
         help="Run the Shopify restock check automatically on a weekly schedule.",
@@ -70,6 +125,10 @@ class ResConfigSettings(models.TransientModel):
         string="Automatic Run Shopify Location",
         help="Optional location override for scheduled runs. If left blank, the default Shopify location settings are used.",
     )
+    restock_schedule_all_locations = fields.Boolean(
+        string="Automatic Run For All Locations",
+        help="Crawl the catalog once per scheduled run and record a run for every active Shopify location.",
+    )
     restock_schedule_time = fields.Float(
         string="Run Time",
         default=9.0,
@@ -116,11 +175,21 @@ class ResConfigSettings(models.TransientModel):
             shopify_store_domain=ICP.get_param("odoo_shopify_restock.store_domain", default=""),
             shopify_access_token=ICP.get_param("odoo_shopify_restock.access_token", default=""),
             shopify_api_version=ICP.get_param("odoo_shopify_restock.api_version", default="2023-04"),
+            shopify_fetch_mode=ICP.get_param("odoo_shopify_restock.fetch_mode", default="paginated") or "paginated",
+            shopify_catalog_source=ICP.get_param("odoo_shopify_restock.catalog_source", default="live") or "live",
+            shopify_inventory_mode=ICP.get_param("odoo_shopify_restock.inventory_mode", default="rest") or "rest",
+            shopify_webhook_secret=ICP.get_param("odoo_shopify_restock.webhook_secret", default=""),
+            shopify_inventory_workers=int(ICP.get_param("odoo_shopify_restock.inventory_workers", default="4") or 4),
+            shopify_inventory_filter_location=self._param_as_bool(
+                "odoo_shopify_restock.inventory_filter_location",
+                default=True,
+            ),
             shopify_location_id_global=ICP.get_param("odoo_shopify_restock.location_id_global", default=""),
             shopify_location_id_numeric=ICP.get_param("odoo_shopify_restock.location_id_numeric", default=""),
             restock_project_id=int(ICP.get_param("odoo_shopify_restock.project_id", default="0") or 0) or False,
             restock_source_location_id=int(ICP.get_param("odoo_shopify_restock.source_location_id", default="0") or 0) or False,
             restock_odoo_location_id=int(ICP.get_param("odoo_shopify_restock.odoo_location_id", default="0") or 0) or False,
+            restock_email_max_rows=int(ICP.get_param("odoo_shopify_restock.email_max_rows", default="200") or 0),
             restock_schedule_enabled=self._param_as_bool(
                 "odoo_shopify_restock.schedule_enabled",
                 default=False,
@@ -131,6 +200,10 @@ class ResConfigSettings(models.TransientModel):
             restock_schedule_location_id=int(
                 ICP.get_param("odoo_shopify_restock.schedule_location_id", default="0") or 0
             ) or False,
+            restock_schedule_all_locations=self._param_as_bool(
+                "odoo_shopify_restock.schedule_all_locations",
+                default=False,
+            ),
             restock_schedule_time=float(
                 ICP.get_param("odoo_shopify_restock.schedule_time", default="9.0") or 9.0
             ),
@@ -174,14 +247,28 @@ class ResConfigSettings(models.TransientModel):
         ICP.set_param("odoo_shopify_restock.store_domain", self.shopify_store_domain or "")
         ICP.set_param("odoo_shopify_restock.access_token", self.shopify_access_token or "")
         ICP.set_param("odoo_shopify_restock.api_version", self.shopify_api_version or "")
+        ICP.set_param("odoo_shopify_restock.fetch_mode", self.shopify_fetch_mode or "paginated")
+        ICP.set_param("odoo_shopify_restock.catalog_source", self.shopify_catalog_source or "live")
+        ICP.set_param("odoo_shopify_restock.inventory_mode", self.shopify_inventory_mode or "rest")
+        ICP.set_param("odoo_shopify_restock.webhook_secret", (self.shopify_webhook_secret or "").strip())
+        ICP.set_param("odoo_shopify_restock.inventory_workers", str(max(self.shopify_inventory_workers or 1, 1)))
+        ICP.set_param(
+            "odoo_shopify_restock.inventory_filter_location",
+            "1" if self.shopify_inventory_filter_location else "0",
+        )
         ICP.set_param("odoo_shopify_restock.location_id_global", self.shopify_location_id_global or "")
         ICP.set_param("odoo_shopify_restock.location_id_numeric", self.shopify_location_id_numeric or "")
         ICP.set_param("odoo_shopify_restock.project_id", str(self.restock_project_id.id or 0))
         ICP.set_param("odoo_shopify_restock.source_location_id", str(self.restock_source_location_id.id or 0))
         ICP.set_param("odoo_shopify_restock.odoo_location_id", str(self.restock_odoo_location_id.id or 0))
+        ICP.set_param("odoo_shopify_restock.email_max_rows", str(max(self.restock_email_max_rows, 0)))
         ICP.set_param("odoo_shopify_restock.schedule_enabled", "1" if self.restock_schedule_enabled else "0")
         ICP.set_param("odoo_shopify_restock.schedule_employee_id", str(self.restock_schedule_employee_id.id or 0))
         ICP.set_param("odoo_shopify_restock.schedule_location_id", str(self.restock_schedule_location_id.id or 0))
+        ICP.set_param(
+            "odoo_shopify_restock.schedule_all_locations",
+            "1" if self.restock_schedule_all_locations else "0",
+        )
         ICP.set_param("odoo_shopify_restock.schedule_time", str(self.restock_schedule_time or 0.0))
         ICP.set_param(
             "odoo_shopify_restock.schedule_timezone",
@@ -193,4 +280,25 @@ class ResConfigSettings(models.TransientModel):
         for field_name in SCHEDULE_DAY_FIELDS:
             param_name = field_name.replace("restock_", "odoo_shopify_restock.")
             ICP.set_param(param_name, "1" if getattr(self, field_name) else "0")
+        # Drop the cached RestockSettings/ScheduleSettings snapshots.
+        self.env.registry.clear_cache()
         self.env["shopify.restock.service"].sudo().sync_schedule_cron()
+
+    def action_sync_local_inventory(self):
+        self.ensure_one()
+        # Save first so the sync uses the values on screen.
+        self.set_values()
+        stats = self.env["shopify.restock.service"]._sync_local_inventory()
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": "Shopify Sync Complete",
+                "message": (
+                    f"{stats.get('fetched', 0)} products fetched, {stats.get('removed', 0)} removed, "
+                    f"{stats.get('levels', 0)} inventory levels stored."
+                ),
+                "type": "success",
+                "sticky": False,
+            },
+        }
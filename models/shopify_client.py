@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+_logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 32.0
+# Calls kept in reserve below the REST bucket size before pacing kicks in.
+REST_BUCKET_HEADROOM = 2
+# Shopify's standard REST allowance: a 40-call bucket leaking 2 calls/second.
+# Plus stores get ten times both; the bucket resizes from the response headers.
+REST_BUCKET_CAPACITY = 40
+REST_BUCKET_LEAK_SECONDS = 20.0
+
+
+class ShopifyQueryCostError(ValueError):
+    """Raised when Shopify rejects a GraphQL query for exceeding the single-query cost limit."""
+
+    def __init__(self, message: str, requested_cost: Optional[float] = None, max_cost: Optional[float] = None):
+        super().__init__(message)
+        self.requested_cost = requested_cost
+        self.max_cost = max_cost
+
+
+class LeakyBucket:
+    """Thread-safe leaky bucket mirroring Shopify's REST call allowance.
+
+    ``acquire`` blocks until a call fits under the bucket size minus a small
+    headroom. ``sync`` reconciles the local estimate with the level and size
+    Shopify reports, so concurrent workers never outrun the shared allowance.
+    """
+
+    def __init__(self, capacity: int = REST_BUCKET_CAPACITY, headroom: int = REST_BUCKET_HEADROOM):
+        self.capacity = capacity
+        self.leak_rate = capacity / REST_BUCKET_LEAK_SECONDS
+        self.headroom = headroom
+        self._level = 0.0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _leak(self) -> None:
+        now = time.monotonic()
+        self._level = max(self._level - (now - self._updated_at) * self.leak_rate, 0.0)
+        self._updated_at = now
+
+    def acquire(self) -> float:
+        """Reserve one call and return the number of seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._leak()
+                limit = max(self.capacity - self.headroom, 1)
+                if self._level + 1 <= limit:
+                    self._level += 1
+                    return waited
+                delay = (self._level + 1 - limit) / self.leak_rate
+            time.sleep(delay)
+            waited += delay
+
+    def sync(self, used: int, capacity: int) -> None:
+        with self._lock:
+            self._leak()
+            if capacity > 0 and capacity != self.capacity:
+                self.capacity = capacity
+                self.leak_rate = capacity / REST_BUCKET_LEAK_SECONDS
+            # Other clients of the same shop may be consuming calls too.
+            self._level = max(self._level, float(used))
+
+
+class ShopifyClient:
+    """HTTP client shared by every Shopify call made during one run.
+
+    Keeps a keep-alive session, retries 429/5xx responses with exponential
+    backoff and paces GraphQL requests from the cost bucket Shopify reports in
+    ``extensions.cost.throttleStatus``. REST calls are paced from the
+    ``X-Shopify-Shop-Api-Call-Limit`` header through a shared ``LeakyBucket``,
+    which makes REST calls safe to issue from several threads. Counters are
+    exposed in ``stats``.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        access_token: str,
+        api_version: str,
+        *,
+        timeout: int = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        pool_size: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_version = api_version
+        self.timeout = timeout
+        self.max_retries = max(int(max_retries), 0)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Auth headers are added per request so they never leak to the signed
+        # storage URLs returned by bulk operations.
+        self._auth_headers = {
+            "Content-Type": "application/json",
+            "X-Shopify-Access-Token": access_token,
+        }
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {
+            "requests": 0,
+            "retries": 0,
+            "throttle_waits": 0,
+            "throttle_wait_seconds": 0.0,
+            "bytes_received": 0,
+        }
+        # GraphQL cost bucket as last reported by Shopify.
+        self._gql_maximum: Optional[float] = None
+        self._gql_available: Optional[float] = None
+        self._gql_restore_rate: Optional[float] = None
+        self._gql_reported_at: Optional[float] = None
+        self._gql_costs: Dict[str, float] = {}
+        self.last_query_cost: Optional[Dict[str, Any]] = None
+        self.rest_limiter = LeakyBucket()
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "ShopifyClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # ---------------------------
+    # URLs
+    # ---------------------------
+    @property
+    def graphql_url(self) -> str:
+        return f"{self.base_url}/admin/api/{self.api_version}/graphql.json"
+
+    def rest_url(self, path: str) -> str:
+        return f"{self.base_url}/admin/api/{self.api_version}/{path.lstrip('/')}"
+
+    # ---------------------------
+    # Counters
+    # ---------------------------
+    def _count(self, key: str, amount: Any = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def _record_throttle_wait(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.stats["throttle_waits"] += 1
+            self.stats["throttle_wait_seconds"] += seconds
+
+    def _throttle_sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        self._record_throttle_wait(seconds)
+        time.sleep(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["throttle_wait_seconds"] = round(stats["throttle_wait_seconds"], 3)
+        return stats
+
+    # ---------------------------
+    # Transport
+    # ---------------------------
+    def _backoff_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                if retry_after:
+                    return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return min(self.backoff_base * (2 ** attempt), self.backoff_max)
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        auth: bool = True,
+        stream: bool = False,
+        rest: bool = False,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request, retrying connection errors, 429 and 5xx responses.
+
+        ``rest`` paces every attempt, retries included, through the shared
+        REST bucket and syncs the bucket from each response.
+        """
+        headers = dict(self._auth_headers) if auth else {}
+        attempt = 0
+        while True:
+            if rest:
+                self._record_throttle_wait(self.rest_limiter.acquire())
+            self._count("requests")
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=stream,
+                    **kwargs,
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                _logger.warning("Shopify %s %s failed to connect, retrying in %.1fs", method, url, delay)
+            else:
+                if rest:
+                    self._sync_rest_limit(response)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    if not stream:
+                        self._count("bytes_received", len(response.content))
+                    return response
+                delay = self._backoff_delay(attempt, response)
+                _logger.warning(
+                    "Shopify %s %s returned %s, retrying in %.1fs",
+                    method,
+                    url,
+                    response.status_code,
+                    delay,
+                )
+                response.close()
+                if response.status_code == 429:
+                    self._throttle_sleep(delay)
+                    delay = 0.0
+            self._count("retries")
+            if delay:
+                time.sleep(delay)
+            attempt += 1
+
+    # ---------------------------
+    # GraphQL
+    # ---------------------------
+    def _estimated_available(self) -> Optional[float]:
+        if self._gql_available is None or self._gql_reported_at is None:
+            return None
+        restored = (time.monotonic() - self._gql_reported_at) * (self._gql_restore_rate or 0.0)
+        return min(self._gql_available + restored, self._gql_maximum or float("inf"))
+
+    def _wait_for_graphql_budget(self, query: str) -> None:
+        with self._lock:
+            expected_cost = self._gql_costs.get(query)
+            available = self._estimated_available()
+            restore_rate = self._gql_restore_rate
+        if expected_cost is None or available is None or not restore_rate:
+            return
+        if available >= expected_cost:
+            return
+        self._throttle_sleep((expected_cost - available) / restore_rate)
+
+    def _record_graphql_cost(self, query: str, payload: Dict[str, Any]) -> None:
+        cost = (payload.get("extensions") or {}).get("cost") or {}
+        throttle_status = cost.get("throttleStatus") or {}
+        with self._lock:
+            if cost.get("requestedQueryCost") is not None:
+                self._gql_costs[query] = float(cost["requestedQueryCost"])
+            if throttle_status:
+                self._gql_maximum = float(throttle_status.get("maximumAvailable") or 0.0) or None
+                self._gql_available = float(throttle_status.get("currentlyAvailable") or 0.0)
+                self._gql_restore_rate = float(throttle_status.get("restoreRate") or 0.0) or None
+                self._gql_reported_at = time.monotonic()
+            if cost:
+                self.last_query_cost = cost
+
+    def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run a GraphQL query and return its ``data`` payload."""
+        attempt = 0
+        while True:
+            self._wait_for_graphql_budget(query)
+            response = self._request(
+                "POST",
+                self.graphql_url,
+                json={"query": query, "variables": variables or {}},
+            )
+            payload = response.json()
+            self._record_graphql_cost(query, payload)
+            errors = payload.get("errors") or []
+            throttled = any(
+                (error.get("extensions") or {}).get("code") == "THROTTLED"
+                for error in errors
+                if isinstance(error, dict)
+            )
+            if throttled and attempt < self.max_retries:
+                self._count("retries")
+                attempt += 1
+                with self._lock:
+                    restore_rate = self._gql_restore_rate
+                if not restore_rate or self._gql_costs.get(query) is None:
+                    self._throttle_sleep(self._backoff_delay(attempt))
+                continue
+            for error in errors:
+                if not isinstance(error, dict):
+                    continue
+                extensions = error.get("extensions") or {}
+                if extensions.get("code") == "MAX_COST_EXCEEDED":
+                    raise ShopifyQueryCostError(
+                        f"GraphQL query cost exceeded: {errors}",
+                        requested_cost=extensions.get("cost"),
+                        max_cost=extensions.get("maxCost"),
+                    )
+            if not payload.get("data"):
+                raise ValueError(f"GraphQL query error: {errors}")
+            if errors:
+                self._check_partial_errors(errors)
+            return payload["data"]
+
+    def _check_partial_errors(self, errors: List[Any]) -> None:
+        """Log the errors Shopify returned alongside data; raise if a requested field failed.
+
+        An error with a ``path`` means that field resolved to null, e.g. one
+        aliased ``product(id:)`` in a batched follow-up query. Returning the
+        data would silently drop what that field should have held.
+        """
+        _logger.warning("GraphQL query returned errors with its data: %s", errors)
+        failed_paths = [
+            error["path"]
+            for error in errors
+            if isinstance(error, dict) and error.get("path")
+        ]
+        if failed_paths:
+            raise ValueError(f"GraphQL query failed for {failed_paths}: {errors}")
+
+    # ---------------------------
+    # REST
+    # ---------------------------
+    def _sync_rest_limit(self, response: requests.Response) -> None:
+        call_limit = response.headers.get("X-Shopify-Shop-Api-Call-Limit") or ""
+        try:
+            used, capacity = (int(part) for part in call_limit.split("/", 1))
+        except ValueError:
+            return
+        self.rest_limiter.sync(used, capacity)
+
+    def get(self, url: str, *, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        """Issue a rate-limited REST GET; safe to call from worker threads."""
+        return self._request("GET", url, params=params, rest=True)
+
+    # ---------------------------
+    # Downloads
+    # ---------------------------
+    def iter_lines(self, url: str) -> Iterator[bytes]:
+        """Stream a non-Shopify-API URL (e.g. a bulk result file) line by line."""
+        response = self._request("GET", url, auth=False, stream=True)
+        with response:
+            for line in response.iter_lines():
+                self._count("bytes_received", len(line) + 1)
+                if line:
+                    yield line
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+from . import test_bulk_operation
+from . import test_evaluation_benchmark
+from . import test_open_identity_key
+from . import test_snapshot_indexes
+from . import test_task_batching
+from . import test_webhook
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+import dataclasses
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from odoo.tests import TransactionCase, tagged
+
+
+API_VERSION = "2024-04"
+BULK_OPERATION_ID = "gid://shopify/BulkOperation/1"
+PAGE_SIZE = 2
+
+PRODUCTS = [
+    {
+        "id": "gid://shopify/Product/1",
+        "title": "Trail Mix",
+        "handle": "trail-mix",
+        "metafields": [
+            {"key": "restock_level", "value": "4", "type": "number_integer"},
+            {"key": "desired_inventory_level", "value": "12", "type": "number_integer"},
+        ],
+        "publications": [
+            {
+                "channel": {"id": "gid://shopify/Channel/1", "name": "Online Store", "handle": "online_store"},
+                "isPublished": True,
+                "publishDate": "2024-05-01T10:00:00Z",
+            },
+            {
+                "channel": {"id": "gid://shopify/Channel/2", "name": "Point of Sale", "handle": "pos"},
+                "isPublished": True,
+                "publishDate": "2024-05-01T10:00:00Z",
+            },
+        ],
+        "variants": [
+            {
+                "id": "gid://shopify/ProductVariant/11",
+                "title": "Small",
+                "sku": "TM-S",
+                "inventoryItem": {"id": "gid://shopify/InventoryItem/111"},
+                "metafields": [{"key": "restock_level", "value": "6", "type": "number_integer"}],
+            },
+            {
+                "id": "gid://shopify/ProductVariant/12",
+                "title": "Large",
+                "sku": "TM-L",
+                "inventoryItem": {"id": "gid://shopify/InventoryItem/112"},
+                "metafields": [],
+            },
+        ],
+    },
+    {
+        "id": "gid://shopify/Product/2",
+        "title": "Granola",
+        "handle": "granola",
+        "metafields": [{"key": "restock_level", "value": "2.5", "type": "number_decimal"}],
+        "publications": [
+            {
+                "channel": {"id": "gid://shopify/Channel/2", "name": "Point of Sale", "handle": "pos"},
+                "isPublished": False,
+                "publishDate": None,
+            },
+        ],
+        "variants": [
+            {
+                "id": "gid://shopify/ProductVariant/21",
+                "title": "Default Title",
+                "sku": "GR-1",
+                "inventoryItem": {"id": "gid://shopify/InventoryItem/211"},
+                "metafields": [
+                    {"key": "desired_inventory_level", "value": "10", "type": "number_integer"},
+                    {"key": "notes", "value": "{\"shelf\": 3}", "type": "json"},
+                ],
+            },
+        ],
+    },
+    {
+        "id": "gid://shopify/Product/3",
+        "title": "Oat Bar",
+        "handle": "oat-bar",
+        "metafields": [],
+        "publications": [],
+        "variants": [
+            {
+                "id": "gid://shopify/ProductVariant/31",
+                "title": "Default Title",
+                "sku": "",
+                "inventoryItem": {"id": "gid://shopify/InventoryItem/311"},
+                "metafields": [],
+            },
+        ],
+    },
+]
+
+
+def _connection(nodes):
+    return {"edges": [{"node": node} for node in nodes]}
+
+
+def _paginated_node(product):
+    return {
+        "id": product["id"],
+        "title": product["title"],
+        "handle": product["handle"],
+        "metafields": _connection(product["metafields"]),
+        "publications": _connection(product["publications"]),
+        "variants": dict(
+            _connection([
+                dict(
+                    {key: value for key, value in variant.items() if key != "metafields"},
+                    metafields=_connection(variant["metafields"]),
+                )
+                for variant in product["variants"]
+            ]),
+            pageInfo={"hasNextPage": False, "endCursor": None},
+        ),
+    }
+
+
+def _bulk_lines(products):
+    """Flatten ``products`` the way a bulk operation writes its JSONL file."""
+    for product in products:
+        yield {key: product[key] for key in ("id", "title", "handle")}
+        for metafield in product["metafields"]:
+            yield dict(metafield, __parentId=product["id"])
+        for publication in product["publications"]:
+            yield dict(publication, __parentId=product["id"])
+        for variant in product["variants"]:
+            yield dict(
+                {key: value for key, value in variant.items() if key != "metafields"},
+                __parentId=product["id"],
+            )
+            for metafield in variant["metafields"]:
+                yield dict(metafield, __parentId=variant["id"])
+
+
+class FakeShopifyHandler(BaseHTTPRequestHandler):
+    """Answers the paginated products query, the bulk mutation and poll, and serves the JSONL file."""
+
+    def log_message(self, *args):  # noqa: ARG002
+        return
+
+    def _send(self, body, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/bulk/result.jsonl":
+            self.send_error(404)
+            return
+        body = "".join(json.dumps(line) + "\n" for line in _bulk_lines(PRODUCTS)).encode("utf-8")
+        self._send(body, content_type="application/jsonl")
+
+    def do_POST(self):
+        if self.path != f"/admin/api/{API_VERSION}/graphql.json":
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        query = request["query"]
+        variables = request.get("variables") or {}
+        if "bulkOperationRunQuery" in query:
+            data = {
+                "bulkOperationRunQuery": {
+                    "bulkOperation": {"id": BULK_OPERATION_ID, "status": "CREATED"},
+                    "userErrors": [],
+                },
+            }
+        elif "BulkOperation" in query:
+            host, port = self.server.server_address[:2]
+            data = {
+                "node": {
+                    "id": BULK_OPERATION_ID,
+                    "status": "COMPLETED",
+                    "errorCode": None,
+                    "objectCount": str(sum(1 for _line in _bulk_lines(PRODUCTS))),
+                    "url": f"http://{host}:{port}/bulk/result.jsonl",
+                    "partialDataUrl": None,
+                },
+            }
+        else:
+            start = int(variables.get("cursor") or 0)
+            end = start + PAGE_SIZE
+            data = {
+                "products": {
+                    "edges": [{"node": _paginated_node(product)} for product in PRODUCTS[start:end]],
+                    "pageInfo": {"hasNextPage": end < len(PRODUCTS), "endCursor": str(end)},
+                },
+            }
+        self._send(json.dumps({"data": data}).encode("utf-8"))
+
+
+@tagged("post_install", "-at_install")
+class TestBulkOperationCrawl(TransactionCase):
+    """Bulk mode against a local fake endpoint must yield what the paginated crawl yields."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeShopifyHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+        cls.service = cls.env["shopify.restock.service"]
+        host, port = cls.server.server_address[:2]
+        cls.settings = dataclasses.replace(
+            cls.service._load_settings(),
+            store_domain=f"http://{host}:{port}",
+            access_token="test-token",
+            api_version=API_VERSION,
+            location_id_numeric="1",
+            inventory_mode="rest",
+            bulk_poll_interval=0.01,
+            bulk_timeout=10,
+        )
+
+    def _crawl(self, fetch_mode):
+        settings = dataclasses.replace(self.settings, fetch_mode=fetch_mode)
+        with self.service._get_shopify_client(settings) as client:
+            return [
+                self.service._normalize_product(edge["node"])
+                for page in self.service._iter_product_pages(settings, client)
+                for edge in page
+            ]
+
+    def test_bulk_products_match_paginated_crawl(self):
+        bulk = self._crawl("bulk")
+        self.assertEqual([product["id"] for product in bulk], [product["id"] for product in PRODUCTS])
+        self.assertEqual(bulk, self._crawl("paginated"))
+
+    def test_bulk_products_are_normalized(self):
+        trail_mix, granola, oat_bar = self._crawl("bulk")
+        self.assertEqual((trail_mix["restock_level"], trail_mix["desired_level"]), (4, 12))
+        self.assertTrue(trail_mix["published_online"])
+        self.assertTrue(trail_mix["published_retail"])
+        self.assertEqual(
+            [(variant["sku"], variant["restock_level"]) for variant in trail_mix["variants"]],
+            [("TM-S", 6), ("TM-L", None)],
+        )
+        self.assertEqual(
+            trail_mix["variants"][0]["inventory_item"],
+            {"id": "gid://shopify/InventoryItem/111"},
+        )
+        self.assertEqual(granola["restock_level"], 2.5)
+        self.assertFalse(granola["published_retail"])
+        self.assertEqual(granola["variants"][0]["desired_level"], 10)
+        self.assertEqual(oat_bar["variants"][0]["sku"], "")
+        self.assertFalse(oat_bar["published_online"])
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark of the per-page threshold evaluation against a columnar pass.
+
+Opt-in only: run it with ``--test-tags restock_benchmark``. It records why
+``_evaluate_products_page`` keeps its fused per-variant loop.
+"""
+import logging
+import time
+from array import array
+
+from odoo.tests import TransactionCase, tagged
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_logger = logging.getLogger(__name__)
+
+LOCATION = "7"
+VARIANTS_PER_PRODUCT = 4
+SIZES = (10_000, 100_000, 1_000_000)
+REPORT_CONTEXT = {"store_short": "bench", "current_timestamp": "2026-01-01 00:00:00"}
+
+
+def build_catalog(variant_count):
+    """Return normalized products and an inventory level map with ``variant_count`` variants."""
+    products = []
+    levels = {}
+    for product_index in range(variant_count // VARIANTS_PER_PRODUCT):
+        variants = []
+        for offset in range(VARIANTS_PER_PRODUCT):
+            number = product_index * VARIANTS_PER_PRODUCT + offset
+            levels[str(number)] = {LOCATION: number % 23}
+            variants.append({
+                "id": f"gid://shopify/ProductVariant/{number}",
+                "title": "Default Title" if offset == 0 else f"Size {offset}",
+                "sku": f"SKU-{number}",
+                "inventory_item": {"id": f"gid://shopify/InventoryItem/{number}"},
+                "restock_level": 12 if offset == 1 else None,
+                "desired_level": 30 if offset == 1 else None,
+            })
+        products.append({
+            "id": f"gid://shopify/Product/{product_index}",
+            "title": f"Product {product_index}",
+            "handle": f"product-{product_index}",
+            "restock_level": 8 if product_index % 3 else None,
+            "desired_level": 20 if product_index % 3 else None,
+            "variants": variants,
+        })
+    return products, levels
+
+
+def evaluate_columnar(service, products, levels, location_id_numeric, report_context):
+    """The columnar candidate: fill typed columns, decide alerts in one pass, format only alerts."""
+    refs = []
+    quantities = array("d")
+    restock_levels = array("d")
+    desired_levels = array("d")
+    for product in products:
+        product_restock = product["restock_level"]
+        product_desired = product["desired_level"]
+        for variant in product["variants"]:
+            refs.append((product, variant))
+            quantities.append(service._variant_location_qty(variant, levels, location_id_numeric))
+            restock_levels.append(variant["restock_level"] or product_restock or 0)
+            desired_levels.append(variant["desired_level"] or product_desired or 0)
+
+    if numpy is not None:
+        qty = numpy.frombuffer(quantities, dtype=numpy.float64)
+        restock = numpy.frombuffer(restock_levels, dtype=numpy.float64)
+        alerting = numpy.flatnonzero((restock > 0) & (qty < restock)).tolist()
+    else:
+        alerting = [
+            index
+            for index, (qty, restock) in enumerate(zip(quantities, restock_levels))
+            if restock and qty < restock
+        ]
+
+    store_short = report_context["store_short"]
+    items = []
+    for index in alerting:
+        product, variant = refs[index]
+        loc1_qty = int(quantities[index])
+        final_restock = variant["restock_level"] or product["restock_level"]
+        final_desired = variant["desired_level"] or product["desired_level"]
+        product_url = f"https://{store_short}.com/products/{product['handle']}"
+        if variant["title"] and variant["title"] != "Default Title":
+            product_url += f"?variant={variant['id'].split('/')[-1]}"
+        items.append({
+            "link": product_url,
+            "product_title": product["title"],
+            "variant_title": variant["title"],
+            "sku": variant["sku"],
+            "current_qty": loc1_qty,
+            "restock_level": final_restock,
+            "restock_amount": (final_desired - loc1_qty) if final_desired else 0,
+            "product_id": product["id"],
+            "variant_id": variant["id"],
+            "product_handle": product["handle"],
+            "urgency": "high" if loc1_qty == 0 else "medium" if loc1_qty < final_restock * 0.5 else "low",
+        })
+    return items
+
+
+def best_time(function, repeat):
+    timings = []
+    for _attempt in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+@tagged("post_install", "-at_install", "-standard", "restock_benchmark")
+class TestEvaluationBenchmark(TransactionCase):
+    """Compare ``_evaluate_products_page`` with the columnar candidate at 10k, 100k and 1M variants."""
+
+    def test_fused_loop_against_columnar(self):
+        service = self.env["shopify.restock.service"]
+        for size in SIZES:
+            products, levels = build_catalog(size)
+            repeat = 1 if size >= 1_000_000 else 3
+            loop_time, loop_items = best_time(
+                lambda: service._evaluate_products_page(products, levels, LOCATION, REPORT_CONTEXT), repeat
+            )
+            columnar_time, columnar_items = best_time(
+                lambda: evaluate_columnar(service, products, levels, LOCATION, REPORT_CONTEXT), repeat
+            )
+            self.assertEqual(columnar_items, loop_items)
+            _logger.info(
+                "%s variants: fused loop %.3fs, columnar (%s) %.3fs",
+                size, loop_time, "numpy" if numpy is not None else "array", columnar_time,
+            )
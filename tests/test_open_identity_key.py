@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged("post_install", "-at_install")
+class TestOpenIdentityKey(TransactionCase):
+    """Open restock tasks hold their identity key once per project, in Python and SQL alike."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = cls.env["shopify.restock.service"].sudo()
+        cls.Task = cls.env["project.task"].sudo()
+        cls.Item = cls.env["shopify.restock.item"].sudo()
+        cls.project = cls.env["project.project"].create({"name": "Restock identity keys"})
+        cls.run = cls.env["shopify.restock.run"].sudo().create({})
+
+    def _item(self, title="Trail Mix", identity_key="k-a"):
+        return self.Item.create({
+            "run_id": self.run.id,
+            "product_title": title,
+            "identity_key": identity_key,
+            "current_qty": 1,
+            "restock_level": 5,
+            "restock_amount": 4,
+        })
+
+    def _task(self, item):
+        task = self.Task.create({
+            "name": item.product_title,
+            "project_id": self.project.id,
+            "restock_item_id": item.id,
+        })
+        item.write({"todo_task_id": task.id})
+        return task
+
+    def _open_in_sql(self, task):
+        self.env.flush_all()
+        self.env.cr.execute(
+            f"SELECT {self.Task._restock_open_task_sql('task')} FROM project_task task WHERE task.id = %s",
+            (task.id,),
+        )
+        return self.env.cr.fetchone()[0]
+
+    def test_sql_rule_matches_python_rule(self):
+        task = self._task(self._item())
+        self.assertTrue(task._restock_task_is_open())
+        self.assertTrue(self._open_in_sql(task))
+
+        # A task without a state is open in Python, so it must be open in SQL too.
+        self.env.cr.execute("UPDATE project_task SET state = NULL WHERE id = %s", (task.id,))
+        task.invalidate_recordset(["state"])
+        self.assertTrue(task._restock_task_is_open())
+        self.assertTrue(self._open_in_sql(task))
+
+        task.write({"state": "1_canceled"})
+        self.assertFalse(task._restock_task_is_open())
+        self.assertFalse(self._open_in_sql(task))
+        self.assertFalse(task.restock_open_identity_key)
+
+    def test_null_state_task_keeps_its_key(self):
+        task = self._task(self._item())
+        self.env.cr.execute("UPDATE project_task SET state = NULL WHERE id = %s", (task.id,))
+        task.invalidate_recordset(["state"])
+        task._sync_restock_open_identity_key()
+        self.assertEqual(task.restock_open_identity_key, "k-a")
+
+    def test_duplicate_open_task_reuses_existing(self):
+        existing = self._task(self._item())
+        self.assertEqual(existing.restock_open_identity_key, "k-a")
+
+        # A new alert for the same key merges into the open task.
+        incoming = self._item(title="Trail Mix again")
+        created, merged = self.service._create_tasks_for_items_batched(self.project, incoming, None, None, None)
+        self.assertEqual((created, merged), (0, 1))
+        self.assertEqual(incoming.todo_task_id, existing)
+        self.assertEqual(self.Task.search_count([("project_id", "=", self.project.id)]), 1)
+
+        # Creating a second open task for the key directly must not hit the unique index.
+        duplicate = self._task(self._item(title="Trail Mix duplicate"))
+        self.env.flush_all()
+        self.assertFalse(duplicate.restock_open_identity_key)
+        self.assertEqual(existing.restock_open_identity_key, "k-a")
+        self.assertEqual(
+            self.service._find_existing_task_for_item(self.Task, self.project, incoming),
+            existing,
+        )
+
+    def test_archived_task_does_not_duplicate(self):
+        archived = self._task(self._item())
+        archived.write({"active": False})
+        self.assertFalse(archived._restock_task_is_open())
+        self.assertFalse(self._open_in_sql(archived))
+        self.assertFalse(archived.restock_open_identity_key)
+
+        # The first run opens a new task and keys it; the next run merges into it.
+        first = self._item(title="Trail Mix again")
+        self.assertEqual(
+            self.service._create_tasks_for_items_batched(self.project, first, None, None, None), (1, 0)
+        )
+        replacement = first.todo_task_id
+        self.assertNotEqual(replacement, archived)
+        self.assertEqual(replacement.restock_open_identity_key, "k-a")
+
+        second = self._item(title="Trail Mix once more")
+        self.assertEqual(
+            self.service._create_tasks_for_items_batched(self.project, second, None, None, None), (0, 1)
+        )
+        self.assertEqual(second.todo_task_id, replacement)
+        self.assertEqual(
+            self.Task.with_context(active_test=False).search_count([("project_id", "=", self.project.id)]), 2
+        )
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import SQL
+
+
+# The request's table size; seeding it takes a while, so the class is opt-in.
+ITEM_COUNT = 1000000
+TASK_COUNT = 20
+LOCATION_COUNT = 50
+IDENTITY_KEY_COUNT = 200
+# One snapshot in ACTIVE_EVERY is still active; the rest is superseded history.
+# Each run of ACTIVE_EVERY rows shares its key, task and location, so the
+# active rows spread evenly over them.
+ACTIVE_EVERY = 100
+TASK_IDENTITY_INDEX = "shopify_restock_item_active_task_identity_idx"
+LOCATION_TASK_INDEX = "shopify_restock_item_active_location_task_idx"
+
+
+@tagged("post_install", "-at_install", "-standard", "restock_query_plans")
+class TestSnapshotIndexes(TransactionCase):
+    """The snapshot lookups must be served by the partial active-snapshot indexes.
+
+    Run with ``--test-tags restock_query_plans``; it seeds a million items.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = cls.env["shopify.restock.service"].sudo()
+        cls.project = cls.env["project.project"].create({"name": "Restock index test"})
+        cls.tasks = cls.env["project.task"].create([
+            {"name": f"Restock task {index}", "project_id": cls.project.id}
+            for index in range(TASK_COUNT)
+        ])
+        cls.locations = cls.env["shopify.restock.location"].create([
+            {"name": f"Index test location {index}", "location_id_global": f"gid://shopify/Location/{9000 + index}"}
+            for index in range(LOCATION_COUNT)
+        ])
+        run = cls.env["shopify.restock.run"].create({})
+        cls.env.flush_all()
+        cls.env.cr.execute(
+            """
+            INSERT INTO shopify_restock_item
+                   (run_id, product_title, identity_key, todo_task_id, location_id,
+                    is_active_snapshot, inventory_transferred)
+            SELECT %(run)s,
+                   'Product ' || n,
+                   'key-' || (n / %(every)s %% %(keys)s),
+                   (%(tasks)s::int[])[1 + n / %(every)s %% %(task_count)s],
+                   (%(locations)s::int[])[1 + n / %(every)s / %(task_count)s %% %(location_count)s],
+                   n %% %(every)s = 0,
+                   FALSE
+              FROM generate_series(1, %(count)s) AS n
+            """,
+            {
+                "run": run.id,
+                "every": ACTIVE_EVERY,
+                "keys": IDENTITY_KEY_COUNT,
+                "tasks": cls.tasks.ids,
+                "task_count": TASK_COUNT,
+                "locations": cls.locations.ids,
+                "location_count": LOCATION_COUNT,
+                "count": ITEM_COUNT,
+            },
+        )
+        cls.env.cr.execute("ANALYZE shopify_restock_item")
+        cls.env.cr.execute("ANALYZE project_task")
+
+    def _plan(self, query, params=None):
+        if isinstance(query, SQL):
+            self.env.cr.execute(SQL("EXPLAIN %s", query))
+        else:
+            self.env.cr.execute(f"EXPLAIN {query}", params)
+        return "\n".join(row[0] for row in self.env.cr.fetchall())
+
+    def _search_query(self, domain, **kwargs):
+        return self.env["shopify.restock.item"].sudo()._search(domain, **kwargs).select()
+
+    def test_supersede_lookup_uses_task_identity_index(self):
+        # The same domain _supersede_task_snapshots searches with.
+        domain = self.service._active_task_snapshots_domain(self.tasks[3]) + [
+            ("identity_key", "=", "key-3"),
+        ]
+        self.assertIn(TASK_IDENTITY_INDEX, self._plan(self._search_query(domain)))
+
+    def test_description_lookup_uses_task_identity_index(self):
+        # The same search _update_task_description_for_items runs.
+        query = self._search_query(
+            self.service._active_task_snapshots_domain(self.tasks[3]),
+            order="id desc",
+            limit=1,
+        )
+        self.assertIn(TASK_IDENTITY_INDEX, self._plan(query))
+
+    def test_resolved_snapshot_update_uses_location_index(self):
+        # _deactivate_resolved_snapshots runs per location; its index leads with location_id.
+        query, params = self.service._resolved_snapshots_update_query(
+            self.project, self.locations[7], {"key-1", "key-2"}
+        )
+        self.assertIn(LOCATION_TASK_INDEX, self._plan(query, params))
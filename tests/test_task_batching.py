@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+# (product title, identity key, current qty) of the items one run reports, in order.
+INCOMING_ITEMS = [
+    ("Trail Mix", "k-a", 3),
+    ("Granola", "k-b", 1),
+    ("Granola again", "k-b", 0),
+    ("Trail Mix again", "k-a", 2),
+    ("Oat Bar", "k-d", 4),
+    ("Trail Mix last", "k-a", 1),
+]
+
+
+@tagged("post_install", "-at_install")
+class TestTaskBatching(TransactionCase):
+    """The batched task path must leave the same rows as the per-item path."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = cls.env["shopify.restock.service"].sudo()
+        cls.Item = cls.env["shopify.restock.item"].sudo()
+        cls.Task = cls.env["project.task"].sudo()
+        cls.Run = cls.env["shopify.restock.run"].sudo()
+
+    def _item_vals(self, run, title, identity_key, current_qty):
+        return {
+            "run_id": run.id,
+            "product_title": title,
+            "variant_title": "Default Title",
+            "sku": identity_key.upper(),
+            "current_qty": current_qty,
+            "restock_level": 5,
+            "restock_amount": 10 - current_qty,
+            "identity_key": identity_key,
+            "is_active_snapshot": True,
+        }
+
+    def _scenario(self, path):
+        """Run ``path`` on a fresh project holding one open task per earlier key."""
+        project = self.env["project.project"].create({"name": f"Restock {path}"})
+        previous_run = self.Run.create({})
+        previous = self.Item.create([
+            self._item_vals(previous_run, "Trail Mix earlier", "k-a", 4),
+            self._item_vals(previous_run, "Cereal earlier", "k-c", 2),
+        ])
+        for item in previous:
+            task = self.Task.create({
+                "name": item.product_title,
+                "project_id": project.id,
+                "restock_item_id": item.id,
+            })
+            item.write({"todo_task_id": task.id})
+        # A second, unrelated snapshot on the k-a task must stay active.
+        self.Item.create(dict(
+            self._item_vals(previous_run, "Trail Mix other key", "k-z", 4),
+            todo_task_id=previous[0].todo_task_id.id,
+        ))
+
+        run = self.Run.create({})
+        items = self.Item.create([self._item_vals(run, *values) for values in INCOMING_ITEMS])
+        counts = getattr(self.service, path)(project, items, None, None, None)
+        self.env.flush_all()
+        self.env.invalidate_all()
+        return counts, self._snapshot(project)
+
+    def _snapshot(self, project):
+        """Describe the project's items and tasks without database ids."""
+        tasks = self.Task.search([("project_id", "=", project.id)], order="id")
+        items = self.Item.search([("todo_task_id", "in", tasks.ids)], order="id")
+        # A task is named after the first item it ever held.
+        task_label = {
+            task.id: items.filtered(lambda item, task=task: item.todo_task_id == task)[:1].product_title
+            for task in tasks
+        }
+        item_rows = sorted(
+            (
+                item.product_title,
+                task_label[item.todo_task_id.id],
+                item.is_active_snapshot,
+                item.superseded_by_item_id.product_title or False,
+                item.superseded_reason or False,
+            )
+            for item in items
+        )
+        task_rows = sorted(
+            (
+                task_label[task.id],
+                task.restock_item_id.product_title,
+                task.restock_open_identity_key,
+                task.name,
+                task.description,
+            )
+            for task in tasks
+        )
+        return item_rows, task_rows
+
+    def test_batched_path_matches_one_by_one(self):
+        batched_counts, batched = self._scenario("_create_tasks_for_items_batched")
+        single_counts, single = self._scenario("_create_tasks_for_items_one_by_one")
+        self.assertEqual(batched_counts, single_counts)
+        self.assertEqual(batched, single)
+
+    def test_repeated_keys_merge_into_one_task(self):
+        counts, (item_rows, task_rows) = self._scenario("_create_tasks_for_items_batched")
+        # k-b and k-d get new tasks; the three k-a items merge into the existing task.
+        self.assertEqual(counts, (2, 4))
+        items = {row[0]: row[1:] for row in item_rows}
+        self.assertEqual(items["Trail Mix earlier"], ("Trail Mix earlier", False, "Trail Mix", "replaced_by_new_run"))
+        self.assertEqual(items["Trail Mix"], ("Trail Mix earlier", False, "Trail Mix again", "replaced_by_new_run"))
+        self.assertEqual(items["Trail Mix again"], ("Trail Mix earlier", False, "Trail Mix last", "replaced_by_new_run"))
+        self.assertEqual(items["Trail Mix last"], ("Trail Mix earlier", True, False, False))
+        self.assertEqual(items["Trail Mix other key"], ("Trail Mix earlier", True, False, False))
+        self.assertEqual(items["Granola"], ("Granola", False, "Granola again", "replaced_by_new_run"))
+        self.assertEqual(items["Granola again"], ("Granola", True, False, False))
+        tasks = {row[0]: row[1:] for row in task_rows}
+        self.assertEqual(tasks["Trail Mix earlier"][:2], ("Trail Mix last", "k-a"))
+        self.assertEqual(tasks["Granola"][:2], ("Granola again", "k-b"))
+        self.assertEqual(tasks["Cereal earlier"][:2], ("Cereal earlier", "k-c"))
+
+    def test_state_dependencies_trigger_the_done_check(self):
+        trigger_fields = self.Task._restock_done_trigger_fields()
+        self.assertTrue({"state", "stage_id"} <= trigger_fields)
+        state_depends = self.env.registry.field_depends.get(self.Task._fields["state"], ())
+        for path in state_depends:
+            self.assertIn(path.split(".", 1)[0], trigger_fields)
+        self.assertNotIn("name", trigger_fields)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import hmac
+import json
+
+from odoo.tests import HttpCase, tagged
+
+
+WEBHOOK_URL = "/shopify_restock/webhook"
+WEBHOOK_SECRET = "test-webhook-secret"
+
+
+@tagged("post_install", "-at_install")
+class TestShopifyWebhook(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env["ir.config_parameter"].sudo().set_param("odoo_shopify_restock.webhook_secret", WEBHOOK_SECRET)
+
+    def _post(self, topic, payload, secret=WEBHOOK_SECRET):
+        body = json.dumps(payload).encode("utf-8")
+        signature = base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode()
+        return self.url_open(
+            WEBHOOK_URL,
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-Shopify-Topic": topic,
+                "X-Shopify-Hmac-Sha256": signature,
+            },
+        )
+
+    def _available(self, inventory_item_id, location_id):
+        self.env.cr.execute(
+            """
+            SELECT available FROM shopify_restock_inventory_level
+             WHERE inventory_item_id = %s AND location_id = %s
+            """,
+            (inventory_item_id, location_id),
+        )
+        row = self.env.cr.fetchone()
+        return row[0] if row else None
+
+    def _mirror_product(self, product_id):
+        self.env.invalidate_all()
+        return self.env["shopify.restock.catalog.product"].search([
+            ("product_id_global", "=", f"gid://shopify/Product/{product_id}"),
+        ])
+
+    def test_bad_signature_is_rejected(self):
+        payload = {"inventory_item_id": 111, "location_id": 222, "available": 5}
+        response = self._post("inventory_levels/update", payload, secret="wrong-secret")
+        self.assertEqual(response.status_code, 401)
+        self.assertIsNone(self._available(111, 222))
+
+    def test_inventory_level_upsert_ignores_stale_updates(self):
+        topic = "inventory_levels/update"
+        response = self._post(topic, {
+            "inventory_item_id": 111,
+            "location_id": 222,
+            "available": 5,
+            "updated_at": "2024-05-01T10:00:00-04:00",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._available(111, 222), 5)
+
+        self._post(topic, {
+            "inventory_item_id": 111,
+            "location_id": 222,
+            "available": 3,
+            "updated_at": "2024-05-01T15:00:00Z",
+        })
+        self.assertEqual(self._available(111, 222), 3)
+
+        # Delivered late: older than the stored level, so it must not roll it back.
+        self._post(topic, {
+            "inventory_item_id": 111,
+            "location_id": 222,
+            "available": 9,
+            "updated_at": "2024-05-01T12:00:00Z",
+        })
+        self.assertEqual(self._available(111, 222), 3)
+
+    def test_product_update_and_delete_change_the_mirror(self):
+        payload = {
+            "id": 9001,
+            "admin_graphql_api_id": "gid://shopify/Product/9001",
+            "title": "Trail Mix",
+            "handle": "trail-mix",
+            "status": "active",
+            "published_at": "2024-05-01T10:00:00Z",
+            "metafields": [
+                {"namespace": "custom", "key": "restock_level", "type": "number_integer", "value": "4"},
+                {"namespace": "custom", "key": "desired_inventory_level", "type": "number_integer", "value": "12"},
+            ],
+            "variants": [
+                {
+                    "id": 1,
+                    "admin_graphql_api_id": "gid://shopify/ProductVariant/1",
+                    "title": "Small",
+                    "sku": "TM-S",
+                    "inventory_item_id": 501,
+                },
+                {
+                    "id": 2,
+                    "admin_graphql_api_id": "gid://shopify/ProductVariant/2",
+                    "title": "Large",
+                    "sku": "TM-L",
+                    "inventory_item_id": 502,
+                },
+            ],
+        }
+        self.assertEqual(self._post("products/update", payload).status_code, 200)
+        product = self._mirror_product(9001)
+        self.assertEqual(product.title, "Trail Mix")
+        self.assertTrue(product.published_online)
+        self.assertEqual(product.restock_level, 4)
+        self.assertEqual(product.desired_inventory_level, 12)
+        self.assertEqual(sorted(product.variant_ids.mapped("sku")), ["TM-L", "TM-S"])
+        self.assertEqual(
+            product.variant_ids.filtered(lambda variant: variant.sku == "TM-S").inventory_item_id_global,
+            "gid://shopify/InventoryItem/501",
+        )
+
+        payload.update(title="Trail Mix Deluxe", status="draft", variants=payload["variants"][:1])
+        del payload["metafields"]
+        self._post("products/update", payload)
+        product = self._mirror_product(9001)
+        self.assertEqual(product.title, "Trail Mix Deluxe")
+        self.assertFalse(product.published_online)
+        # Thresholds left out of the payload keep their stored value.
+        self.assertEqual(product.restock_level, 4)
+        self.assertEqual(product.variant_ids.mapped("sku"), ["TM-S"])
+
+        self.assertEqual(self._post("products/delete", {"id": 9001}).status_code, 200)
+        self.assertFalse(self._mirror_product(9001))
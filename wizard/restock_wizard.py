@@ -17,6 +17,10 @@ class ShopifyRestockWizard(models.TransientModel):
         string="Shopify Location",
         help="Choose which Shopify location to use for inventory checks.",
     )
+    all_locations = fields.Boolean(
+        string="All Locations",
+        help="Crawl the catalog once and record one run for every active Shopify location.",
+    )
 
     @api.onchange("employee_id")
     def _onchange_employee_id_warn_no_user(self):
@@ -43,7 +47,10 @@ class ShopifyRestockWizard(models.TransientModel):
             if self.employee_id.user_id:
                 ctx_employee["restock_user_id"] = self.employee_id.user_id.id
         ctx_employee["restock_run_by_uid"] = self.env.user.id
-        if self.location_id and self.location_id.location_id_numeric:
+        if self.all_locations:
+            service = service.with_context(dict(self.env.context, **ctx_employee))
+            service.run_restock_check_all_locations(send_email=bool(email_to), email_to_override=email_to)
+        elif self.location_id and self.location_id.location_id_numeric:
             # Pass location in context so service can use per-location settings
             ctx = dict(self.env.context, shopify_restock_location=self.location_id, **ctx_employee)
             service = service.with_context(ctx)